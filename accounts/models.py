@@ -1,6 +1,8 @@
 # accounts/models.py
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.db.models.functions import Upper
 from django.core.validators import RegexValidator
 from django.utils import timezone
 import uuid
@@ -55,6 +57,11 @@ class User(AbstractUser):
         indexes = [
             models.Index(fields=['email']),
             models.Index(fields=['user_type']),
+            # Trigram indexes for the messaging directory search, on the
+            # UPPER() form that icontains/istartswith compare against
+            GinIndex(OpClass(Upper('first_name'), name='gin_trgm_ops'), name='users_first_name_trgm'),
+            GinIndex(OpClass(Upper('last_name'), name='gin_trgm_ops'), name='users_last_name_trgm'),
+            GinIndex(OpClass(Upper('email'), name='gin_trgm_ops'), name='users_email_trgm'),
         ]
 
     def __str__(self):
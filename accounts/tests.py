@@ -1,3 +1,70 @@
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
 
-# Create your tests here.
+from discussions.middleware import get_user_from_token
+from .cache import get_cached_user
+from .models import User
+
+
+class UserCacheTests(TestCase):
+    """Token users resolved through accounts.cache"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='cached', email='cached@example.com', password='x', phone_number='+15550100'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def test_a_cached_user_is_served_without_user_queries(self):
+        self.client.get('/api/auth/profile/')
+        # Only the profile lookup is left; the serializer's fields are all cached
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/auth/profile/')
+        self.assertEqual(response.data['user']['phone_number'], '+15550100')
+        self.assertIsNone(response.data['user']['profile_picture'])
+
+    def test_deactivation_takes_effect_on_the_next_request(self):
+        self.assertEqual(self.client.get('/api/auth/profile/').status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/auth/profile/').status_code, 401)
+
+    def test_websocket_auth_reads_the_cache_without_queries(self):
+        get_cached_user(self.user.pk)
+        with self.assertNumQueries(0):
+            user = async_to_sync(get_user_from_token)(str(AccessToken.for_user(self.user)))
+        self.assertEqual(user.pk, self.user.pk)
+        with self.assertLogs('discussions.middleware', 'WARNING'):
+            self.assertIsInstance(async_to_sync(get_user_from_token)('not-a-token'), AnonymousUser)
+
+
+class UserSearchIndexTests(TestCase):
+    """The trigram indexes behind the messaging directory search"""
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            if cursor.fetchone() is None:
+                self.skipTest('pg_trgm is not available')
+
+    def plan(self, queryset):
+        with connection.cursor() as cursor:
+            # The test tables are tiny; make the planner show whether an index can serve the lookup
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def test_substring_and_prefix_searches_use_the_trigram_indexes(self):
+        self.assertIn('users_first_name_trgm', self.plan(User.objects.filter(first_name__icontains='ada')))
+        self.assertIn('users_last_name_trgm', self.plan(User.objects.filter(last_name__istartswith='lo')))
+        self.assertIn('users_email_trgm', self.plan(User.objects.filter(email__icontains='teach')))
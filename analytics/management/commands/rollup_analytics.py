@@ -0,0 +1,67 @@
+# analytics/management/commands/rollup_analytics.py
+import threading
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from django.utils import timezone
+
+from analytics.models import PlatformAnalytics
+from analytics.rollup import rollup_range
+
+
+class Command(BaseCommand):
+    help = (
+        'Roll up the daily analytics tables. Without dates, rolls up every day after the last '
+        'one rolled up through yesterday, so it can run from a daily schedule, e.g. cron: '
+        '15 0 * * * python manage.py rollup_analytics'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat, help='Roll up this day (YYYY-MM-DD)')
+        parser.add_argument('--start', type=date.fromisoformat, help='First day of a backfill')
+        parser.add_argument('--end', type=date.fromisoformat,
+                            help='Last day of a backfill (default: yesterday)')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Threads the days are split between, each with its own connection')
+
+    def handle(self, *args, **options):
+        first, last = self.get_days(options)
+        if first > last:
+            self.stdout.write(self.style.SUCCESS('Analytics are up to date'))
+            return
+
+        started = time.monotonic()
+        lock = threading.Lock()
+
+        def report(day, counts):
+            summary = ', '.join(f'{count} {table}' for table, count in counts.items())
+            with lock:
+                self.stdout.write(f'  {day}: {summary}')
+
+        days = (last - first).days + 1
+        self.stdout.write(f'Rolling up {days} days, {first} to {last}')
+        rollup_range(first, last, workers=options['workers'], report=report)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rolled up {days} days in {time.monotonic() - started:.1f}s'
+        ))
+
+    def get_days(self, options):
+        yesterday = timezone.localdate() - timedelta(days=1)
+        if options['date']:
+            if options['start'] or options['end']:
+                raise CommandError('--date cannot be combined with --start or --end')
+            return options['date'], options['date']
+        if options['start']:
+            last = options['end'] or yesterday
+            if options['start'] > last:
+                raise CommandError('--start must not be after --end')
+            return options['start'], last
+        if options['end']:
+            raise CommandError('--end needs --start')
+
+        # Incremental: carry on from the last day rolled up
+        latest = PlatformAnalytics.objects.aggregate(latest=Max('date'))['latest']
+        first = latest + timedelta(days=1) if latest else yesterday
+        return first, yesterday
@@ -0,0 +1,298 @@
+# analytics/rollup.py
+"""
+Daily rollups of the analytics tables.
+
+rollup_day() computes one day's CourseAnalytics, LectureAnalytics,
+StudentAnalytics and PlatformAnalytics rows from the raw tables with
+grouped queries (one per source table, however many courses, lectures or
+students there are) and writes them with bulk upserts on each table's
+unique key, in one transaction. Running it again for the same day
+replaces that day's rows: rows it did not write this time, e.g. for a
+student no longer counted as active, are deleted.
+
+Days run in the current time zone. Cumulative figures (total enrollments,
+revenue to date, courses completed) count what existed by the end of the
+day. The raw tables keep only the latest state of some things, so a few
+figures of past days are approximations: average progress is the
+enrollments' current progress, and a lecture's activity is counted on the
+day its progress was last updated.
+
+rollup_range() backfills a range of days, split into contiguous chunks
+run in parallel threads, each on its own database connection.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+from django.db.models import Avg, Count, Q, Sum
+from django.utils import timezone
+
+from assessments.models import AssignmentSubmission, QuizAttempt
+from certificates.models import Certificate
+from core.fanout import in_transaction
+from courses.models import Course
+from courses.services import completion_rate
+from enrollments.models import Enrollment, LectureProgress
+from payments.models import InstructorEarning
+from .models import CourseAnalytics, LectureAnalytics, PlatformAnalytics, StudentAnalytics
+
+User = get_user_model()
+
+UPSERT_BATCH_SIZE = 1000
+
+# Points per minute learned, lecture completed, quiz attempted and
+# assignment submitted that day; the score is capped at 100
+ENGAGEMENT_WEIGHTS = {
+    'minutes_learned': 1,
+    'lectures_completed': 5,
+    'quizzes_attempted': 10,
+    'assignments_submitted': 10,
+}
+
+
+def day_bounds(day):
+    """The start of day and of the next day, in the current time zone"""
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+
+def percentage(part, whole):
+    return round(Decimal(part) * 100 / whole, 2) if whole else Decimal('0')
+
+
+def as_decimal(value):
+    return round(Decimal(value or 0), 2)
+
+
+def course_rows(day, start, end):
+    enrollments = {
+        row['course']: row
+        for row in Enrollment.objects.filter(enrolled_date__lt=end).order_by().values('course').annotate(
+            total_enrollments=Count('id'),
+            new_enrollments=Count('id', filter=Q(enrolled_date__gte=start)),
+            completed=Count('id', filter=Q(completed_date__lt=end)),
+            avg_progress=Avg('progress_percentage'),
+            avg_time_spent=Avg('total_time_spent'),
+        )
+    }
+    active = dict(
+        LectureProgress.objects.filter(
+            updated_at__gte=start, updated_at__lt=end
+        ).order_by().values('enrollment__course').annotate(
+            students=Count('enrollment', distinct=True)
+        ).values_list('enrollment__course', 'students')
+    )
+    revenue = {
+        row['course']: row
+        for row in InstructorEarning.objects.filter(created_at__lt=end).order_by().values('course').annotate(
+            revenue_today=Sum('final_amount', filter=Q(created_at__gte=start)),
+            revenue_total=Sum('final_amount'),
+        )
+    }
+
+    rows = []
+    for course_id in enrollments.keys() | revenue.keys():
+        enrollment = enrollments.get(course_id, {})
+        total = enrollment.get('total_enrollments', 0)
+        rows.append(CourseAnalytics(
+            course_id=course_id,
+            date=day,
+            new_enrollments=enrollment.get('new_enrollments', 0),
+            total_enrollments=total,
+            active_students=active.get(course_id, 0),
+            avg_progress=as_decimal(enrollment.get('avg_progress')),
+            completion_rate=as_decimal(completion_rate(enrollment.get('completed', 0), total)),
+            avg_time_spent=round((enrollment.get('avg_time_spent') or 0) / 60),
+            revenue_today=revenue.get(course_id, {}).get('revenue_today') or 0,
+            revenue_total=revenue.get(course_id, {}).get('revenue_total') or 0,
+        ))
+    return rows
+
+
+def lecture_rows(day, start, end):
+    worked_on = Q(updated_at__gte=start, updated_at__lt=end)
+    completed = Q(completed_date__gte=start, completed_date__lt=end)
+    rows = []
+    for row in LectureProgress.objects.filter(worked_on | completed).order_by().values('lecture').annotate(
+        views=Count('id', filter=worked_on),
+        unique_views=Count('enrollment__student', distinct=True, filter=worked_on),
+        completions=Count('id', filter=completed),
+        avg_watch_time=Avg('progress_seconds', filter=worked_on),
+        dropped=Count('id', filter=worked_on & Q(is_completed=False)),
+    ):
+        rows.append(LectureAnalytics(
+            lecture_id=row['lecture'],
+            date=day,
+            views=row['views'],
+            unique_views=row['unique_views'],
+            completions=row['completions'],
+            avg_watch_time=round(row['avg_watch_time'] or 0),
+            drop_off_rate=percentage(row['dropped'], row['views']),
+        ))
+    return rows
+
+
+def engagement_score(activity):
+    score = sum(activity[field] * weight for field, weight in ENGAGEMENT_WEIGHTS.items())
+    return Decimal(min(score, 100))
+
+
+def student_rows(day, start, end):
+    """A row for every student who learned, completed, attempted or submitted anything that day"""
+    activity = {}
+
+    def add(field, counts):
+        for student_id, count in counts:
+            activity.setdefault(student_id, dict.fromkeys(ENGAGEMENT_WEIGHTS, 0))[field] = count
+
+    worked_on = Q(updated_at__gte=start, updated_at__lt=end)
+    completed = Q(completed_date__gte=start, completed_date__lt=end)
+    progress = list(LectureProgress.objects.filter(worked_on | completed).order_by().values(
+        'enrollment__student'
+    ).annotate(
+        seconds=Sum('progress_seconds', filter=worked_on),
+        completed=Count('id', filter=completed),
+    ))
+    add('minutes_learned', ((row['enrollment__student'], (row['seconds'] or 0) // 60) for row in progress))
+    add('lectures_completed', ((row['enrollment__student'], row['completed']) for row in progress))
+    add('quizzes_attempted', QuizAttempt.objects.filter(
+        start_time__gte=start, start_time__lt=end
+    ).order_by().values('student').annotate(total=Count('id')).values_list('student', 'total'))
+    add('assignments_submitted', AssignmentSubmission.objects.filter(
+        submitted_at__gte=start, submitted_at__lt=end
+    ).order_by().values('student').annotate(total=Count('id')).values_list('student', 'total'))
+    if not activity:
+        return []
+
+    courses = {
+        row['student']: row
+        for row in Enrollment.objects.filter(
+            student__in=list(activity), enrolled_date__lt=end
+        ).order_by().values('student').annotate(
+            completed=Count('id', filter=Q(completed_date__lt=end)),
+            active=Count('id', filter=(Q(completed_date__isnull=True) | Q(completed_date__gte=end))
+                         & Q(status='active')),
+        )
+    }
+    certificates = dict(
+        Certificate.objects.filter(
+            student__in=list(activity), issue_date__lt=end
+        ).order_by().values('student').annotate(total=Count('id')).values_list('student', 'total')
+    )
+
+    return [
+        StudentAnalytics(
+            student_id=student_id,
+            date=day,
+            **counts,
+            courses_active=courses.get(student_id, {}).get('active', 0),
+            courses_completed=courses.get(student_id, {}).get('completed', 0),
+            certificates_earned=certificates.get(student_id, 0),
+            engagement_score=engagement_score(counts),
+        )
+        for student_id, counts in activity.items()
+    ]
+
+
+def platform_row(day, start, end, courses, students):
+    users = User.objects.filter(date_joined__lt=end).aggregate(
+        total=Count('id'),
+        new=Count('id', filter=Q(date_joined__gte=start)),
+    )
+    course_counts = Course.objects.filter(created_at__lt=end).aggregate(
+        total=Count('id'),
+        published=Count('id', filter=Q(status='published', published_date__lt=end)),
+    )
+    monthly_revenue = InstructorEarning.objects.filter(
+        created_at__gte=timezone.make_aware(datetime.combine(day.replace(day=1), time.min)),
+        created_at__lt=end,
+    ).aggregate(total=Sum('final_amount'))['total']
+    minutes = [student.minutes_learned for student in students]
+    return PlatformAnalytics(
+        date=day,
+        total_users=users['total'],
+        new_users=users['new'],
+        active_users=len(students),
+        total_courses=course_counts['total'],
+        published_courses=course_counts['published'],
+        new_enrollments=sum(course.new_enrollments for course in courses),
+        total_enrollments=sum(course.total_enrollments for course in courses),
+        daily_revenue=sum((course.revenue_today for course in courses), Decimal('0')),
+        monthly_revenue=monthly_revenue or 0,
+        avg_session_duration=round(sum(minutes) / len(minutes)) if minutes else 0,
+    )
+
+
+def upsert(model, rows, unique_fields, day, started):
+    """Write the day's rows and delete those of its rows not written now"""
+    update_fields = [
+        field.name for field in model._meta.concrete_fields
+        if not field.primary_key and field.name not in (*unique_fields, 'uuid', 'created_at')
+    ]
+    model.objects.bulk_create(
+        rows,
+        batch_size=UPSERT_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=unique_fields,
+        update_fields=update_fields,
+    )
+    model.objects.filter(date=day, updated_at__lt=started).delete()
+
+
+def rollup_day(day):
+    """Compute and store the four analytics tables for day; returns the rows written per table"""
+    start, end = day_bounds(day)
+    courses = course_rows(day, start, end)
+    lectures = lecture_rows(day, start, end)
+    students = student_rows(day, start, end)
+    platform = platform_row(day, start, end, courses, students)
+
+    with transaction.atomic():
+        started = timezone.now()
+        upsert(CourseAnalytics, courses, ['course', 'date'], day, started)
+        upsert(LectureAnalytics, lectures, ['lecture', 'date'], day, started)
+        upsert(StudentAnalytics, students, ['student', 'date'], day, started)
+        upsert(PlatformAnalytics, [platform], ['date'], day, started)
+    return {'courses': len(courses), 'lectures': len(lectures), 'students': len(students)}
+
+
+def days_between(first, last):
+    return [first + timedelta(days=offset) for offset in range((last - first).days + 1)]
+
+
+def rollup_days(days, report=None):
+    for day in days:
+        counts = rollup_day(day)
+        if report:
+            report(day, counts)
+
+
+def rollup_chunk(days, report=None):
+    """rollup_days() in a worker thread, closing its connections when done"""
+    try:
+        rollup_days(days, report)
+    finally:
+        connections.close_all()
+
+
+def rollup_range(first, last, workers=1, report=None):
+    """
+    Roll up every day from first to last, inclusive, in up to workers threads.
+
+    Each thread takes a contiguous chunk of the days. report(day, counts)
+    is called after each day. Inside a transaction the days run in the
+    calling thread: other connections could not see its uncommitted rows.
+    """
+    days = days_between(first, last)
+    workers = max(1, min(workers, len(days)))
+    if workers == 1 or in_transaction():
+        rollup_days(days, report)
+        return
+
+    size = -(-len(days) // workers)
+    chunks = [days[index:index + size] for index in range(0, len(days), size)]
+    with ThreadPoolExecutor(len(chunks), thread_name_prefix='analytics-rollup') as executor:
+        for future in [executor.submit(rollup_chunk, chunk, report) for chunk in chunks]:
+            future.result()
@@ -1,6 +1,6 @@
 # analytics/serializers.py
 from rest_framework import serializers
-from .models import CourseAnalytics
+from .models import CourseAnalytics, PlatformAnalytics, StudentAnalytics
 from courses.models import Course
 from enrollments.models import Enrollment
 from django.db.models import Count, Avg, Sum
@@ -9,7 +9,22 @@ from datetime import datetime, timedelta
 class CourseAnalyticsSerializer(serializers.ModelSerializer):
     class Meta:
         model = CourseAnalytics
-        fields = '__all__'
+        fields = ['date', 'new_enrollments', 'total_enrollments', 'active_students', 'avg_progress',
+                  'completion_rate', 'avg_time_spent', 'revenue_today', 'revenue_total']
+
+class StudentAnalyticsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = StudentAnalytics
+        fields = ['date', 'minutes_learned', 'lectures_completed', 'quizzes_attempted',
+                  'assignments_submitted', 'courses_active', 'courses_completed',
+                  'certificates_earned', 'engagement_score']
+
+class PlatformAnalyticsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PlatformAnalytics
+        fields = ['date', 'total_users', 'new_users', 'active_users', 'total_courses',
+                  'published_courses', 'new_enrollments', 'total_enrollments', 'daily_revenue',
+                  'monthly_revenue', 'avg_session_duration']
 
 class DashboardStatsSerializer(serializers.Serializer):
     total_courses = serializers.IntegerField()
@@ -34,4 +49,12 @@ class StudentEngagementSerializer(serializers.Serializer):
     date = serializers.DateField()
     active_students = serializers.IntegerField()
     avg_watch_time = serializers.FloatField()
-    completion_rate = serializers.FloatField()
\ No newline at end of file
+    completion_rate = serializers.FloatField()
+
+class LecturePerformanceSerializer(serializers.Serializer):
+    lecture_id = serializers.UUIDField(source='lecture__uuid')
+    title = serializers.CharField(source='lecture__title')
+    views = serializers.IntegerField()
+    completions = serializers.IntegerField()
+    avg_watch_time = serializers.FloatField()
+    drop_off_rate = serializers.FloatField()
@@ -1,3 +1,118 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from assessments.models import AssignmentSubmission, QuizAttempt
+from courses.models import Lecture
+from enrollments.models import Enrollment, LectureProgress
+from .models import CourseAnalytics, LectureAnalytics, PlatformAnalytics, StudentAnalytics
+from .rollup import day_bounds, rollup_day
+
+
+class RollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_scale', students=20, instructors=2, courses=4, messages=0, prefix='rollup',
+                     stdout=StringIO())
+        cls.day = timezone.localdate() - timedelta(days=3)
+        cls.start, cls.end = day_bounds(cls.day)
+
+        # Nothing else happens on the day
+        long_ago = cls.start - timedelta(days=100)
+        LectureProgress.objects.update(updated_at=long_ago, completed_date=None)
+        QuizAttempt.objects.update(start_time=long_ago)
+        AssignmentSubmission.objects.update(submitted_at=long_ago)
+
+        enrollments = list(Enrollment.objects.filter(enrolled_date__lt=cls.start).order_by('course', 'id'))
+        cls.first, cls.second = next(
+            (first, second) for first, second in zip(enrollments, enrollments[1:])
+            if first.course_id == second.course_id
+        )
+        cls.course = cls.first.course
+        cls.lecture = Lecture.objects.filter(section__course=cls.course).first()
+        during = cls.start + timedelta(hours=10)
+        for enrollment, seconds, completed in [(cls.first, 600, True), (cls.second, 300, False)]:
+            progress, _ = LectureProgress.objects.update_or_create(
+                enrollment=enrollment, lecture=cls.lecture,
+                defaults={'progress_seconds': seconds, 'is_completed': completed}
+            )
+            LectureProgress.objects.filter(pk=progress.pk).update(
+                updated_at=during, completed_date=during if completed else None
+            )
+
+    def test_rollup_counts_the_days_activity(self):
+        counts = rollup_day(self.day)
+        self.assertEqual(counts['students'], 2)
+
+        lecture = LectureAnalytics.objects.get(lecture=self.lecture, date=self.day)
+        self.assertEqual((lecture.views, lecture.unique_views, lecture.completions), (2, 2, 1))
+        self.assertEqual(lecture.avg_watch_time, 450)
+        self.assertEqual(lecture.drop_off_rate, 50)
+
+        student = StudentAnalytics.objects.get(student=self.first.student, date=self.day)
+        self.assertEqual((student.minutes_learned, student.lectures_completed), (10, 1))
+        self.assertEqual(student.engagement_score, 15)
+
+        course = CourseAnalytics.objects.get(course=self.course, date=self.day)
+        self.assertEqual(course.active_students, 2)
+        self.assertEqual(course.total_enrollments,
+                         Enrollment.objects.filter(course=self.course, enrolled_date__lt=self.end).count())
+
+        platform = PlatformAnalytics.objects.get(date=self.day)
+        self.assertEqual(platform.active_users, 2)
+        self.assertEqual(platform.total_users, User.objects.filter(date_joined__lt=self.end).count())
+        self.assertEqual(platform.total_enrollments, Enrollment.objects.filter(enrolled_date__lt=self.end).count())
+
+    def test_rerunning_a_day_replaces_its_rows(self):
+        rollup_day(self.day)
+        rows = set(StudentAnalytics.objects.values_list('uuid', flat=True))
+        rollup_day(self.day)
+        self.assertEqual(set(StudentAnalytics.objects.values_list('uuid', flat=True)), rows)
+        self.assertEqual(PlatformAnalytics.objects.count(), 1)
+
+        LectureProgress.objects.filter(enrollment=self.second).update(updated_at=self.end + timedelta(days=1))
+        rollup_day(self.day)
+        self.assertFalse(StudentAnalytics.objects.filter(student=self.second.student, date=self.day).exists())
+        self.assertEqual(LectureAnalytics.objects.get(lecture=self.lecture, date=self.day).views, 1)
+
+    def test_command_carries_on_from_the_last_day_rolled_up(self):
+        call_command('rollup_analytics', start=self.day - timedelta(days=2), end=self.day, stdout=StringIO())
+        self.assertEqual(PlatformAnalytics.objects.count(), 3)
+
+        call_command('rollup_analytics', stdout=StringIO())
+        yesterday = timezone.localdate() - timedelta(days=1)
+        self.assertEqual(
+            list(PlatformAnalytics.objects.order_by('date').values_list('date', flat=True)),
+            [self.day - timedelta(days=offset) for offset in range(2, -1, -1)]
+            + [self.day + timedelta(days=offset) for offset in range(1, (yesterday - self.day).days + 1)]
+        )
+
+        out = StringIO()
+        call_command('rollup_analytics', stdout=out)
+        self.assertIn('up to date', out.getvalue())
+
+    def test_api_serves_the_rollups(self):
+        rollup_day(self.day)
+        client = APIClient()
+
+        client.force_authenticate(self.course.instructor)
+        response = client.get(f'/api/analytics/courses/{self.course.uuid}/')
+        self.assertEqual([row['date'] for row in response.json()], [self.day.isoformat()])
+        self.assertEqual(response.json()[0]['active_students'], 2)
+        response = client.get(f'/api/analytics/courses/{self.course.uuid}/lectures/')
+        self.assertEqual(response.json()[0]['lecture_id'], str(self.lecture.uuid))
+        self.assertEqual(client.get('/api/analytics/platform/').status_code, 403)
+        self.assertEqual(client.get('/api/analytics/instructor/', {'days': 'all'}).status_code, 400)
+
+        other = User.objects.filter(user_type='instructor').exclude(pk=self.course.instructor_id).first()
+        client.force_authenticate(other)
+        self.assertEqual(client.get(f'/api/analytics/courses/{self.course.uuid}/').status_code, 404)
 
-# Create your tests here.
+        client.force_authenticate(self.first.student)
+        response = client.get('/api/analytics/student/')
+        self.assertEqual([row['minutes_learned'] for row in response.json()], [10])
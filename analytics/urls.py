@@ -4,5 +4,9 @@ from . import views
 app_name = 'analytics'
 
 urlpatterns = [
-    # Add your URL patterns here
+    path('platform/', views.platform_analytics, name='platform-analytics'),
+    path('instructor/', views.instructor_analytics, name='instructor-analytics'),
+    path('courses/<uuid:course_uuid>/', views.course_analytics, name='course-analytics'),
+    path('courses/<uuid:course_uuid>/lectures/', views.lecture_analytics, name='lecture-analytics'),
+    path('student/', views.student_analytics, name='student-analytics'),
 ]
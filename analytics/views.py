@@ -1,3 +1,129 @@
-from django.shortcuts import render
+# analytics/views.py
+"""
+Analytics API, served from the daily rollup tables (analytics.rollup).
 
-# Create your views here.
+Every endpoint returns the last ?days= days (default 30) that have been
+rolled up; today is not, until the next day's rollup.
+"""
+from datetime import timedelta
+
+from django.db.models import Avg, Sum
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from accounts.permissions import IsInstructor, IsStudent
+from core.dbrouting import use_replica
+from core.instrumentation import query_budget
+from courses.models import Course
+from .models import CourseAnalytics, LectureAnalytics, PlatformAnalytics, StudentAnalytics
+from .serializers import (
+    CourseAnalyticsSerializer, LecturePerformanceSerializer, PlatformAnalyticsSerializer,
+    RevenueAnalyticsSerializer, StudentAnalyticsSerializer
+)
+
+DEFAULT_DAYS = 30
+MAX_DAYS = 365
+
+
+def get_since(request):
+    """First day of the ?days= window, or None if days is not from 1 to MAX_DAYS"""
+    try:
+        days = int(request.query_params.get('days', DEFAULT_DAYS))
+    except ValueError:
+        return None
+    if not 1 <= days <= MAX_DAYS:
+        return None
+    return timezone.localdate() - timedelta(days=days)
+
+
+def invalid_days():
+    return Response({'error': f'days must be a whole number from 1 to {MAX_DAYS}'},
+                    status=status.HTTP_400_BAD_REQUEST)
+
+
+@query_budget(2)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+@use_replica
+def platform_analytics(request):
+    """Daily platform figures"""
+    since = get_since(request)
+    if since is None:
+        return invalid_days()
+
+    rows = PlatformAnalytics.objects.filter(date__gte=since).order_by('date')
+    return Response(PlatformAnalyticsSerializer(rows, many=True).data)
+
+
+@query_budget(2)
+@api_view(['GET'])
+@permission_classes([IsInstructor])
+@use_replica
+def instructor_analytics(request):
+    """Daily revenue and new enrollments over all of the instructor's courses"""
+    since = get_since(request)
+    if since is None:
+        return invalid_days()
+
+    rows = CourseAnalytics.objects.filter(
+        course__instructor=request.user, date__gte=since
+    ).order_by('date').values('date').annotate(
+        revenue=Sum('revenue_today'),
+        enrollments=Sum('new_enrollments')
+    )
+    return Response(RevenueAnalyticsSerializer(rows, many=True).data)
+
+
+@query_budget(3)
+@api_view(['GET'])
+@permission_classes([IsInstructor])
+@use_replica
+def course_analytics(request, course_uuid):
+    """Daily figures of one of the instructor's courses"""
+    since = get_since(request)
+    if since is None:
+        return invalid_days()
+
+    course = get_object_or_404(Course, uuid=course_uuid, instructor=request.user)
+    rows = CourseAnalytics.objects.filter(course=course, date__gte=since).order_by('date')
+    return Response(CourseAnalyticsSerializer(rows, many=True).data)
+
+
+@query_budget(3)
+@api_view(['GET'])
+@permission_classes([IsInstructor])
+@use_replica
+def lecture_analytics(request, course_uuid):
+    """Views, completions and drop-off of each lecture of a course, over the window"""
+    since = get_since(request)
+    if since is None:
+        return invalid_days()
+
+    course = get_object_or_404(Course, uuid=course_uuid, instructor=request.user)
+    rows = LectureAnalytics.objects.filter(
+        lecture__section__course=course, date__gte=since
+    ).values('lecture__uuid', 'lecture__title').annotate(
+        views=Sum('views'),
+        completions=Sum('completions'),
+        avg_watch_time=Avg('avg_watch_time'),
+        drop_off_rate=Avg('drop_off_rate')
+    ).order_by('lecture__section__order', 'lecture__order')
+    return Response(LecturePerformanceSerializer(rows, many=True).data)
+
+
+@query_budget(2)
+@api_view(['GET'])
+@permission_classes([IsStudent])
+@use_replica
+def student_analytics(request):
+    """The student's daily learning figures"""
+    since = get_since(request)
+    if since is None:
+        return invalid_days()
+
+    rows = StudentAnalytics.objects.filter(student=request.user, date__gte=since).order_by('date')
+    return Response(StudentAnalyticsSerializer(rows, many=True).data)
@@ -0,0 +1,228 @@
+# benchmarks/api.py
+"""
+End-to-end API benchmarks with stored baselines.
+
+Requests each major endpoint through the full Django stack (middleware,
+JWT authentication, view, renderer) as a seeded student or instructor and
+records p50/p95/p99 latency, SQL queries per request and the peak memory
+allocated while serving one request. Results are written as JSON; compare
+checks a run against a stored baseline and exits non-zero when an
+endpoint regressed.
+
+By default the run seeds a throwaway test database with seed_scale;
+--existing-db uses the configured database instead, which must already
+hold data seeded with the given --prefix.
+
+    python -m benchmarks.api run --output benchmarks/baselines/api.json
+    python -m benchmarks.api run --compare benchmarks/baselines/api.json
+    python -m benchmarks.api compare baseline.json current.json --threshold 0.25
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from io import StringIO
+from pathlib import Path
+
+from benchmarks.utils import percentile, print_report, setup_django, test_database
+
+# name: (url, user the request is made as)
+ENDPOINTS = {
+    'catalog': ('/api/courses/all/', 'student'),
+    'enrolled_courses': ('/api/courses/enrolled/', 'student'),
+    'student_stats': ('/api/courses/student/stats/', 'student'),
+    'student_achievements': ('/api/courses/student/achievements/', 'student'),
+    'weekly_progress': ('/api/courses/student/weekly-progress/', 'student'),
+    'conversations': ('/api/discussions/messages/conversations/', 'student'),
+    'instructor_dashboard': ('/api/courses/instructor/dashboard/', 'instructor'),
+    'instructor_courses': ('/api/courses/instructor/courses/', 'instructor'),
+    'instructor_earnings': ('/api/payments/instructor/earnings/', 'instructor'),
+}
+
+# Latency changes smaller than this are treated as noise whatever the ratio
+MIN_LATENCY_REGRESSION_MS = 2.0
+
+
+def pick_users(prefix):
+    """The seeded student with the most enrollments and instructor with the most courses"""
+    from django.db.models import Count
+
+    from accounts.models import User
+
+    seeded = User.objects.filter(email__startswith=f'{prefix}-')
+    student = seeded.filter(user_type='student').annotate(
+        total=Count('enrollments')
+    ).order_by('-total', 'id').first()
+    instructor = seeded.filter(user_type='instructor').annotate(
+        total=Count('courses_created')
+    ).order_by('-total', 'id').first()
+    if student is None or instructor is None:
+        raise SystemExit(f'No users seeded with the prefix "{prefix}"; run seed_scale first')
+    return {'student': student, 'instructor': instructor}
+
+
+def make_clients(users):
+    from django.test import Client
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    return {
+        role: Client(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        for role, user in users.items()
+    }
+
+
+def measure_endpoint(client, url, requests, warmup):
+    from core.instrumentation import record_queries
+
+    for _ in range(warmup):
+        response = client.get(url)
+
+    latencies, queries = [], []
+    for _ in range(requests):
+        with record_queries() as report:
+            response = client.get(url)
+        latencies.append(report.wall_time)
+        queries.append(report.count)
+
+    # Separate pass: tracing allocations slows requests down several times
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(min(requests, 5)):
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            client.get(url)
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'status': response.status_code,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'queries': max(queries),
+        'alloc_peak_kb': round(max(peaks) / 1024, 1),
+    }
+
+
+def run_endpoints(args):
+    users = pick_users(args.prefix)
+    clients = make_clients(users)
+    results = {}
+    for name, (url, role) in ENDPOINTS.items():
+        if args.endpoints and name not in args.endpoints:
+            continue
+        results[name] = measure_endpoint(clients[role], url, args.requests, args.warmup)
+        print_report(f'{name} ({url})', results[name])
+    return results
+
+
+def compare(baseline, current, threshold):
+    """Describe every endpoint of current that regressed against baseline"""
+    regressions = []
+    for name, before in baseline['endpoints'].items():
+        after = current['endpoints'].get(name)
+        if after is None:
+            continue
+        if after['status'] != before['status']:
+            regressions.append(f'{name}: status {before["status"]} -> {after["status"]}')
+        if after['queries'] > before['queries']:
+            regressions.append(f'{name}: queries {before["queries"]} -> {after["queries"]}')
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+            if (after[metric] > before[metric] * (1 + threshold)
+                    and after[metric] - before[metric] > MIN_LATENCY_REGRESSION_MS):
+                regressions.append(f'{name}: {metric} {before[metric]} -> {after[metric]}')
+        if after['alloc_peak_kb'] > before['alloc_peak_kb'] * (1 + threshold):
+            regressions.append(
+                f'{name}: alloc_peak_kb {before["alloc_peak_kb"]} -> {after["alloc_peak_kb"]}'
+            )
+    return regressions
+
+
+def report_comparison(baseline, current, threshold):
+    regressions = compare(baseline, current, threshold)
+    if regressions:
+        print(f'Regressions beyond {threshold:.0%}:')
+        for regression in regressions:
+            print(f'  {regression}')
+        return 1
+    print(f'No endpoint regressed beyond {threshold:.0%}')
+    return 0
+
+
+def run(args):
+    setup_django()
+    from django.core.management import call_command
+    from django.test.utils import setup_test_environment
+
+    dataset = {'prefix': args.prefix}
+    if args.existing_db:
+        setup_test_environment()
+        endpoints = run_endpoints(args)
+    else:
+        dataset.update(students=args.students, instructors=args.instructors, courses=args.courses,
+                       messages=args.messages, seed=args.seed)
+        with test_database():
+            started = time.monotonic()
+            call_command('seed_scale', copy=True, stdout=StringIO(), **dataset)
+            print(f'Seeded test database in {time.monotonic() - started:.0f}s')
+            endpoints = run_endpoints(args)
+
+    results = {
+        'meta': {
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'machine': platform.node(),
+            'requests': args.requests,
+            'dataset': dataset if not args.existing_db else 'existing database',
+        },
+        'endpoints': endpoints,
+    }
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(results, indent=2) + '\n')
+        print(f'Results written to {args.output}')
+    if args.compare:
+        return report_comparison(json.loads(Path(args.compare).read_text()), results, args.threshold)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Benchmark the endpoints')
+    run_parser.add_argument('--requests', type=int, default=50, help='Measured requests per endpoint')
+    run_parser.add_argument('--warmup', type=int, default=5)
+    run_parser.add_argument('--endpoints', nargs='+', choices=list(ENDPOINTS))
+    run_parser.add_argument('--output', help='Write results to this JSON file')
+    run_parser.add_argument('--compare', help='Baseline JSON file to compare the results against')
+    run_parser.add_argument('--threshold', type=float, default=0.25,
+                            help='Relative increase counted as a regression')
+    run_parser.add_argument('--existing-db', action='store_true',
+                            help='Benchmark the configured database instead of a seeded test database')
+    run_parser.add_argument('--prefix', default='bench', help='seed_scale prefix of the benchmark users')
+    run_parser.add_argument('--students', type=int, default=2000)
+    run_parser.add_argument('--instructors', type=int, default=20)
+    run_parser.add_argument('--courses', type=int, default=200)
+    run_parser.add_argument('--messages', type=int, default=5000)
+    run_parser.add_argument('--seed', type=int, default=42)
+
+    compare_parser = commands.add_parser('compare', help='Compare two result files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.25)
+
+    args = parser.parse_args()
+    if args.command == 'compare':
+        baseline, current = (json.loads(Path(path).read_text()) for path in (args.baseline, args.current))
+        sys.exit(report_comparison(baseline, current, args.threshold))
+    sys.exit(run(args))
+
+
+if __name__ == '__main__':
+    main()
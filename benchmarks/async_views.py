@@ -0,0 +1,142 @@
+# benchmarks/async_views.py
+"""
+Async versus sync read views under ASGI.
+
+Serves the catalog, enrolled courses and conversation list endpoints from
+one in-process ASGI worker (Django's ASGIHandler, with the project's
+middleware) and sends CONCURRENCY requests at a time to the sync DRF view
+and to its async variant in turn, as a seeded student. Both run against
+the same throwaway test database seeded with seed_scale, and both see the
+same worker: one event loop, the same database pool.
+
+Reports requests/second, request latency and failed (non-200) requests for
+each endpoint, view kind and concurrency.
+
+    python -m benchmarks.async_views --concurrency 1 10 50 --requests 500
+"""
+import argparse
+import asyncio
+import time
+from io import StringIO
+from types import ModuleType
+
+from benchmarks.utils import latency_summary, print_report, setup_django, test_database
+
+ENDPOINTS = ('catalog', 'enrolled_courses', 'conversations')
+KINDS = ('sync', 'async')
+
+
+def benchmark_urlconf():
+    """/<kind>/<endpoint>/ for every endpoint, served by its sync or async view"""
+    from django.urls import path
+
+    from courses import async_views as course_async_views, student_views
+    from discussions import async_views as discussion_async_views, views as discussion_views
+
+    views = {
+        'catalog': (student_views.all_courses, course_async_views.all_courses),
+        'enrolled_courses': (student_views.student_enrolled_courses,
+                             course_async_views.student_enrolled_courses),
+        'conversations': (discussion_views.get_conversations, discussion_async_views.get_conversations),
+    }
+    urlconf = ModuleType('benchmark_urls')
+    urlconf.urlpatterns = [
+        path(f'{kind}/{endpoint}/', endpoint_views[KINDS.index(kind)])
+        for endpoint, endpoint_views in views.items()
+        for kind in KINDS
+    ]
+    return urlconf
+
+
+async def send_request(application, path, token):
+    """Run one GET through the ASGI application and return its status"""
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'GET', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+        'query_string': b'', 'root_path': '',
+        'headers': [(b'host', b'testserver'), (b'authorization', f'Bearer {token}'.encode())],
+        'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+    }
+    status = None
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await application(scope, receive, send)
+    return status
+
+
+async def run_load(application, path, token, requests, concurrency):
+    remaining = iter(range(requests))
+    latencies, failed = [], 0
+
+    async def worker():
+        nonlocal failed
+        for _ in remaining:
+            started = time.perf_counter()
+            status = await send_request(application, path, token)
+            if status == 200:
+                latencies.append(time.perf_counter() - started)
+            else:
+                failed += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    report = {'requests/sec': round(len(latencies) / elapsed, 1), 'failed requests': failed}
+    report.update(latency_summary(latencies))
+    return report
+
+
+def run_benchmarks(args):
+    from django.core.handlers.asgi import ASGIHandler
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from benchmarks.api import pick_users
+
+    token = str(AccessToken.for_user(pick_users(args.prefix)['student']))
+    application = ASGIHandler()
+
+    async def run_all():
+        for endpoint in args.endpoints:
+            for kind in KINDS:
+                path = f'/{kind}/{endpoint}/'
+                await run_load(application, path, token, args.warmup, 1)
+                for concurrency in args.concurrency:
+                    print_report(f'{endpoint}, {kind} view, concurrency {concurrency}',
+                                 await run_load(application, path, token, args.requests, concurrency))
+
+    asyncio.run(run_all())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 10, 50],
+                        help='Requests in flight at once')
+    parser.add_argument('--requests', type=int, default=500, help='Measured requests per run')
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--prefix', default='bench', help='seed_scale prefix of the benchmark users')
+    parser.add_argument('--students', type=int, default=2000)
+    parser.add_argument('--courses', type=int, default=200)
+    parser.add_argument('--messages', type=int, default=20000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.management import call_command
+    from django.test.utils import override_settings
+
+    with test_database():
+        call_command('seed_scale', prefix=args.prefix, students=args.students, instructors=20,
+                     courses=args.courses, messages=args.messages, copy=True, stdout=StringIO())
+        with override_settings(ROOT_URLCONF=benchmark_urlconf(), DEBUG=False):
+            run_benchmarks(args)
+
+
+if __name__ == '__main__':
+    main()
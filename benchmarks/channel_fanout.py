@@ -0,0 +1,165 @@
+# benchmarks/channel_fanout.py
+"""
+Multi-process channel layer fan-out benchmark.
+
+Starts SUBSCRIBERS processes, each with its own channel layer joined to one
+group, then publishes MESSAGES group_send events from this process and
+reports delivered messages/second and delivery latency. Every event carries
+a time.monotonic() timestamp, which is shared by processes on one host.
+
+    python -m benchmarks.channel_fanout --subscribers 8 --messages 5000
+
+By default a bundled broker is started on a free port; pass --redis-url to
+run against an existing Redis server or run_channel_broker instance.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import time
+
+from benchmarks.utils import latency_summary, print_report
+
+GROUP = 'benchmark_fanout'
+
+
+def make_layer(redis_url):
+    from channels_redis.pubsub import RedisPubSubChannelLayer
+    return RedisPubSubChannelLayer(hosts=[redis_url])
+
+
+async def subscribe(redis_url, expected, ready, results, timeout):
+    layer = make_layer(redis_url)
+    channel = await layer.new_channel()
+    await layer.group_add(GROUP, channel)
+    ready.set()
+
+    latencies = []
+    try:
+        while len(latencies) < expected:
+            message = await asyncio.wait_for(layer.receive(channel), timeout)
+            if message['type'] == 'benchmark.done':
+                break
+            latencies.append(time.monotonic() - message['sent_at'])
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        await layer.group_discard(GROUP, channel)
+        await layer.flush()
+    results.put(latencies)
+
+
+def subscriber_process(redis_url, expected, ready, results, timeout):
+    asyncio.run(subscribe(redis_url, expected, ready, results, timeout))
+
+
+async def publish(redis_url, messages, payload_size, rate):
+    layer = make_layer(redis_url)
+    body = 'x' * payload_size
+    interval = 1 / rate if rate else 0
+    started = time.monotonic()
+    for i in range(messages):
+        await layer.group_send(GROUP, {
+            'type': 'benchmark.message',
+            'sequence': i,
+            'body': body,
+            'sent_at': time.monotonic(),
+        })
+        if interval:
+            delay = started + (i + 1) * interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+    await layer.group_send(GROUP, {'type': 'benchmark.done'})
+    elapsed = time.monotonic() - started
+    await layer.flush()
+    return elapsed
+
+
+def broker_process(port, ready):
+    from core.channel_broker import ChannelBroker
+
+    async def run():
+        broker = await ChannelBroker('127.0.0.1', port).start()
+        ready.set()
+        await broker.serve_forever()
+
+    asyncio.run(run())
+
+
+def free_port():
+    import socket
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def run(subscribers, messages, payload_size, rate, redis_url=None, timeout=10):
+    context = multiprocessing.get_context('spawn')
+    processes = []
+
+    if redis_url is None:
+        port = free_port()
+        broker_ready = context.Event()
+        broker = context.Process(target=broker_process, args=(port, broker_ready), daemon=True)
+        broker.start()
+        processes.append(broker)
+        broker_ready.wait(10)
+        redis_url = f'redis://127.0.0.1:{port}'
+
+    results = context.Queue()
+    readiness = []
+    for _ in range(subscribers):
+        ready = context.Event()
+        process = context.Process(
+            target=subscriber_process,
+            args=(redis_url, messages, ready, results, timeout),
+            daemon=True
+        )
+        process.start()
+        processes.append(process)
+        readiness.append(ready)
+    for ready in readiness:
+        ready.wait(30)
+    # Give the subscriptions a moment to settle on the broker
+    time.sleep(0.2)
+
+    elapsed = asyncio.run(publish(redis_url, messages, payload_size, rate))
+    latencies = []
+    for _ in range(subscribers):
+        latencies.extend(results.get(timeout=timeout + 30))
+
+    for process in processes:
+        process.terminate()
+        process.join()
+
+    expected = subscribers * messages
+    report = {
+        'broker': redis_url,
+        'subscribers': subscribers,
+        'messages published': messages,
+        'publish seconds': round(elapsed, 3),
+        'published msgs/sec': round(messages / elapsed, 1),
+        'delivered': len(latencies),
+        'delivered msgs/sec': round(len(latencies) / elapsed, 1),
+        'dropped': expected - len(latencies),
+    }
+    report.update(latency_summary(latencies))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--subscribers', type=int, default=4)
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--payload-size', type=int, default=200)
+    parser.add_argument('--rate', type=float, default=0,
+                        help='Messages per second to publish; 0 publishes as fast as possible')
+    parser.add_argument('--redis-url', default=None,
+                        help='Existing Redis or channel broker; a bundled broker is started otherwise')
+    args = parser.parse_args()
+
+    report = run(args.subscribers, args.messages, args.payload_size, args.rate, args.redis_url)
+    print_report('Channel layer fan-out', report)
+
+
+if __name__ == '__main__':
+    main()
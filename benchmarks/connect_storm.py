@@ -0,0 +1,137 @@
+# benchmarks/connect_storm.py
+"""
+WebSocket reconnect storm against ChatConsumer.
+
+Opens CONNECTIONS chat sockets at once, drops them all and reconnects them
+all at once, as clients do after a deploy. Reports connects/second, connect
+latency and the number of database queries issued during the reconnect
+wave. Consumers run in-process against the pub/sub channel layer and a
+bundled broker process; users are already authenticated in the scope so
+only the consumer's connect path is measured.
+
+The in-memory layer (--layer memory) scans every channel on each receive,
+so at this scale it mostly measures itself.
+
+    python -m benchmarks.connect_storm --connections 10000
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import time
+
+from benchmarks.channel_fanout import broker_process, free_port
+from benchmarks.utils import latency_summary, print_report, setup_django
+
+
+class QueryCounter:
+    """Count SQL statements executed on any connection, from any thread"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __enter__(self):
+        from django.db.backends.utils import CursorWrapper
+        self.original = CursorWrapper._execute_with_wrappers
+        counter = self
+
+        def counting(cursor, *args, **kwargs):
+            counter.count += 1
+            return counter.original(cursor, *args, **kwargs)
+
+        CursorWrapper._execute_with_wrappers = counting
+        return self
+
+    def __exit__(self, *exc_info):
+        from django.db.backends.utils import CursorWrapper
+        CursorWrapper._execute_with_wrappers = self.original
+
+
+async def connect(application, user, conversation_id):
+    from channels.testing import WebsocketCommunicator
+
+    communicator = WebsocketCommunicator(application, f'/ws/chat/{conversation_id}/')
+    communicator.scope['user'] = user
+    started = time.perf_counter()
+    connected, _ = await communicator.connect(timeout=60)
+    return communicator, connected, time.perf_counter() - started
+
+
+async def wave(application, sockets):
+    started = time.perf_counter()
+    results = await asyncio.gather(*(
+        connect(application, user, conversation_id) for user, conversation_id in sockets
+    ))
+    elapsed = time.perf_counter() - started
+    return results, elapsed
+
+
+async def storm(connections):
+    from channels.routing import URLRouter
+
+    from accounts.models import User
+    from discussions.models import DirectMessage
+    from discussions.routing import websocket_urlpatterns
+
+    application = URLRouter(websocket_urlpatterns)
+    users = [User(id=i, email=f'user{i}@test.com') for i in range(1, connections + 2)]
+    sockets = [
+        (users[i], DirectMessage.get_conversation_id(users[i], users[i + 1]))
+        for i in range(connections)
+    ]
+
+    results, _ = await wave(application, sockets)
+    await asyncio.gather(*(communicator.disconnect() for communicator, _, _ in results))
+
+    with QueryCounter() as queries:
+        results, elapsed = await wave(application, sockets)
+    await asyncio.gather(*(communicator.disconnect() for communicator, _, _ in results))
+
+    latencies = [latency for _, _, latency in results]
+    report = {
+        'connections': connections,
+        'accepted': sum(1 for _, connected, _ in results if connected),
+        'reconnect wave seconds': round(elapsed, 3),
+        'connects/sec': round(connections / elapsed, 1),
+        'db queries': queries.count,
+    }
+    report.update(latency_summary(latencies))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--connections', type=int, default=10000)
+    parser.add_argument('--layer', choices=['broker', 'memory'], default='broker')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    logging.getLogger('discussions.consumers').setLevel(logging.WARNING)
+
+    broker = None
+    if args.layer == 'broker':
+        port = free_port()
+        context = multiprocessing.get_context('spawn')
+        ready = context.Event()
+        broker = context.Process(target=broker_process, args=(port, ready), daemon=True)
+        broker.start()
+        ready.wait(10)
+        settings.CHANNEL_LAYERS = {'default': {
+            'BACKEND': 'channels_redis.pubsub.RedisPubSubChannelLayer',
+            'CONFIG': {'hosts': [f'redis://127.0.0.1:{port}']},
+        }}
+    else:
+        settings.CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+    try:
+        report = asyncio.run(storm(args.connections))
+    finally:
+        if broker is not None:
+            broker.terminate()
+            broker.join()
+    print_report(f'ChatConsumer reconnect storm ({args.layer} layer)', report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+# benchmarks/consumer_logging.py
+"""
+ChatConsumer throughput with real-time logging off, sampled and unsampled.
+
+Drives FRAMES inbound typing frames through ChatConsumer.receive and as
+many chat_message events through its delivery handler, on consumers whose
+socket writes are discarded, and reports frames/second for each logging
+mode. Emitted records go to os.devnull, so formatting and handler costs
+are included but terminal output is not.
+
+    off      realtime loggers at WARNING: events are only counted
+    sampled  DEBUG, with the EVENT_LOG_SAMPLE_RATES from settings
+    full     DEBUG, every event logged
+
+    python -m benchmarks.consumer_logging --frames 100000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from benchmarks.utils import print_report, setup_django
+
+REALTIME_LOGGERS = ('discussions.consumers', 'discussions.middleware')
+
+
+def configure_logging(mode, stream):
+    from django.conf import settings
+
+    from discussions.consumers import log
+
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter('%(asctime)s %(name)s %(levelname)s %(message)s'))
+    for name in REALTIME_LOGGERS:
+        logger = logging.getLogger(name)
+        logger.handlers = [handler]
+        logger.propagate = False
+        logger.setLevel(logging.WARNING if mode == 'off' else logging.DEBUG)
+    log.sample_rates = {} if mode == 'full' else settings.EVENT_LOG_SAMPLE_RATES
+
+
+def make_consumers(count):
+    from discussions.consumers import ChatConsumer
+    from discussions.delivery import DeliveryFilter
+
+    class MutedChatConsumer(ChatConsumer):
+        async def send(self, text_data=None, bytes_data=None, close=False):
+            self.frames += 1
+
+    consumers = []
+    for i in range(count):
+        consumer = MutedChatConsumer()
+        consumer.user = SimpleNamespace(id=i + 1, email=f'user{i + 1}@test.com')
+        consumer.conversation_id = f'conv_{i + 1}_{i + 2}'
+        consumer.delivery_filter = DeliveryFilter(consumer.conversation_id)
+        consumer.frames = 0
+        consumers.append(consumer)
+    return consumers
+
+
+def chat_event(pk, consumer):
+    sender_id = consumer.user.id + 1
+    return {
+        'type': 'chat_message',
+        'message': {
+            'id': pk,
+            'conversation_id': consumer.conversation_id,
+            'content': f'Message {pk}',
+            'sender': {'id': sender_id, 'name': f'User {sender_id}'},
+            'recipient_id': consumer.user.id,
+            'created_at': datetime.now(timezone.utc).isoformat()
+        }
+    }
+
+
+async def run_mode(frames, sockets):
+    consumers = make_consumers(sockets)
+    inbound = [
+        json.dumps({'type': 'typing', 'is_typing': bool(i // sockets % 2)}) for i in range(frames)
+    ]
+    events = [chat_event(i + 1, consumers[i % sockets]) for i in range(frames)]
+
+    started = time.perf_counter()
+    for i, text_data in enumerate(inbound):
+        await consumers[i % sockets].receive(text_data)
+    receive_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for i, event in enumerate(events):
+        await consumers[i % sockets].chat_message(event)
+    deliver_elapsed = time.perf_counter() - started
+
+    return {
+        'receive_per_second': round(frames / receive_elapsed),
+        'deliver_per_second': round(frames / deliver_elapsed),
+        'frames_sent': sum(consumer.frames for consumer in consumers),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--frames', type=int, default=100000)
+    parser.add_argument('--sockets', type=int, default=500)
+    parser.add_argument('--modes', nargs='+', default=['off', 'sampled', 'full'],
+                        choices=['off', 'sampled', 'full'])
+    args = parser.parse_args()
+
+    setup_django()
+    from discussions.consumers import log
+
+    with open(os.devnull, 'w') as devnull:
+        for mode in args.modes:
+            configure_logging(mode, devnull)
+            report = asyncio.run(run_mode(args.frames, args.sockets))
+            report['events_counted'] = sum(log.snapshot().values())
+            log.counts.clear()
+            print_report(f'Consumer logging: {mode}', report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+# benchmarks/db_connections.py
+"""
+Database connection churn and latency under concurrent load.
+
+Runs the same request mix against a throwaway test database with each
+connection mode:
+
+    fresh       CONN_MAX_AGE = 0: a new connection for every request
+    persistent  CONN_MAX_AGE > 0 with health checks: one connection per thread
+    pool        core.backends.postgresql_pool shared by the process's threads
+
+--server wsgi serves requests from CONCURRENCY threads, sending Django's
+request_started/request_finished signals around each one like the WSGI
+handler. --server asgi runs CONCURRENCY asyncio tasks, each request in its
+own thread-sensitive context like Django's ASGI handler, and makes every
+query a separate database_sync_to_async call like the consumers do.
+
+Reports requests/second, request latency, requests that failed with a
+database error, physical connections opened and the peak number of server
+backends for the test database. Persistent connections under ASGI are
+opened by short-lived threads and never reused, so they pile up until the
+server refuses connections; that shows up as failed requests.
+
+    python -m benchmarks.db_connections --server asgi --concurrency 50
+"""
+import argparse
+import asyncio
+import gc
+import queue
+import threading
+import time
+from collections import Counter
+
+from benchmarks.utils import latency_summary, print_report, setup_django, test_database
+
+MODES = ('fresh', 'persistent', 'pool')
+
+
+def mode_settings(mode, pool_size):
+    if mode == 'pool':
+        return {
+            'ENGINE': 'core.backends.postgresql_pool',
+            'CONN_MAX_AGE': 0,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {'pool': {'max_size': pool_size, 'timeout': 30}},
+        }
+    return {
+        'ENGINE': 'django.db.backends.postgresql',
+        'CONN_MAX_AGE': 60 if mode == 'persistent' else 0,
+        'CONN_HEALTH_CHECKS': mode == 'persistent',
+        'OPTIONS': {},
+    }
+
+
+class ConnectCounter:
+    """Count physical connections opened through psycopg2"""
+
+    def __enter__(self):
+        import psycopg2
+        self.count = 0
+        self.original = psycopg2.connect
+        counter = self
+
+        def counting(*args, **kwargs):
+            counter.count += 1
+            return counter.original(*args, **kwargs)
+
+        psycopg2.connect = counting
+        return self
+
+    def __exit__(self, *exc_info):
+        import psycopg2
+        psycopg2.connect = self.original
+
+
+class BackendMonitor(threading.Thread):
+    """Sample the number of server backends connected to the database"""
+
+    def __init__(self, settings_dict, interval=0.02):
+        import psycopg2
+        super().__init__(daemon=True)
+        self.database = settings_dict['NAME']
+        self.connection = psycopg2.connect(
+            dbname=self.database, user=settings_dict['USER'], password=settings_dict['PASSWORD'],
+            host=settings_dict['HOST'], port=settings_dict['PORT']
+        )
+        self.connection.autocommit = True
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.baseline = self.sample()
+        self.peak = self.baseline
+
+    def sample(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM pg_stat_activity WHERE datname = %s', [self.database])
+            return cursor.fetchone()[0]
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, self.sample())
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        self.connection.close()
+        return self.peak - self.baseline
+
+
+def run_query(number):
+    from accounts.models import User
+    return User.objects.filter(pk=number).exists()
+
+
+def serve_wsgi(requests, concurrency, queries, errors):
+    from django.core.signals import request_finished, request_started
+    from django.db import DatabaseError, connections
+
+    pending = queue.Queue()
+    for number in range(requests):
+        pending.put(number)
+    latencies = []
+
+    def worker():
+        while True:
+            try:
+                number = pending.get_nowait()
+            except queue.Empty:
+                break
+            started = time.perf_counter()
+            request_started.send(sender=None)
+            try:
+                for query in range(queries):
+                    run_query(number + query)
+            except DatabaseError as exc:
+                errors[type(exc).__name__] += 1
+                continue
+            finally:
+                request_finished.send(sender=None)
+            latencies.append(time.perf_counter() - started)
+        connections.close_all()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+async def serve_asgi(requests, concurrency, queries, errors):
+    from asgiref.sync import ThreadSensitiveContext
+    from channels.db import database_sync_to_async
+    from django.db import DatabaseError
+
+    numbers = iter(range(requests))
+    latencies = []
+
+    async def worker():
+        for number in numbers:
+            started = time.perf_counter()
+            try:
+                async with ThreadSensitiveContext():
+                    for query in range(queries):
+                        await database_sync_to_async(run_query)(number + query)
+            except DatabaseError as exc:
+                errors[type(exc).__name__] += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+
+def measure(mode, args):
+    from django.db import connections
+
+    from core.backends.postgresql_pool.pool import close_pools, get_pool_stats
+
+    connections['default'].close()
+    settings_dict = connections.settings['default']
+    original = dict(settings_dict)
+    settings_dict.update(mode_settings(mode, args.pool_size))
+
+    monitor = BackendMonitor(settings_dict)
+    monitor.start()
+    errors = Counter()
+    with ConnectCounter() as connects:
+        started = time.perf_counter()
+        if args.server == 'wsgi':
+            latencies = serve_wsgi(args.requests, args.concurrency, args.queries, errors)
+        else:
+            latencies = asyncio.run(serve_asgi(args.requests, args.concurrency, args.queries, errors))
+        elapsed = time.perf_counter() - started
+    peak_backends = monitor.stop()
+
+    report = {
+        'requests/sec': round(len(latencies) / elapsed, 1),
+        'failed requests': dict(errors) or 0,
+        'connections opened': connects.count,
+        'peak server backends': peak_backends,
+    }
+    report.update(latency_summary(latencies))
+    if mode == 'pool':
+        report['pool reuses'] = sum(stats['reused'] for stats in get_pool_stats().values())
+
+    # Connections left behind by finished threads are closed when collected
+    gc.collect()
+    close_pools()
+    settings_dict.clear()
+    settings_dict.update(original)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--server', choices=['wsgi', 'asgi'], default='wsgi')
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--queries', type=int, default=3, help='Queries per request')
+    parser.add_argument('--pool-size', type=int, default=10, help='max_size of the pool')
+    args = parser.parse_args()
+
+    setup_django()
+    with test_database():
+        for mode in args.modes:
+            print_report(f'{mode} connections ({args.server}, concurrency {args.concurrency})',
+                         measure(mode, args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+# benchmarks/json_serialization.py
+"""
+JSON rendering and parsing: DRF's JSONRenderer/JSONParser vs core.fastjson.
+
+Renders representative payloads (a chat frame, a conversation history
+page, a course catalog page, an instructor dashboard and a large export)
+with both renderers, parses them back with both parsers, and reports
+operations/second and output size. Payloads carry the Decimal, UUID and
+datetime values the serializers produce, and the two renderers' outputs
+are checked to decode to the same data.
+
+    python -m benchmarks.json_serialization --seconds 1
+"""
+import argparse
+import io
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from benchmarks.utils import print_report, setup_django
+
+NOW = datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+
+
+def user(pk):
+    return {'id': pk, 'name': f'User {pk}', 'email': f'user{pk}@test.com', 'user_type': 'student'}
+
+
+def message(pk):
+    return {
+        'id': pk,
+        'uuid': uuid.UUID(int=pk),
+        'conversation_id': 'conv_1_2',
+        'content': f'Message {pk} with a sentence or two of text in it, as chat messages have.',
+        'sender': user(1 + pk % 2),
+        'recipient_id': 2 - pk % 2,
+        'created_at': NOW + timedelta(seconds=pk),
+        'is_read': pk % 3 == 0,
+    }
+
+
+def course(pk):
+    return {
+        'id': pk,
+        'uuid': uuid.UUID(int=pk),
+        'title': f'Course {pk}: an introduction',
+        'slug': f'course-{pk}',
+        'short_description': 'A representative short course description. ' * 3,
+        'price': Decimal('49.99') + pk,
+        'discount_price': Decimal('19.99'),
+        'average_rating': Decimal('4.57'),
+        'total_enrollments': pk * 37,
+        'instructor': user(pk),
+        'category': {'id': pk % 12, 'name': f'Category {pk % 12}'},
+        'tags': ['python', 'django', 'web'],
+        'created_at': NOW - timedelta(days=pk),
+        'updated_at': NOW,
+    }
+
+
+def payloads():
+    return {
+        'chat_frame': {'type': 'chat_message', 'message': {**message(1), 'is_own_message': False}},
+        'history_page': {'messages': [message(pk) for pk in range(50)], 'next_cursor': 'abc'},
+        'catalog_page': {'count': 1000, 'next': None, 'previous': None,
+                         'results': [course(pk) for pk in range(20)]},
+        'dashboard': {
+            'stats': {'total_revenue': Decimal('123456.78'), 'total_students': 4321,
+                      'average_rating': Decimal('4.61')},
+            'courses': [course(pk) for pk in range(100)],
+            'recent_enrollments': [
+                {'student': user(pk), 'course_id': pk % 100, 'enrolled_at': NOW - timedelta(hours=pk),
+                 'progress_percentage': Decimal('37.50')}
+                for pk in range(200)
+            ],
+        },
+        'export_rows': [course(pk) for pk in range(5000)],
+    }
+
+
+def measure(function, seconds):
+    """Calls per second of function, run for at least the given time"""
+    calls = 0
+    started = time.perf_counter()
+    while True:
+        function()
+        calls += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= seconds:
+            return round(calls / elapsed, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--seconds', type=float, default=1.0, help='time spent per measurement')
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+
+    from core import fastjson
+    from core.fastjson import FastJSONParser, FastJSONRenderer
+
+    print(f'orjson available: {fastjson.orjson is not None}')
+    renderers = {'drf': JSONRenderer(), 'fast': FastJSONRenderer()}
+    parsers = {'drf': JSONParser(), 'fast': FastJSONParser()}
+
+    for name, data in payloads().items():
+        rendered = {key: renderer.render(data) for key, renderer in renderers.items()}
+        if fastjson.loads(rendered['drf']) != fastjson.loads(rendered['fast']):
+            raise SystemExit(f'{name}: renderers disagree')
+
+        report = {'bytes': len(rendered['fast'])}
+        for key, renderer in renderers.items():
+            report[f'{key}_render_per_second'] = measure(lambda: renderer.render(data), args.seconds)
+        for key, json_parser in parsers.items():
+            body = rendered[key]
+            report[f'{key}_parse_per_second'] = measure(
+                lambda: json_parser.parse(io.BytesIO(body)), args.seconds
+            )
+        report['render_speedup'] = round(report['fast_render_per_second'] / report['drf_render_per_second'], 1)
+        report['parse_speedup'] = round(report['fast_parse_per_second'] / report['drf_parse_per_second'], 1)
+        print_report(f'JSON: {name}', report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+# benchmarks/message_delivery.py
+"""
+Channel-layer operations per chat message: legacy routing vs the delivery router.
+
+Simulates CONVERSATIONS conversations whose two participants each have a
+UserConsumer socket and a ChatConsumer socket open, sends MESSAGES messages
+through both routing strategies and counts group_send calls, channel sends
+and frames that reach a socket.
+
+    python -m benchmarks.message_delivery --conversations 200 --messages 5000
+"""
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from channels.layers import InMemoryChannelLayer
+
+from benchmarks.utils import print_report
+from discussions.delivery import (
+    DeliveryFilter, conversation_group_name, deliver_messages, normalize_event, user_group_name
+)
+
+
+class CountingChannelLayer(InMemoryChannelLayer):
+    """In-memory layer that records deliveries instead of queueing them"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.group_sends = 0
+        self.delivered = []
+
+    async def group_send(self, group, message):
+        self.group_sends += 1
+        await super().group_send(group, message)
+
+    async def send(self, channel, message):
+        self.delivered.append((channel, message))
+
+
+def make_users(count):
+    return [
+        SimpleNamespace(id=i, first_name='User', last_name=str(i), email=f'user{i}@test.com',
+                        user_type='student')
+        for i in range(1, count + 1)
+    ]
+
+
+def make_message(pk, sender, recipient):
+    low, high = sorted((sender.id, recipient.id))
+    return SimpleNamespace(
+        id=pk, sender=sender, sender_id=sender.id, recipient=recipient, recipient_id=recipient.id,
+        content=f'Message {pk}', created_at=datetime.now(timezone.utc),
+        conversation_id=f'conv_{low}_{high}'
+    )
+
+
+async def legacy_deliver(layer, message):
+    """The routing used before the delivery router: conversation group plus both user groups"""
+    sender = message.sender
+    event = {
+        'type': 'chat_message',
+        'message_id': message.id,
+        'message': message.content,
+        'sender_id': sender.id,
+        'sender_name': f"{sender.first_name} {sender.last_name}".strip(),
+        'timestamp': message.created_at.isoformat(),
+        'conversation_id': message.conversation_id
+    }
+    await layer.group_send(conversation_group_name(message.conversation_id), event)
+    await layer.group_send(user_group_name(message.sender_id),
+                           {**event, 'type': 'user_message_notification'})
+    await layer.group_send(user_group_name(message.recipient_id),
+                           {**event, 'type': 'user_message_notification'})
+
+
+async def open_sockets(layer, pairs, chat_joins_user_group):
+    """Open a UserConsumer and a ChatConsumer socket per participant; returns channel -> filter"""
+    filters = {}
+    user_sockets = {}
+    for sender, recipient in pairs:
+        conversation_id = make_message(0, sender, recipient).conversation_id
+        for user in (sender, recipient):
+            chat_socket = await layer.new_channel()
+            await layer.group_add(conversation_group_name(conversation_id), chat_socket)
+            if chat_joins_user_group:
+                await layer.group_add(user_group_name(user.id), chat_socket)
+            filters[chat_socket] = DeliveryFilter(conversation_id)
+
+            if user.id not in user_sockets:
+                user_sockets[user.id] = await layer.new_channel()
+                await layer.group_add(user_group_name(user.id), user_sockets[user.id])
+                filters[user_sockets[user.id]] = DeliveryFilter()
+    return filters
+
+
+async def measure(strategy, pairs, messages, batch_size):
+    layer = CountingChannelLayer(capacity=10 ** 9)
+    filters = await open_sockets(layer, pairs, chat_joins_user_group=strategy == 'router')
+
+    started = time.perf_counter()
+    if strategy == 'router':
+        for i in range(0, len(messages), batch_size):
+            await deliver_messages(messages[i:i + batch_size], layer)
+    else:
+        for message in messages:
+            await legacy_deliver(layer, message)
+    elapsed = time.perf_counter() - started
+
+    frames = Counter()
+    for channel, event in layer.delivered:
+        message = normalize_event(event)
+        if strategy == 'legacy' or filters[channel].accept(message):
+            frames[(channel, message['id'])] += 1
+
+    count = len(messages)
+    return {
+        'group_send per message': round(layer.group_sends / count, 2),
+        'channel sends per message': round(len(layer.delivered) / count, 2),
+        'socket frames per message': round(sum(frames.values()) / count, 2),
+        'duplicate frames': sum(n - 1 for n in frames.values()),
+        'messages/sec': round(count / elapsed, 1),
+    }
+
+
+def run(conversations, message_count, batch_size, seed=1):
+    rng = random.Random(seed)
+    users = make_users(conversations * 2)
+    pairs = [(users[2 * i], users[2 * i + 1]) for i in range(conversations)]
+    messages = []
+    for pk in range(1, message_count + 1):
+        sender, recipient = rng.choice(pairs)
+        if rng.random() < 0.5:
+            sender, recipient = recipient, sender
+        messages.append(make_message(pk, sender, recipient))
+
+    return {
+        strategy: asyncio.run(measure(strategy, pairs, messages, batch_size))
+        for strategy in ('legacy', 'router')
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--conversations', type=int, default=200)
+    parser.add_argument('--messages', type=int, default=5000)
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help='Messages handed to the router per call')
+    args = parser.parse_args()
+
+    for strategy, report in run(args.conversations, args.messages, args.batch_size).items():
+        print_report(f'Delivery: {strategy}', report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+# benchmarks/message_writes.py
+"""
+Chat message persistence throughput: one transaction per message vs the
+write-behind MessageWriter.
+
+Sends MESSAGES messages from CONCURRENCY simulated sockets through each
+path and reports messages/second and per-message latency. The direct path
+awaits send_direct_message through database_sync_to_async, as
+ChatConsumer used to; the writer path awaits MessageWriter.submit (the
+broadcast) and then drains the writer. Runs against a throwaway test
+database.
+
+    python -m benchmarks.message_writes --messages 5000 --concurrency 50
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.utils import latency_summary, print_report, setup_django, test_database
+
+
+async def run_path(path, users, messages, concurrency):
+    from channels.db import database_sync_to_async
+    from channels.layers import InMemoryChannelLayer
+
+    from discussions.services import send_direct_message
+    from discussions.writer import MessageWriter
+
+    writer = MessageWriter(channel_layer=InMemoryChannelLayer())
+    latencies = []
+
+    async def sender(worker):
+        for i in range(worker, messages, concurrency):
+            sender_user, recipient = users[i % len(users)], users[(i + 1) % len(users)]
+            started = time.perf_counter()
+            if path == 'direct':
+                await database_sync_to_async(send_direct_message)(sender_user, recipient, f'Message {i}')
+            else:
+                await writer.submit(sender_user, recipient.id, f'Message {i}')
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(sender(worker) for worker in range(concurrency)))
+    await writer.drain()
+    elapsed = time.perf_counter() - started
+
+    report = {
+        'messages': messages,
+        'seconds': round(elapsed, 3),
+        'messages/sec': round(messages / elapsed, 1),
+    }
+    report.update(latency_summary(latencies))
+    return report
+
+
+def run(messages, concurrency, user_count):
+    from accounts.models import User
+    from discussions.models import DirectMessage
+
+    users = User.objects.bulk_create([
+        User(username=f'bench{i}@test.com', email=f'bench{i}@test.com', password='!')
+        for i in range(user_count)
+    ])
+    reports = {}
+    for path in ('direct', 'writer'):
+        reports[path] = asyncio.run(run_path(path, users, messages, concurrency))
+        reports[path]['saved'] = DirectMessage.objects.count()
+        DirectMessage.objects.all().delete()
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--messages', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--users', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    with test_database():
+        reports = run(args.messages, args.concurrency, args.users)
+    for path, report in reports.items():
+        print_report(f'Message persistence: {path}', report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+# benchmarks/startup.py
+"""
+Worker boot time.
+
+Starts a fresh interpreter --runs times per target and times it until the
+target is ready to serve (see core.importtime.TARGETS), reporting wall
+time and the number of modules loaded. With --history the results are
+appended, with the current commit, to a JSON lines file so boot time can
+be followed from one change to the next; the previous entry is printed
+alongside for comparison.
+
+    python -m benchmarks.startup --targets wsgi asgi --history benchmarks/startup_history.jsonl
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from benchmarks.utils import percentile, print_report
+from core.importtime import BASE_DIR, TARGETS, run_target
+
+
+def measure_target(target, runs):
+    durations, modules = [], None
+    run_target(target)  # warm the filesystem and bytecode caches
+    for _ in range(runs):
+        started = time.perf_counter()
+        process = run_target(target)
+        durations.append(time.perf_counter() - started)
+        modules = int(process.stdout.split()[-1])
+    return {
+        'median_ms': round(statistics.median(durations) * 1000, 1),
+        'p90_ms': round(percentile(durations, 90) * 1000, 1),
+        'min_ms': round(min(durations) * 1000, 1),
+        'modules': modules,
+    }
+
+
+def current_commit():
+    process = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                             capture_output=True, text=True, cwd=BASE_DIR)
+    return process.stdout.strip() or None
+
+
+def last_entry(history):
+    if not history.exists():
+        return None
+    lines = history.read_text().splitlines()
+    return json.loads(lines[-1]) if lines else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--targets', nargs='+', choices=list(TARGETS), default=list(TARGETS))
+    parser.add_argument('--runs', type=int, default=10, help='Interpreters started per target')
+    parser.add_argument('--history', help='JSON lines file to append the results to')
+    args = parser.parse_args()
+
+    history = Path(args.history) if args.history else None
+    previous = last_entry(history) if history else None
+
+    results = {}
+    for target in args.targets:
+        results[target] = measure_target(target, args.runs)
+        report = dict(results[target])
+        before = (previous or {}).get('targets', {}).get(target)
+        if before:
+            report['previous median_ms'] = f"{before['median_ms']} ({previous['commit']})"
+            report['previous modules'] = before['modules']
+        print_report(f'{target} boot ({args.runs} runs)', report)
+
+    if history:
+        entry = {
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'commit': current_commit(),
+            'runs': args.runs,
+            'targets': results,
+        }
+        history.parent.mkdir(parents=True, exist_ok=True)
+        with history.open('a') as file:
+            file.write(json.dumps(entry) + '\n')
+        print(f'Results appended to {history}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+# benchmarks/utils.py
+"""Helpers shared by the benchmark scripts"""
+import os
+
+
+def setup_django(settings_module='coursera.settings'):
+    """Configure Django for a standalone benchmark process"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers, or None when empty"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def latency_summary(latencies):
+    """p50/p99/max of latencies given in seconds, reported in milliseconds"""
+    return {
+        name: round(value * 1000, 3) if value is not None else None
+        for name, value in (
+            ('p50_ms', percentile(latencies, 50)),
+            ('p99_ms', percentile(latencies, 99)),
+            ('max_ms', max(latencies) if latencies else None),
+        )
+    }
+
+
+def print_report(title, results):
+    print(title)
+    width = max(len(key) for key in results)
+    for key, value in results.items():
+        print(f'  {key.ljust(width)}  {value}')
+
+
+class test_database:
+    """
+    Run a benchmark against a throwaway test database, created like the
+    test runner does and dropped on exit, so real data is never touched.
+    """
+
+    def __enter__(self):
+        from django.test.utils import setup_databases, setup_test_environment
+        setup_test_environment()
+        self.old_config = setup_databases(verbosity=0, interactive=False)
+        return self
+
+    def __exit__(self, *exc_info):
+        from django.test.utils import teardown_databases, teardown_test_environment
+        teardown_databases(self.old_config, verbosity=0)
+        teardown_test_environment()
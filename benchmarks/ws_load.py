@@ -0,0 +1,425 @@
+# benchmarks/ws_load.py
+"""
+WebSocket load generator for the discussions consumers.
+
+Opens a ChatConsumer socket (and optionally a UserConsumer socket) for each
+of CLIENTS seeded users, paired into direct-message conversations, and
+authenticates every socket with a JWT in the query string like the
+frontend does. Each client then sends chat messages and typing updates to
+its partner at random (Poisson) intervals for DURATION seconds.
+
+Reports connect time, the end-to-end latency from sending a chat message
+to its arrival on the partner's sockets, messages that never arrived
+(dropped), duplicate deliveries, typing frames received and messages
+confirmed as saved by the write-behind writer.
+
+In-process (the default), sockets are driven through the websocket stack
+of coursera.asgi (JWTAuthMiddleware and the discussions routes) in this
+process against a throwaway test database. --layer may name several
+channel layers; each runs the same scenario with the same seed, so their
+results line up:
+
+    python -m benchmarks.ws_load --clients 2000 --layer memory broker
+
+With --url the sockets connect over TCP to a running server instead,
+e.g. daphne on localhost; its database must hold users created by
+seed_scale with --prefix, and the channel layer is whatever the server
+is configured with:
+
+    python manage.py seed_scale --prefix load --students 2000
+    python -m benchmarks.ws_load --url ws://127.0.0.1:8000 --prefix load --clients 2000
+"""
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import multiprocessing
+import random
+import time
+from io import StringIO
+from pathlib import Path
+from urllib.parse import urlparse
+
+from benchmarks.channel_fanout import broker_process, free_port
+from benchmarks.utils import percentile, print_report, setup_django, test_database
+
+LAYERS = {
+    'memory': {'BACKEND': 'channels.layers.InMemoryChannelLayer',
+               'CONFIG': {'capacity': 1500, 'expiry': 60}},
+    'broker': {'BACKEND': 'channels_redis.pubsub.RedisPubSubChannelLayer'},
+    'redis_pubsub': {'BACKEND': 'channels_redis.pubsub.RedisPubSubChannelLayer'},
+    'redis': {'BACKEND': 'channels_redis.core.RedisChannelLayer',
+              'CONFIG': {'capacity': 1500, 'expiry': 60}},
+}
+
+
+class InProcessSocket:
+    """A socket served by an ASGI application in this process"""
+
+    def __init__(self, application, path):
+        from channels.testing import WebsocketCommunicator
+        self.communicator = WebsocketCommunicator(application, path)
+
+    async def connect(self, timeout):
+        connected, _ = await self.communicator.connect(timeout=timeout)
+        return connected
+
+    async def send(self, text):
+        await self.communicator.send_to(text_data=text)
+
+    async def receive(self):
+        """The next text frame, or None once the socket is closed"""
+        # Read the queue directly: a receive_output() timeout kills the consumer
+        message = await self.communicator.output_queue.get()
+        if message['type'] != 'websocket.send':
+            return None
+        return message['text']
+
+    async def close(self):
+        await self.communicator.disconnect(timeout=10)
+
+
+@functools.lru_cache(maxsize=None)
+def client_protocol():
+    from autobahn.asyncio.websocket import WebSocketClientProtocol
+
+    class LoadClientProtocol(WebSocketClientProtocol):
+        def __init__(self):
+            super().__init__()
+            self.opened = asyncio.get_running_loop().create_future()
+            self.frames = asyncio.Queue()
+
+        def onOpen(self):
+            self.opened.set_result(True)
+
+        def onMessage(self, payload, is_binary):
+            self.frames.put_nowait(payload.decode())
+
+        def onClose(self, was_clean, code, reason):
+            if not self.opened.done():
+                self.opened.set_result(False)
+            self.frames.put_nowait(None)
+
+    return LoadClientProtocol
+
+
+class NetworkSocket:
+    """A socket to a running server, over TCP"""
+
+    def __init__(self, base_url, path):
+        self.url = base_url.rstrip('/') + path
+        self.protocol = None
+
+    async def connect(self, timeout):
+        from autobahn.asyncio.websocket import WebSocketClientFactory
+
+        factory = WebSocketClientFactory(self.url)
+        factory.protocol = client_protocol()
+        parsed = urlparse(self.url)
+        try:
+            _, self.protocol = await asyncio.wait_for(
+                asyncio.get_running_loop().create_connection(factory, parsed.hostname, parsed.port or 80),
+                timeout
+            )
+            return await asyncio.wait_for(self.protocol.opened, timeout)
+        except (OSError, asyncio.TimeoutError):
+            return False
+
+    async def send(self, text):
+        self.protocol.sendMessage(text.encode())
+
+    async def receive(self):
+        return await self.protocol.frames.get()
+
+    async def close(self):
+        if self.protocol is not None:
+            self.protocol.sendClose()
+
+
+class Stats:
+    def __init__(self):
+        self.connect_times = []
+        self.rejected = 0
+        self.sent_at = {}
+        self.expected = {}
+        self.latencies = []
+        self.duplicates = 0
+        self.typing_sent = 0
+        self.typing_frames = 0
+        self.persisted = set()
+        self.failed = set()
+
+    def record_frame(self, text):
+        frame = json.loads(text)
+        kind = frame.get('type')
+        if kind == 'chat_message':
+            message = frame['message']
+            if message['is_own_message']:
+                return
+            key = message['content']
+            remaining = self.expected.get(key, 0)
+            if remaining:
+                self.expected[key] = remaining - 1
+                self.latencies.append(time.perf_counter() - self.sent_at[key])
+            else:
+                self.duplicates += 1
+        elif kind == 'typing':
+            self.typing_frames += 1
+        elif kind == 'message_persisted':
+            self.persisted.update(entry['client_id'] for entry in frame['messages'])
+        elif kind == 'message_failed':
+            self.failed.update(frame['client_ids'])
+
+    def pending(self):
+        return sum(self.expected.values())
+
+
+class Client:
+    def __init__(self, index, user_id, partner_id, sockets):
+        self.index = index
+        self.user_id = user_id
+        self.partner_id = partner_id
+        self.sockets = sockets
+        self.open = []
+        self.readers = []
+
+    async def connect(self, stats, limit, timeout):
+        for socket in self.sockets:
+            async with limit:
+                started = time.perf_counter()
+                connected = await socket.connect(timeout)
+            if connected:
+                stats.connect_times.append(time.perf_counter() - started)
+                self.open.append(socket)
+                self.readers.append(asyncio.create_task(self.read(socket, stats)))
+            else:
+                stats.rejected += 1
+
+    async def read(self, socket, stats):
+        while True:
+            text = await socket.receive()
+            if text is None:
+                return
+            stats.record_frame(text)
+
+    async def drive(self, stats, message_rate, typing_rate, deadline, rng, partner_sockets):
+        """Send messages and typing updates to the partner until the deadline"""
+        if not self.open:
+            return
+        chat_socket = self.open[0]
+        total_rate = message_rate + typing_rate
+        sequence = 0
+        typing = False
+        while True:
+            await asyncio.sleep(rng.expovariate(total_rate))
+            if time.perf_counter() >= deadline:
+                return
+            if rng.random() < message_rate / total_rate:
+                sequence += 1
+                content = f'load {self.index} {sequence}'
+                stats.sent_at[content] = time.perf_counter()
+                stats.expected[content] = partner_sockets
+                await chat_socket.send(json.dumps({
+                    'type': 'chat_message', 'message': content, 'recipient_id': self.partner_id
+                }))
+            else:
+                typing = not typing
+                stats.typing_sent += 1
+                await chat_socket.send(json.dumps({'type': 'typing', 'is_typing': typing}))
+
+    async def close(self):
+        await asyncio.gather(*(socket.close() for socket in self.open), return_exceptions=True)
+        for reader in self.readers:
+            reader.cancel()
+
+
+def load_users(prefix, count):
+    from accounts.models import User
+
+    users = list(User.objects.filter(
+        email__startswith=f'{prefix}-student', is_active=True
+    ).order_by('id').values_list('id', flat=True)[:count])
+    if len(users) < count:
+        raise SystemExit(f'Only {len(users)} active users seeded with the prefix "{prefix}"; '
+                         f'seed at least {count} students')
+    return users
+
+
+def make_clients(user_ids, open_socket, user_sockets):
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from accounts.models import User
+    from discussions.models import DirectMessage
+
+    clients = []
+    for index, user_id in enumerate(user_ids[:len(user_ids) // 2 * 2]):
+        partner_id = user_ids[index ^ 1]
+        token = AccessToken.for_user(User(id=user_id))
+        conversation_id = DirectMessage.get_conversation_id_for_ids(user_id, partner_id)
+        paths = [f'/ws/chat/{conversation_id}/?token={token}']
+        if user_sockets:
+            paths.append(f'/ws/user/?token={token}')
+        clients.append(Client(index, user_id, partner_id, [open_socket(path) for path in paths]))
+    return clients
+
+
+def summary(name, seconds):
+    return {
+        f'{name}_{label}_ms': round(value * 1000, 3) if value is not None else None
+        for label, value in (
+            ('p50', percentile(seconds, 50)),
+            ('p95', percentile(seconds, 95)),
+            ('p99', percentile(seconds, 99)),
+            ('max', max(seconds) if seconds else None),
+        )
+    }
+
+
+async def run_load(clients, args, drain_writer):
+    stats = Stats()
+    limit = asyncio.Semaphore(args.connect_concurrency)
+    started = time.perf_counter()
+    await asyncio.gather(*(client.connect(stats, limit, args.connect_timeout) for client in clients))
+    connect_wave = time.perf_counter() - started
+
+    rng = random.Random(args.seed)
+    deadline = time.perf_counter() + args.duration
+    partner_sockets = 2 if args.user_sockets else 1
+    await asyncio.gather(*(
+        client.drive(stats, args.message_rate, args.typing_rate, deadline, random.Random(rng.random()),
+                     partner_sockets)
+        for client in clients
+    ))
+    sent = len(stats.sent_at)
+
+    # Wait for deliveries still in flight, then for the writer to save everything
+    drain_deadline = time.perf_counter() + args.drain
+    while stats.pending() and time.perf_counter() < drain_deadline:
+        await asyncio.sleep(0.05)
+    if drain_writer:
+        from discussions.writer import get_message_writer
+        await get_message_writer().drain()
+        await asyncio.sleep(0.2)
+    await asyncio.gather(*(client.close() for client in clients))
+
+    sockets = sum(len(client.sockets) for client in clients)
+    report = {
+        'clients': len(clients),
+        'sockets': sockets,
+        'accepted': len(stats.connect_times),
+        'rejected': stats.rejected,
+        'connect wave seconds': round(connect_wave, 3),
+    }
+    report.update(summary('connect', stats.connect_times))
+    report.update({
+        'messages sent': sent,
+        'deliveries expected': sent * partner_sockets,
+        'delivered': len(stats.latencies),
+        'dropped': stats.pending(),
+        'duplicates': stats.duplicates,
+        'deliveries/sec': round(len(stats.latencies) / args.duration, 1),
+    })
+    report.update(summary('delivery', stats.latencies))
+    report.update({
+        'typing sent': stats.typing_sent,
+        'typing frames received': stats.typing_frames,
+        'messages persisted': len(stats.persisted),
+        'messages failed': len(stats.failed),
+    })
+    return report
+
+
+def start_broker():
+    context = multiprocessing.get_context('spawn')
+    port = free_port()
+    ready = context.Event()
+    process = context.Process(target=broker_process, args=(port, ready), daemon=True)
+    process.start()
+    ready.wait(10)
+    return process, f'redis://127.0.0.1:{port}'
+
+
+def run_in_process(args):
+    from channels.routing import URLRouter
+    from django.core.management import call_command
+    from django.test import override_settings
+
+    from discussions.middleware import JWTAuthMiddlewareStack
+    from discussions.routing import websocket_urlpatterns
+
+    application = JWTAuthMiddlewareStack(URLRouter(websocket_urlpatterns))
+
+    with test_database():
+        call_command('seed_scale', prefix=args.prefix, students=args.clients, instructors=1, courses=1,
+                     sections=1, lectures=1, enrollments=0, messages=0, copy=True, stdout=StringIO())
+        user_ids = load_users(args.prefix, args.clients)
+
+        reports = {}
+        for layer in args.layer:
+            broker = None
+            config = dict(LAYERS[layer])
+            if layer == 'broker':
+                broker, url = start_broker()
+            else:
+                url = args.redis_url
+            if layer != 'memory':
+                config['CONFIG'] = {**config.get('CONFIG', {}), 'hosts': [url]}
+            try:
+                with override_settings(CHANNEL_LAYERS={'default': config}):
+                    clients = make_clients(
+                        user_ids, functools.partial(InProcessSocket, application), args.user_sockets
+                    )
+                    reports[layer] = asyncio.run(run_load(clients, args, drain_writer=True))
+            finally:
+                if broker is not None:
+                    broker.terminate()
+                    broker.join()
+            print_report(f'WebSocket load ({layer} layer, in-process)', reports[layer])
+    return reports
+
+
+def run_over_network(args):
+    user_ids = load_users(args.prefix, args.clients)
+    clients = make_clients(user_ids, functools.partial(NetworkSocket, args.url), args.user_sockets)
+    report = asyncio.run(run_load(clients, args, drain_writer=False))
+    print_report(f'WebSocket load ({args.url})', report)
+    return {args.url: report}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--clients', type=int, default=1000, help='Users connected, in pairs')
+    parser.add_argument('--user-sockets', action='store_true',
+                        help='Also open a UserConsumer socket per client')
+    parser.add_argument('--message-rate', type=float, default=0.2,
+                        help='Chat messages per client per second')
+    parser.add_argument('--typing-rate', type=float, default=0.5,
+                        help='Typing updates per client per second')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds of load')
+    parser.add_argument('--drain', type=float, default=5,
+                        help='Seconds to wait for messages still in flight')
+    parser.add_argument('--connect-concurrency', type=int, default=500,
+                        help='Connection handshakes in progress at once')
+    parser.add_argument('--connect-timeout', type=float, default=30)
+    parser.add_argument('--layer', nargs='+', choices=list(LAYERS), default=['memory'],
+                        help='Channel layers to run against in-process (broker starts a bundled one)')
+    parser.add_argument('--redis-url', default='redis://127.0.0.1:6379',
+                        help='Server for the redis and redis_pubsub layers')
+    parser.add_argument('--url', help='Connect to this server (ws://host:port) instead of in-process')
+    parser.add_argument('--prefix', default='load', help='seed_scale prefix of the users')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write the reports to this JSON file')
+    args = parser.parse_args()
+
+    setup_django()
+    for name in ('discussions.consumers', 'discussions.middleware'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    reports = run_over_network(args) if args.url else run_in_process(args)
+    if args.output:
+        Path(args.output).write_text(json.dumps({'settings': vars(args), 'reports': reports}, indent=2) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+    
+    def ready(self):
+        from . import checks  # noqa: F401
+        from .instrumentation import install_context_wrappers
+        connection_created.connect(install_context_wrappers, dispatch_uid='core.context_execute_wrappers')
@@ -0,0 +1,86 @@
+# core/asyncapi.py
+"""
+Async JSON views for read endpoints served under ASGI.
+
+DRF views are synchronous, so under ASGI every request to one runs in a
+thread. async_api_view gives a coroutine view what the hot read endpoints
+use from @api_view: allowed methods, JWT authentication, permission
+classes and DRF-shaped error responses. The view awaits the async ORM and
+returns a JSONResponse:
+
+    @async_api_view(['GET'], permission_classes=[IsStudent])
+    async def student_enrolled_courses(request):
+        ...
+        return JSONResponse(data)
+
+Content negotiation, throttling and the browsable API are left to the
+sync views.
+"""
+from functools import wraps
+
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from rest_framework import exceptions
+
+from accounts.authentication import CachedJWTAuthentication
+from .fastjson import FastJSONRenderer
+
+_authentication = CachedJWTAuthentication()
+_renderer = FastJSONRenderer()
+
+
+class JSONResponse(HttpResponse):
+    """Response with data encoded as FastJSONRenderer encodes it for DRF views"""
+
+    def __init__(self, data, status=200, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(_renderer.render(data), status=status, **kwargs)
+
+
+async def authenticate(request):
+    """The user of the request's bearer token, or AnonymousUser without one"""
+    header = _authentication.get_header(request)
+    raw_token = _authentication.get_raw_token(header) if header is not None else None
+    if raw_token is None:
+        return AnonymousUser()
+    return await _authentication.aget_user(_authentication.get_validated_token(raw_token))
+
+
+def check_permissions(request, permission_classes):
+    for permission in (permission_class() for permission_class in permission_classes):
+        if not permission.has_permission(request, None):
+            if not request.user.is_authenticated:
+                raise exceptions.NotAuthenticated()
+            raise exceptions.PermissionDenied(
+                detail=getattr(permission, 'message', None), code=getattr(permission, 'code', None)
+            )
+
+
+def error_response(exc):
+    """The response DRF's exception handler gives for an APIException"""
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    response = JSONResponse(data, status=exc.status_code)
+    if exc.status_code == 401:
+        response['WWW-Authenticate'] = _authentication.authenticate_header(None)
+    return response
+
+
+def async_api_view(http_method_names=('GET',), permission_classes=()):
+    def decorator(view):
+        allowed = {method.upper() for method in http_method_names}
+
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            try:
+                if request.method not in allowed:
+                    raise exceptions.MethodNotAllowed(request.method)
+                request.user = await authenticate(request)
+                check_permissions(request, permission_classes)
+                return await view(request, *args, **kwargs)
+            except exceptions.APIException as exc:
+                return error_response(exc)
+
+        # Like DRF's views: token authentication needs no CSRF protection
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
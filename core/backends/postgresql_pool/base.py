@@ -0,0 +1,53 @@
+# core/backends/postgresql_pool/base.py
+"""
+PostgreSQL backend that shares a pool of connections between the threads
+of a worker process.
+
+Django's postgresql backend gives every thread its own connection and,
+with CONN_MAX_AGE = 0, closes it at the end of each request; under ASGI
+every database_sync_to_async call does the same. With this backend
+closing a connection hands it back to a per-process pool and connecting
+takes an idle one, so connections are opened once and no more than
+max_size are open per process. It is configured like the pool option of
+Django 5.1's psycopg 3 backend:
+
+    'ENGINE': 'core.backends.postgresql_pool',
+    'CONN_MAX_AGE': 0,
+    'OPTIONS': {'pool': {'max_size': 10, 'timeout': 10}},
+
+A thread that finds every connection in use waits up to timeout seconds
+and then fails with OperationalError. With CONN_HEALTH_CHECKS on,
+connections idle for more than check_idle seconds run SELECT 1 before
+they are handed out.
+"""
+from django.db.backends.postgresql import base
+
+from .creation import DatabaseCreation
+from .pool import get_pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop('pool', None)
+        return conn_params
+
+    def get_pool(self):
+        settings_dict = self.settings_dict
+        key = (self.alias, settings_dict['NAME'], settings_dict['HOST'], settings_dict['PORT'],
+               settings_dict['USER'])
+        return get_pool(key, settings_dict['OPTIONS'].get('pool', {}))
+
+    def get_new_connection(self, conn_params):
+        # Remembered so the connection goes back to the pool it came from,
+        # even if NAME changes meanwhile, as it does when tests set up
+        self.pool = self.get_pool()
+        connect = super().get_new_connection
+        return self.pool.getconn(lambda: connect(conn_params), self.settings_dict['CONN_HEALTH_CHECKS'])
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.putconn(self.connection)
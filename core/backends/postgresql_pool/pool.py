@@ -0,0 +1,145 @@
+# core/backends/postgresql_pool/pool.py
+import threading
+import time
+from collections import deque
+
+from psycopg2 import extensions
+
+from django.db.backends.postgresql.base import Database
+
+POOL_DEFAULTS = {
+    'max_size': 10,     # connections open at once per process, in use or idle
+    'timeout': 10,      # seconds to wait for a free connection
+    'check_idle': 30,   # seconds idle after which a connection is tested before reuse
+}
+
+
+class ConnectionPool:
+    def __init__(self, max_size, timeout, check_idle):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_idle = check_idle
+        self.lock = threading.Lock()
+        # Connections handed out, and threads waiting for one in arrival
+        # order; a returned slot goes straight to the first waiter, so busy
+        # threads cannot keep taking it back
+        self.in_use = 0
+        self.waiters = deque()
+        # (connection, returned at), most recently returned last
+        self.idle = []
+        self.opened = 0
+        self.reused = 0
+
+    def getconn(self, connect, health_checks=False):
+        """Hand out an idle connection, or open one with connect() if none is usable"""
+        self.acquire_slot()
+        try:
+            while True:
+                with self.lock:
+                    if not self.idle:
+                        break
+                    connection, returned_at = self.idle.pop()
+                if self.usable(connection, returned_at, health_checks):
+                    with self.lock:
+                        self.reused += 1
+                    return connection
+                connection.close()
+
+            connection = connect()
+            with self.lock:
+                self.opened += 1
+            return connection
+        except BaseException:
+            self.release_slot()
+            raise
+
+    def acquire_slot(self):
+        with self.lock:
+            if self.in_use < self.max_size and not self.waiters:
+                self.in_use += 1
+                return
+            waiter = threading.Lock()
+            waiter.acquire()
+            self.waiters.append(waiter)
+        if waiter.acquire(timeout=self.timeout):
+            return
+        with self.lock:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+                raise Database.OperationalError(
+                    f'No database connection became free within {self.timeout}s '
+                    f'(pool max_size is {self.max_size})'
+                )
+        # The slot was handed over just as the wait timed out
+
+    def release_slot(self):
+        with self.lock:
+            if self.waiters:
+                self.waiters.popleft().release()
+            else:
+                self.in_use -= 1
+
+    def usable(self, connection, returned_at, health_checks):
+        if connection.closed:
+            return False
+        if not health_checks or time.monotonic() - returned_at < self.check_idle:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            connection.rollback()
+        except Database.Error:
+            return False
+        return True
+
+    def putconn(self, connection):
+        """Take a connection back; ones left broken or inside a transaction are closed"""
+        try:
+            if (not connection.closed
+                    and connection.info.transaction_status == extensions.TRANSACTION_STATUS_IDLE):
+                with self.lock:
+                    self.idle.append((connection, time.monotonic()))
+            else:
+                connection.close()
+        finally:
+            self.release_slot()
+
+    def close(self):
+        """Close the idle connections; ones in use are pooled again when returned"""
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for connection, _ in idle:
+            connection.close()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'max_size': self.max_size,
+                'in_use': self.in_use,
+                'idle': len(self.idle),
+                'opened': self.opened,
+                'reused': self.reused,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, options):
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(**{**POOL_DEFAULTS, **options})
+        return _pools[key]
+
+
+def get_pool_stats():
+    with _pools_lock:
+        return {key: pool.stats() for key, pool in _pools.items()}
+
+
+def close_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close()
@@ -0,0 +1,282 @@
+# core/channel_broker.py
+"""
+Minimal Redis-protocol pub/sub broker.
+
+Speaks the subset of RESP2/RESP3 that channels_redis.pubsub.RedisPubSubChannelLayer
+uses (PUBLISH, SUBSCRIBE, UNSUBSCRIBE and the connection handshake), so
+several ASGI workers on one box, or a test run, can share a channel layer
+without a Redis server. It keeps no data: messages go to whoever is
+subscribed at publish time, exactly like Redis pub/sub.
+"""
+import asyncio
+import fnmatch
+import logging
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 6379
+
+# Subscribers that fall this far behind are disconnected, like Redis'
+# client-output-buffer-limit for pubsub clients
+MAX_PENDING_BYTES = 32 * 1024 * 1024
+
+# Reported by HELLO; clients only look at the protocol version
+SERVER_INFO = [
+    b'server', b'redis', b'version', b'7.0.0',
+    b'mode', b'standalone', b'role', b'master', b'modules', [],
+]
+
+SUBSCRIBED_MODE_COMMANDS = {
+    b'SUBSCRIBE', b'UNSUBSCRIBE', b'PSUBSCRIBE', b'PUNSUBSCRIBE', b'PING', b'QUIT', b'RESET'
+}
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def encode_bulk(value):
+    if value is None:
+        return b'$-1\r\n'
+    if isinstance(value, str):
+        value = value.encode()
+    return b'$%d\r\n%s\r\n' % (len(value), value)
+
+
+def encode_array(items, kind=b'*'):
+    """Encode an array; kind is b'>' for RESP3 push messages or b'%' for maps"""
+    length = len(items) // 2 if kind == b'%' else len(items)
+    parts = [kind + b'%d\r\n' % length]
+    for item in items:
+        if isinstance(item, int):
+            parts.append(b':%d\r\n' % item)
+        elif isinstance(item, list):
+            parts.append(encode_array(item))
+        else:
+            parts.append(encode_bulk(item))
+    return b''.join(parts)
+
+
+def parse_length(header, kind):
+    """The length in a *<count> or $<length> header line"""
+    try:
+        length = int(header[1:-2])
+    except ValueError:
+        length = -1
+    if length < 0:
+        raise ProtocolError(f'Invalid {kind} length')
+    return length
+
+
+async def read_command(reader):
+    """Read one command as a list of bytes arguments, or None at EOF"""
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.endswith(b'\r\n'):
+        raise ProtocolError('Unterminated command line')
+
+    if line[:1] != b'*':
+        # Inline command, e.g. typed into telnet
+        return line.strip().split()
+
+    count = parse_length(line, 'multibulk')
+    arguments = []
+    for _ in range(count):
+        header = await reader.readline()
+        if header[:1] != b'$' or not header.endswith(b'\r\n'):
+            raise ProtocolError('Expected bulk string')
+        length = parse_length(header, 'bulk')
+        data = await reader.readexactly(length + 2)
+        if data[-2:] != b'\r\n':
+            raise ProtocolError('Unterminated bulk string')
+        arguments.append(data[:-2])
+    return arguments
+
+
+class BrokerClient:
+    def __init__(self, broker, writer):
+        self.broker = broker
+        self.writer = writer
+        self.channels = set()
+        self.patterns = set()
+        self.protocol = 2
+
+    @property
+    def subscription_count(self):
+        return len(self.channels) + len(self.patterns)
+
+    def push(self, items):
+        """Send a pub/sub event: a push message in RESP3, a plain array in RESP2"""
+        self.send(encode_array(items, b'>' if self.protocol == 3 else b'*'))
+
+    def send(self, data):
+        transport = self.writer.transport
+        if transport.is_closing():
+            return
+        if transport.get_write_buffer_size() > MAX_PENDING_BYTES:
+            logger.warning('Disconnecting slow subscriber with %d pending bytes',
+                           transport.get_write_buffer_size())
+            transport.close()
+            return
+        self.writer.write(data)
+
+
+class ChannelBroker:
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.host = host
+        self.port = port
+        self.channels = defaultdict(set)
+        self.patterns = defaultdict(set)
+        self.server = None
+        self.published = 0
+        self.connections = {}
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        logger.info('Channel broker listening on %s:%s', self.host, self.port)
+        return self
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        """Stop listening, then disconnect every client and wait for their handlers"""
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        handlers = list(self.connections)
+        for writer in self.connections.values():
+            writer.close()
+        await asyncio.gather(*handlers, return_exceptions=True)
+
+    async def handle_connection(self, reader, writer):
+        client = BrokerClient(self, writer)
+        handler = asyncio.current_task()
+        self.connections[handler] = writer
+        try:
+            while True:
+                command = await read_command(reader)
+                if command is None:
+                    break
+                if not command:
+                    continue
+                if not self.dispatch(client, command):
+                    break
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except ProtocolError as e:
+            client.send(b'-ERR Protocol error: %s\r\n' % str(e).encode())
+        finally:
+            self.drop_client(client)
+            self.connections.pop(handler, None)
+            writer.close()
+
+    def dispatch(self, client, command):
+        """Run one command; returns False when the connection should close"""
+        name = command[0].upper()
+        arguments = command[1:]
+
+        if client.subscription_count and name not in SUBSCRIBED_MODE_COMMANDS:
+            client.send(b'-ERR only (P)SUBSCRIBE / (P)UNSUBSCRIBE / PING / QUIT allowed in this context\r\n')
+            return True
+
+        if name == b'PUBLISH':
+            if len(arguments) != 2:
+                client.send(b"-ERR wrong number of arguments for 'publish' command\r\n")
+            else:
+                client.send(b':%d\r\n' % self.publish(*arguments))
+        elif name == b'SUBSCRIBE':
+            for channel in arguments:
+                self.channels[channel].add(client)
+                client.channels.add(channel)
+                client.push([b'subscribe', channel, client.subscription_count])
+        elif name == b'UNSUBSCRIBE':
+            self.unsubscribe(client, arguments, client.channels, self.channels, b'unsubscribe')
+        elif name == b'PSUBSCRIBE':
+            for pattern in arguments:
+                self.patterns[pattern].add(client)
+                client.patterns.add(pattern)
+                client.push([b'psubscribe', pattern, client.subscription_count])
+        elif name == b'PUNSUBSCRIBE':
+            self.unsubscribe(client, arguments, client.patterns, self.patterns, b'punsubscribe')
+        elif name == b'PING':
+            if client.subscription_count:
+                client.push([b'pong', arguments[0] if arguments else b''])
+            elif arguments:
+                client.send(encode_bulk(arguments[0]))
+            else:
+                client.send(b'+PONG\r\n')
+        elif name == b'HELLO':
+            if arguments and arguments[0] not in (b'2', b'3'):
+                client.send(b'-NOPROTO unsupported protocol version\r\n')
+            else:
+                if arguments:
+                    client.protocol = int(arguments[0])
+                info = SERVER_INFO + [b'proto', client.protocol]
+                client.send(encode_array(info, b'%' if client.protocol == 3 else b'*'))
+        elif name == b'ECHO' and arguments:
+            client.send(encode_bulk(arguments[0]))
+        elif name in (b'SELECT', b'CLIENT', b'AUTH', b'FLUSHALL', b'FLUSHDB', b'READONLY'):
+            client.send(b'+OK\r\n')
+        elif name == b'RESET':
+            self.drop_client(client)
+            client.send(b'+RESET\r\n')
+        elif name == b'QUIT':
+            client.send(b'+OK\r\n')
+            return False
+        else:
+            client.send(b"-ERR unknown command '%s'\r\n" % name.lower())
+        return True
+
+    def publish(self, channel, payload):
+        self.published += 1
+        receivers = 0
+        # Encode once per protocol version rather than once per subscriber
+        message = {kind: encode_array([b'message', channel, payload], kind) for kind in (b'*', b'>')}
+        for subscriber in self.channels.get(channel, ()):
+            subscriber.send(message[b'>' if subscriber.protocol == 3 else b'*'])
+            receivers += 1
+        for pattern, subscribers in self.patterns.items():
+            if fnmatch.fnmatchcase(channel, pattern):
+                for subscriber in subscribers:
+                    subscriber.push([b'pmessage', pattern, channel, payload])
+                    receivers += 1
+        return receivers
+
+    def unsubscribe(self, client, names, client_names, registry, reply):
+        names = names or list(client_names)
+        if not names:
+            client.push([reply, None, 0])
+            return
+        for name in names:
+            client_names.discard(name)
+            subscribers = registry.get(name)
+            if subscribers is not None:
+                subscribers.discard(client)
+                if not subscribers:
+                    del registry[name]
+            client.push([reply, name, client.subscription_count])
+
+    def drop_client(self, client):
+        for channel in client.channels:
+            subscribers = self.channels.get(channel)
+            if subscribers is not None:
+                subscribers.discard(client)
+                if not subscribers:
+                    del self.channels[channel]
+        for pattern in client.patterns:
+            subscribers = self.patterns.get(pattern)
+            if subscribers is not None:
+                subscribers.discard(client)
+                if not subscribers:
+                    del self.patterns[pattern]
+        client.channels = set()
+        client.patterns = set()
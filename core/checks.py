@@ -0,0 +1,42 @@
+# core/checks.py
+"""
+System checks for settings that only work together.
+
+State that several processes must agree on is kept in the default cache:
+WebSocket presence counts (discussions.presence), cached auth users
+(accounts.cache), cached conversation members (discussions.membership)
+and replica pins (core.dbrouting). A per-process cache is only right with a single worker,
+so warn when the settings say there are several.
+"""
+from django.conf import settings
+from django.core.checks import Warning, register
+
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def has_local_cache():
+    return settings.CACHES['default']['BACKEND'] in LOCAL_CACHE_BACKENDS
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    if not has_local_cache():
+        return []
+
+    warnings = []
+    if getattr(settings, 'CHANNEL_LAYER', 'memory') != 'memory':
+        warnings.append(Warning(
+            'CHANNEL_LAYER spans several workers but the default cache is per process.',
+            hint='Set CACHE_URL so WebSocket presence counts, cached users and conversation members are shared.',
+            id='core.W001',
+        ))
+    if getattr(settings, 'DATABASE_REPLICAS', []):
+        warnings.append(Warning(
+            'DATABASE_REPLICAS is set but the default cache is per process.',
+            hint='Set CACHE_URL so users pinned to the primary after a write stay pinned on every worker.',
+            id='core.W002',
+        ))
+    return warnings
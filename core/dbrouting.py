@@ -0,0 +1,181 @@
+# core/dbrouting.py
+"""
+Read-replica routing.
+
+Every write, and every read outside a marked view, goes to the default
+database. Read-only views opt in with use_replica, which sends their reads
+to one of the aliases in DATABASE_REPLICAS:
+
+    @api_view(['GET'])
+    @permission_classes([IsInstructor])
+    @use_replica
+    def instructor_dashboard(request):
+
+Replicas lag behind the primary, so a user whose request wrote anything
+reads from the primary for REPLICA_STICKINESS_SECONDS afterwards
+(ReplicaStickinessMiddleware watches for INSERT, UPDATE and DELETE
+statements). The pin is kept in the default cache, so it only reaches
+every worker when that cache is shared (CACHE_URL); with a per-process
+cache a read handled by another worker can miss the user's own write
+(core.checks warns about that setup). A request that writes reads from
+the primary for the rest of the request too.
+
+use_replica and the middleware work for async views as well.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.http import HttpRequest
+from rest_framework.request import Request
+
+from .instrumentation import context_execute_wrapper
+
+REPLICA_STICKINESS_SECONDS = getattr(settings, 'REPLICA_STICKINESS_SECONDS', 5)
+
+# Alias reads are routed to, set by read_from_replica()
+_read_alias = ContextVar('read_alias', default=None)
+
+# Per-request state, set by ReplicaStickinessMiddleware
+_request_state = ContextVar('replica_request_state', default=None)
+
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class RequestState:
+    def __init__(self):
+        self.wrote = False
+
+    def __call__(self, execute, sql, params, many, context):
+        """Database execute wrapper: notes whether the request wrote anything"""
+        if sql.startswith(WRITE_STATEMENTS):
+            self.wrote = True
+        return execute(sql, params, many, context)
+
+
+def get_replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def pin_key(user_id):
+    return f'core:replica-pin:{user_id}'
+
+
+def pin_to_primary(user_id):
+    cache.set(pin_key(user_id), True, REPLICA_STICKINESS_SECONDS)
+
+
+def is_pinned(user_id):
+    return cache.get(pin_key(user_id), False)
+
+
+@contextmanager
+def read_from_replica(user=None):
+    """Route reads in the block to a replica, unless user has just written"""
+    replicas = get_replicas()
+    alias = None
+    if replicas and not (user is not None and user.is_authenticated and is_pinned(user.pk)):
+        alias = random.choice(replicas)
+    token = _read_alias.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_alias.reset(token)
+
+
+def use_replica(view):
+    """Serve a read-only view, function or viewset method, from a replica"""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(*args, **kwargs):
+            request = next(arg for arg in args if isinstance(arg, (HttpRequest, Request)))
+            with read_from_replica(request.user):
+                return await view(*args, **kwargs)
+        return async_wrapper
+    
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        request = next(arg for arg in args if isinstance(arg, (HttpRequest, Request)))
+        with read_from_replica(request.user):
+            return view(*args, **kwargs)
+    return wrapper
+
+
+def bind_read_database(queryset):
+    """
+    Fix the database a queryset reads from now, rather than when it is
+    evaluated, e.g. for rows streamed after the view has returned.
+    """
+    return queryset.using(queryset.db)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _request_state.get()
+        if state is not None and state.wrote:
+            return DEFAULT_DB_ALIAS
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in get_replicas():
+            return False
+        return None
+
+
+class ReplicaStickinessMiddleware:
+    """Pin users whose request wrote to the database to the primary for a while"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state = RequestState()
+        token = _request_state.set(state)
+        try:
+            with context_execute_wrapper(state):
+                response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+
+        if self.wrote_as_user(request, state):
+            pin_to_primary(request.user.pk)
+        return response
+    
+    async def __acall__(self, request):
+        state = RequestState()
+        token = _request_state.set(state)
+        try:
+            with context_execute_wrapper(state):
+                response = await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        
+        if self.wrote_as_user(request, state):
+            await sync_to_async(pin_to_primary)(request.user.pk)
+        return response
+    
+    def wrote_as_user(self, request, state):
+        # DRF copies the user it authenticated onto the Django request
+        user = getattr(request, 'user', None)
+        return state.wrote and user is not None and user.is_authenticated
@@ -0,0 +1,95 @@
+# core/eventlog.py
+"""
+Structured, sampled logging for hot paths such as the WebSocket consumers.
+
+    log = EventLogger(__name__)
+    log.debug('ws.receive', user_id=user.id, type=message_type)
+
+Each call names an event and passes its fields as keywords. Nothing is
+formatted unless a record is actually emitted: disabled levels return
+after a counter increment, and fields are rendered as key=value pairs by
+the handler, not at the call site. Records carry the event name and the
+raw fields as `event` and `event_fields` for structured formatters.
+
+Events can be sampled with EVENT_LOG_SAMPLE_RATES, a mapping of event
+name to the fraction of occurrences that is logged (1 by default). Every
+occurrence is counted either way, and each logger writes its counts as one
+INFO summary line every EVENT_LOG_SUMMARY_INTERVAL seconds, so per-message
+events need no line of their own to be visible.
+"""
+import logging
+import random
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+EVENT_LOG_SAMPLE_RATES = getattr(settings, 'EVENT_LOG_SAMPLE_RATES', {})
+EVENT_LOG_SUMMARY_INTERVAL = getattr(settings, 'EVENT_LOG_SUMMARY_INTERVAL', 60)
+
+
+class EventFields:
+    """Renders fields as key=value pairs when the record is formatted"""
+
+    __slots__ = ('fields',)
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    def __str__(self):
+        return ' '.join(f'{key}={value}' for key, value in self.fields.items())
+
+
+class EventLogger:
+    def __init__(self, name, sample_rates=None, summary_interval=None):
+        self.logger = logging.getLogger(name)
+        self.sample_rates = EVENT_LOG_SAMPLE_RATES if sample_rates is None else sample_rates
+        self.summary_interval = (
+            EVENT_LOG_SUMMARY_INTERVAL if summary_interval is None else summary_interval
+        )
+        self.counts = Counter()
+        self.next_summary = time.monotonic() + self.summary_interval
+        # Consumers count from the event loop, sync_to_async code from threads
+        self.lock = threading.Lock()
+
+    def debug(self, event, **fields):
+        self.log(logging.DEBUG, event, fields)
+
+    def info(self, event, **fields):
+        self.log(logging.INFO, event, fields)
+
+    def warning(self, event, **fields):
+        self.log(logging.WARNING, event, fields)
+
+    def error(self, event, **fields):
+        self.log(logging.ERROR, event, fields)
+
+    def exception(self, event, **fields):
+        self.log(logging.ERROR, event, fields, exc_info=True)
+
+    def log(self, level, event, fields, exc_info=False):
+        self.count(event)
+        if not self.logger.isEnabledFor(level):
+            return
+        rate = self.sample_rates.get(event, 1)
+        if rate < 1 and random.random() >= rate:
+            return
+        self.logger.log(level, '%s %s', event, EventFields(fields), exc_info=exc_info,
+                        extra={'event': event, 'event_fields': fields})
+
+    def count(self, event):
+        with self.lock:
+            self.counts[event] += 1
+            if time.monotonic() < self.next_summary:
+                return
+            counts, self.counts = self.counts, Counter()
+            self.next_summary = time.monotonic() + self.summary_interval
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info('event counts %s', EventFields(dict(counts.most_common())),
+                             extra={'event': 'event_counts', 'event_fields': dict(counts)})
+
+    def snapshot(self):
+        """Counts since the last summary line"""
+        with self.lock:
+            return dict(self.counts)
@@ -0,0 +1,79 @@
+# core/fanout.py
+"""
+Run a view's independent queries concurrently.
+
+A dashboard that runs several unrelated aggregates one after another
+waits for the sum of their round trips. fan_out runs them at the same
+time, each on its own database connection, and returns their results by
+name, so the view waits about as long as its slowest query:
+
+    stats = fan_out(
+        total_courses=lambda: Enrollment.objects.filter(student=student).count(),
+        certificates=lambda: Certificate.objects.filter(student=student).count(),
+    )
+    stats['total_courses']
+
+Each callable must finish its query (count(), aggregate(), list(...)):
+a lazy queryset would only be evaluated later, back in the view. The first
+runs in the calling thread, the others in a per-process pool of
+QUERY_FANOUT_WORKERS threads. They run in a copy of the caller's context,
+so replica routing and query instrumentation apply to them as they would
+inline. Each worker hands its connection back (to the pool, with the
+pooled backend) when its query is done.
+
+Inside a transaction the callables run one after another in the calling
+thread instead: other connections cannot see its uncommitted rows. They
+also do when fan_out is called from one of its own workers, and when
+QUERY_FANOUT_WORKERS is 0.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar, copy_context
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+QUERY_FANOUT_WORKERS = getattr(settings, 'QUERY_FANOUT_WORKERS', 4)
+
+# Set in the workers' contexts, so nested fan_out calls run inline
+_in_worker = ContextVar('query_fanout_worker', default=False)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    # Made on first use, so processes forked after import get their own
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(QUERY_FANOUT_WORKERS, thread_name_prefix='query-fanout')
+        return _executor
+
+
+def in_transaction():
+    return any(connection.in_atomic_block for connection in connections.all(initialized_only=True))
+
+
+def run_in_worker(query):
+    _in_worker.set(True)
+    try:
+        return query()
+    finally:
+        close_old_connections()
+
+
+def fan_out(**queries):
+    """Run independent queries concurrently and return their results by name"""
+    if QUERY_FANOUT_WORKERS < 1 or len(queries) < 2 or _in_worker.get() or in_transaction():
+        return {name: query() for name, query in queries.items()}
+
+    (first_name, first_query), *others = queries.items()
+    executor = get_executor()
+    futures = {
+        name: executor.submit(copy_context().run, run_in_worker, query)
+        for name, query in others
+    }
+    results = {first_name: first_query()}
+    results.update((name, future.result()) for name, future in futures.items())
+    return results
@@ -0,0 +1,102 @@
+# core/fastjson.py
+"""
+JSON encoding for API responses and WebSocket frames.
+
+Uses orjson when it is installed and falls back to the standard library
+with DRF's encoder otherwise. Both produce the same values: datetimes in
+ISO 8601 with a trailing Z for UTC, UUIDs as strings and Decimals as
+numbers, as DRF's JSONRenderer does.
+"""
+import codecs
+import datetime
+import decimal
+import json
+
+from django.conf import settings
+from django.db.models.query import QuerySet
+from django.utils.encoding import force_str
+from django.utils.functional import Promise
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+# Line and paragraph separators are escaped, as DRF does, so responses stay
+# valid JavaScript
+UNSAFE_SEPARATORS = ('\u2028'.encode(), '\u2029'.encode())
+
+
+def _default(obj):
+    """Types orjson does not serialize natively, encoded as DRF's encoder does"""
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, Promise):
+        return force_str(obj)
+    if isinstance(obj, datetime.timedelta):
+        return str(obj.total_seconds())
+    if isinstance(obj, QuerySet):
+        return list(obj)
+    if isinstance(obj, bytes):
+        return obj.decode()
+    if hasattr(obj, '__iter__'):
+        return list(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def dumps_bytes(data):
+    if orjson is not None:
+        return orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+    return json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def dumps(data):
+    """Encode data as a JSON string, e.g. for a WebSocket text frame"""
+    return dumps_bytes(data).decode()
+
+
+def loads(data):
+    """Decode a JSON str or bytes; raises ValueError on invalid input"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer that encodes with orjson; indented output still goes through DRF"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if orjson is None or indent is not None or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = dumps_bytes(data)
+        if UNSAFE_SEPARATORS[0] in ret or UNSAFE_SEPARATORS[1] in ret:
+            ret = ret.replace(UNSAFE_SEPARATORS[0], b'\\u2028').replace(UNSAFE_SEPARATORS[1], b'\\u2029')
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    """JSONParser that decodes UTF-8 request bodies with orjson"""
+
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
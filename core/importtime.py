@@ -0,0 +1,80 @@
+# core/importtime.py
+"""
+Measure what a worker imports while it boots.
+
+Each target is run in a fresh interpreter, the way a new worker process
+starts, so modules already imported by the caller do not hide their cost.
+"""
+import os
+import subprocess
+import sys
+from collections import Counter
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# What a worker has done by the time it can serve its first request
+TARGETS = {
+    'setup': 'import django\ndjango.setup()',
+    'wsgi': (
+        'import coursera.wsgi\n'
+        'from django.urls import get_resolver\n'
+        'get_resolver().url_patterns'
+    ),
+    'asgi': (
+        'import coursera.asgi\n'
+        'from django.urls import get_resolver\n'
+        'get_resolver().url_patterns'
+    ),
+}
+
+# Prints the number of modules loaded once the target has run
+COUNT_MODULES = '\nimport sys\nprint(len(sys.modules))'
+
+
+def run_target(target, importtime=False):
+    """Run target in a new interpreter and return the finished process"""
+    command = [sys.executable]
+    if importtime:
+        command += ['-X', 'importtime']
+    command += ['-c', TARGETS[target] + COUNT_MODULES]
+    env = dict(os.environ)
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'coursera.settings')
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(BASE_DIR), env.get('PYTHONPATH')]))
+    process = subprocess.run(command, capture_output=True, text=True, cwd=BASE_DIR, env=env)
+    if process.returncode:
+        raise RuntimeError(f'Importing for {target} failed:\n{process.stderr[-2000:]}')
+    return process
+
+
+def parse_importtime(output):
+    """(module, self µs, cumulative µs) for each import in -X importtime output"""
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the header line
+        imports.append((fields[2].strip(), int(fields[0]), int(fields[1])))
+    return imports
+
+
+def summarize(imports, top=20):
+    """Total time and the slowest modules and top-level packages, in milliseconds"""
+    packages = Counter()
+    for module, self_us, _ in imports:
+        packages[module.split('.')[0]] += self_us
+
+    def ms(us):
+        return round(us / 1000, 2)
+
+    return {
+        'modules': len(imports),
+        'total_ms': ms(sum(self_us for _, self_us, _ in imports)),
+        'cumulative': [(module, ms(cumulative)) for module, _, cumulative
+                       in sorted(imports, key=lambda row: -row[2])[:top]],
+        'self': [(module, ms(self_us)) for module, self_us, _
+                 in sorted(imports, key=lambda row: -row[1])[:top]],
+        'packages': [(package, ms(self_us)) for package, self_us in packages.most_common(top)],
+    }
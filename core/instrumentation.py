@@ -0,0 +1,272 @@
+# core/instrumentation.py
+"""
+Per-request query and latency instrumentation with per-view query budgets.
+
+QueryInstrumentationMiddleware records, for every request, the number of
+SQL queries, the time spent in them, duplicate queries (the same SQL run
+more than once, the usual sign of an N+1 loop) and the wall time of the
+view. With DEBUG on the figures are returned as X-Query-* response
+headers; otherwise they are added to an in-process histogram per URL
+pattern, served to staff by core.views.query_stats.
+
+Views declare their budget next to their definition:
+
+    @query_budget(3)
+    @api_view(['GET'])
+    def get_conversation_messages(request, conversation_id):
+
+A request over budget is logged. When QUERY_BUDGET_ENFORCE is set, as
+core.testing.QueryBudgetTestRunner does for the test suite, it raises
+QueryBudgetExceeded instead, so any test that hits the view fails.
+record_queries() gives tests the same figures for arbitrary code.
+
+Queries are recorded through context_execute_wrapper(), which follows the
+context rather than one thread's connections, so the queries an async view
+runs in sync_to_async threads are counted for its request too.
+"""
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Execute wrappers active in the current context, outermost first
+_context_wrappers = ContextVar('context_execute_wrappers', default=())
+
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+# IN lists vary in length between otherwise identical queries
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+# Savepoints come from atomic() blocks, not from the view's data access
+TRANSACTION_CONTROL = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def fingerprint(sql):
+    return IN_LIST.sub('IN (...)', sql)
+
+
+class QueryReport:
+    def __init__(self):
+        self.count = 0
+        self.sql_time = 0.0
+        self.fingerprints = Counter()
+        self.wall_time = 0.0
+        # Queries fanned out to worker threads (core.fanout) finish concurrently
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        """Database execute wrapper: records the query it runs, savepoints aside"""
+        if sql.startswith(TRANSACTION_CONTROL):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.sql_time += elapsed
+                self.count += 1
+                self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def duplicates(self):
+        """Executions of queries that had already run in this report"""
+        return sum(count - 1 for count in self.fingerprints.values())
+
+    def duplicated_queries(self):
+        return [(sql, count) for sql, count in self.fingerprints.most_common() if count > 1]
+
+    def check(self, budget):
+        """Return a description of every limit of the budget that was exceeded"""
+        failures = []
+        if budget.queries is not None and self.count > budget.queries:
+            failures.append(f'{self.count} queries (budget {budget.queries})')
+        if budget.duplicates is not None and self.duplicates > budget.duplicates:
+            failures.append(f'{self.duplicates} duplicate queries (budget {budget.duplicates})')
+        return failures
+
+
+@contextmanager
+def context_execute_wrapper(wrapper):
+    """
+    Like connection.execute_wrapper(), but for queries on any connection
+    made in the block, including from threads started by sync_to_async.
+    """
+    token = _context_wrappers.set(_context_wrappers.get() + (wrapper,))
+    try:
+        yield
+    finally:
+        _context_wrappers.reset(token)
+
+
+def _execute_with_context_wrappers(execute, sql, params, many, context):
+    for wrapper in reversed(_context_wrappers.get()):
+        execute = partial(wrapper, execute)
+    return execute(sql, params, many, context)
+
+
+def install_context_wrappers(sender, connection, **kwargs):
+    """connection_created receiver: route the connection's queries through the context wrappers"""
+    if _execute_with_context_wrappers not in connection.execute_wrappers:
+        # Inserted first: connection.execute_wrapper() removes the last
+        # wrapper on exit, which must stay its own when the connection is
+        # made inside such a block
+        connection.execute_wrappers.insert(0, _execute_with_context_wrappers)
+
+
+@contextmanager
+def record_queries():
+    """Record queries made in the block, on any database connection"""
+    report = QueryReport()
+    started = time.perf_counter()
+    with context_execute_wrapper(report):
+        try:
+            yield report
+        finally:
+            report.wall_time = time.perf_counter() - started
+
+
+class QueryBudget:
+    def __init__(self, queries=None, duplicates=None):
+        self.queries = queries
+        self.duplicates = duplicates
+
+
+def query_budget(queries=None, duplicates=None):
+    """Declare the most queries (and repeated queries) a view or view class may run per request"""
+    def decorator(view):
+        view.query_budget = QueryBudget(queries, duplicates)
+        return view
+    return decorator
+
+
+class EndpointStats:
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.duplicates = 0
+        self.sql_time = 0.0
+        self.wall_time = 0.0
+        self.over_budget = 0
+        self.query_histogram = [0] * (len(QUERY_COUNT_BUCKETS) + 1)
+        self.latency_histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def add(self, report, over_budget):
+        self.requests += 1
+        self.queries += report.count
+        self.duplicates += report.duplicates
+        self.sql_time += report.sql_time
+        self.wall_time += report.wall_time
+        self.over_budget += over_budget
+        self.query_histogram[bisect_left(QUERY_COUNT_BUCKETS, report.count)] += 1
+        self.latency_histogram[bisect_left(LATENCY_BUCKETS_MS, report.wall_time * 1000)] += 1
+
+    def as_dict(self):
+        return {
+            'requests': self.requests,
+            'queries_per_request': round(self.queries / self.requests, 2),
+            'duplicates_per_request': round(self.duplicates / self.requests, 2),
+            'sql_ms_per_request': round(self.sql_time * 1000 / self.requests, 2),
+            'wall_ms_per_request': round(self.wall_time * 1000 / self.requests, 2),
+            'over_budget': self.over_budget,
+            'queries': histogram(QUERY_COUNT_BUCKETS, self.query_histogram),
+            'latency_ms': histogram(LATENCY_BUCKETS_MS, self.latency_histogram),
+        }
+
+
+def histogram(bounds, counts):
+    """Bucket counts keyed by upper bound, as 'le_<bound>' plus 'inf'"""
+    labels = [f'le_{bound}' for bound in bounds] + ['inf']
+    return {label: count for label, count in zip(labels, counts) if count}
+
+
+_endpoint_stats = {}
+_stats_lock = threading.Lock()
+
+
+def get_endpoint_stats():
+    with _stats_lock:
+        return {endpoint: stats.as_dict() for endpoint, stats in sorted(_endpoint_stats.items())}
+
+
+def reset_endpoint_stats():
+    with _stats_lock:
+        _endpoint_stats.clear()
+
+
+def endpoint_name(request):
+    match = request.resolver_match
+    return f'{request.method} /{match.route}' if match else f'{request.method} (unresolved)'
+
+
+def view_query_budget(request):
+    """The budget declared by the view the request was routed to, if any"""
+    view_func = request.resolver_match.func if request.resolver_match else None
+    # Class-based DRF views carry the budget on the view class
+    return getattr(
+        view_func, 'query_budget', getattr(getattr(view_func, 'cls', None), 'query_budget', None)
+    )
+
+
+class QueryInstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with record_queries() as report:
+            response = self.get_response(request)
+        return self.process_report(request, report, response)
+
+    async def __acall__(self, request):
+        with record_queries() as report:
+            response = await self.get_response(request)
+        return self.process_report(request, report, response)
+    
+    def process_report(self, request, report, response):
+        budget = view_query_budget(request)
+        failures = report.check(budget) if budget is not None else []
+        endpoint = endpoint_name(request)
+
+        if settings.DEBUG:
+            response['X-Query-Count'] = report.count
+            response['X-Query-Duplicates'] = report.duplicates
+            response['X-Query-Time-Ms'] = f'{report.sql_time * 1000:.1f}'
+            response['X-View-Time-Ms'] = f'{report.wall_time * 1000:.1f}'
+            if budget is not None and budget.queries is not None:
+                response['X-Query-Budget'] = budget.queries
+        else:
+            with _stats_lock:
+                _endpoint_stats.setdefault(endpoint, EndpointStats()).add(report, bool(failures))
+
+        if failures:
+            message = f'{endpoint} exceeded its query budget: {", ".join(failures)}'
+            repeated = report.duplicated_queries()[:3]
+            if repeated:
+                message += '. Most repeated: ' + '; '.join(f'{count}x {sql}' for sql, count in repeated)
+            if getattr(settings, 'QUERY_BUDGET_ENFORCE', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
@@ -0,0 +1,42 @@
+# core/management/commands/import_profile.py
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.importtime import TARGETS, parse_importtime, run_target, summarize
+
+
+class Command(BaseCommand):
+    help = 'Profile the imports of a worker boot with python -X importtime'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', choices=list(TARGETS), default='wsgi',
+                            help='setup: django.setup(); wsgi/asgi: the application and URLconf')
+        parser.add_argument('--top', type=int, default=20, help='Modules and packages to list')
+        parser.add_argument('--raw', help='Also write the raw -X importtime output to this file')
+        parser.add_argument('--json', action='store_true', help='Print the summary as JSON')
+
+    def handle(self, *args, **options):
+        try:
+            process = run_target(options['target'], importtime=True)
+        except RuntimeError as exc:
+            raise CommandError(exc)
+        if options['raw']:
+            Path(options['raw']).write_text(process.stderr)
+
+        summary = summarize(parse_importtime(process.stderr), options['top'])
+        summary['target'] = options['target']
+        if options['json']:
+            self.stdout.write(json.dumps(summary, indent=2))
+            return
+
+        for title, key in (('Slowest imports, including their own imports', 'cumulative'),
+                           ('Slowest modules, excluding their imports', 'self'),
+                           ('Time per top-level package', 'packages')):
+            self.stdout.write(f'\n{title}:')
+            for name, ms in summary[key]:
+                self.stdout.write(f'  {ms:9.2f} ms  {name}')
+        self.stdout.write(self.style.SUCCESS(
+            f"\n{options['target']}: {summary['modules']} modules imported in {summary['total_ms']:.0f} ms"
+        ))
@@ -0,0 +1,24 @@
+# core/management/commands/run_channel_broker.py
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from core.channel_broker import DEFAULT_HOST, DEFAULT_PORT, ChannelBroker
+
+
+class Command(BaseCommand):
+    help = 'Run the bundled Redis-protocol pub/sub broker for the redis_pubsub channel layer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default=DEFAULT_HOST)
+        parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+
+    def handle(self, *args, **options):
+        broker = ChannelBroker(options['host'], options['port'])
+        self.stdout.write(
+            self.style.SUCCESS(f"Channel broker listening on {options['host']}:{options['port']}")
+        )
+        try:
+            asyncio.run(broker.serve_forever())
+        except KeyboardInterrupt:
+            self.stdout.write('Channel broker stopped')
@@ -0,0 +1,314 @@
+# core/management/commands/seed_scale.py
+import random
+import time
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from accounts.models import User
+from assessments.models import Quiz, QuizAttempt
+from core.models import Category
+from core.seeding import TableWriter, ZipfSampler
+from courses.models import Course, Lecture, Section
+from discussions.models import DirectMessage
+from enrollments.models import Enrollment, LectureProgress
+from payments.models import InstructorEarning
+from reviews.models import CourseReview
+
+CATEGORY_NAMES = [
+    'Development', 'Data Science', 'Business', 'Design', 'Marketing', 'IT & Software',
+    'Personal Development', 'Photography', 'Music', 'Health & Fitness', 'Language Learning', 'Finance',
+]
+LEVELS = ['beginner', 'intermediate', 'advanced', 'all_levels']
+REVIEW_RATING_WEIGHTS = [2, 3, 10, 30, 55]
+
+
+class Command(BaseCommand):
+    help = 'Generate a production-scale synthetic dataset for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=10000)
+        parser.add_argument('--instructors', type=int, default=200)
+        parser.add_argument('--courses', type=int, default=1000)
+        parser.add_argument('--sections', type=int, default=6, help='Mean sections per course')
+        parser.add_argument('--lectures', type=int, default=6, help='Mean lectures per section')
+        parser.add_argument('--enrollments', type=float, default=4.0, help='Mean enrollments per student')
+        parser.add_argument('--zipf', type=float, default=1.1,
+                            help='Exponent of the Zipf distribution of course popularity')
+        parser.add_argument('--quiz-attempt-rate', type=float, default=0.5,
+                            help='Share of enrollments past half way that attempt the course quiz')
+        parser.add_argument('--review-rate', type=float, default=0.15,
+                            help='Share of enrollments that leave a review')
+        parser.add_argument('--messages', type=int, default=50000)
+        parser.add_argument('--days', type=int, default=365, help='Days of history to spread activity over')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--copy', action='store_true',
+                            help='Load the large tables with PostgreSQL COPY instead of bulk_create')
+        parser.add_argument('--prefix', default='seed', help='Prefix of generated emails and slugs')
+        parser.add_argument('--password', default='testpass123', help='Password of every generated user')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed, for reproducible datasets')
+
+    def handle(self, *args, **options):
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('--copy needs PostgreSQL')
+        if options['students'] < 1 or options['instructors'] < 1 or options['courses'] < 1:
+            raise CommandError('--students, --instructors and --courses must be at least 1')
+        self.prefix = options['prefix']
+        if User.objects.filter(email__startswith=f'{self.prefix}-').exists():
+            raise CommandError(f'Users with the prefix "{self.prefix}" already exist; pass another --prefix')
+
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.now = timezone.now()
+        self.start = self.now - timedelta(days=options['days'])
+        self.started = time.monotonic()
+        self.totals = {}
+
+        self.seed_users()
+        self.seed_courses()
+        self.seed_enrollments()
+        self.seed_messages()
+        self.update_course_statistics()
+
+        summary = ', '.join(f'{count} {name}' for name, count in self.totals.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {summary} in {time.monotonic() - self.started:.0f}s'
+        ))
+
+    def writer(self, model, bulk=False, parents=()):
+        """Large tables use COPY when asked; small ones always go through bulk_create"""
+        return TableWriter(model, use_copy=self.options['copy'] and not bulk,
+                           batch_size=self.options['batch_size'], now=self.now, parents=parents)
+
+    def finish(self, name, writer):
+        self.totals[name] = writer.close()
+        self.stdout.write(f'  {self.totals[name]} {name} ({time.monotonic() - self.started:.0f}s)')
+
+    def random_time(self, after=None, before=None):
+        after = after or self.start
+        before = before or self.now
+        return after + (before - after) * self.rng.random()
+
+    def seed_users(self):
+        password = make_password(self.options['password'])
+        writer = self.writer(User)
+
+        def add_user(kind, number):
+            email = f'{self.prefix}-{kind}{number}@example.com'
+            joined = self.random_time()
+            return writer.add(
+                username=email, email=email, password=password, first_name=kind.title(),
+                last_name=str(number), user_type=kind, email_verified=True, date_joined=joined
+            ), joined
+
+        self.instructors = [add_user('instructor', i) for i in range(self.options['instructors'])]
+        self.students = [add_user('student', i) for i in range(self.options['students'])]
+        self.finish('users', writer)
+
+    def seed_courses(self):
+        rng = self.rng
+        categories = []
+        for name in CATEGORY_NAMES:
+            slug = name.lower().replace(' & ', '-').replace(' ', '-')
+            category, _ = Category.objects.get_or_create(name=name, defaults={'slug': slug})
+            categories.append(category.id)
+
+        courses = self.writer(Course, bulk=True)
+        sections = self.writer(Section, bulk=True, parents=[courses])
+        lectures = self.writer(Lecture, parents=[sections])
+        quizzes = self.writer(Quiz, bulk=True, parents=[courses])
+        # Index 0 is the most popular course in the Zipf draw
+        self.courses = []
+        instructor_sampler = ZipfSampler(len(self.instructors), 0.8, rng)
+        for number in range(self.options['courses']):
+            instructor_id, joined = self.instructors[instructor_sampler.sample()]
+            published = self.random_time(joined)
+            course_id = courses.add(
+                title=f'Course {number}', slug=f'{self.prefix}-course-{number}',
+                description=f'Synthetic course {number} for load testing.',
+                instructor_id=instructor_id, category_id=rng.choice(categories),
+                level=rng.choice(LEVELS), course_type=rng.choice(['free', 'coursera_plus']),
+                thumbnail='course_thumbnails/seed.jpg', status='published',
+                published_date=published, created_at=published
+            )
+
+            course_lectures = []
+            for order in range(max(1, round(rng.gauss(self.options['sections'], 2)))):
+                section_id = sections.add(
+                    course_id=course_id, title=f'Section {order + 1}', order=order, created_at=published
+                )
+                for lecture_order in range(max(1, round(rng.gauss(self.options['lectures'], 2)))):
+                    duration = rng.randint(120, 1200)
+                    lecture_id = lectures.add(
+                        section_id=section_id, title=f'Lecture {order + 1}.{lecture_order + 1}',
+                        content_type='video', order=lecture_order, video_duration=duration,
+                        created_at=published
+                    )
+                    course_lectures.append((lecture_id, duration))
+
+            quiz_id = quizzes.add(course_id=course_id, title=f'Course {number} final quiz', created_at=published)
+            self.courses.append({
+                'id': course_id, 'instructor_id': instructor_id, 'published': published,
+                'lectures': course_lectures, 'quiz_id': quiz_id,
+            })
+
+        self.finish('courses', courses)
+        self.finish('sections', sections)
+        self.finish('lectures', lectures)
+        self.finish('quizzes', quizzes)
+
+    def seed_enrollments(self):
+        rng = self.rng
+        enrollments = self.writer(Enrollment)
+        progress = self.writer(LectureProgress, parents=[enrollments])
+        attempts = self.writer(QuizAttempt, parents=[enrollments])
+        reviews = self.writer(CourseReview, parents=[enrollments])
+        course_sampler = ZipfSampler(len(self.courses), self.options['zipf'], rng)
+        mean_extra = max(self.options['enrollments'] - 1, 0.01)
+
+        self.enrolled = Counter()
+        self.ratings = {}
+        self.monthly = Counter()
+        # Student/instructor pairs that messages are drawn from
+        self.contacts = []
+
+        for student_id, joined in self.students:
+            count = 1 + int(rng.expovariate(1 / mean_extra))
+            for index in course_sampler.sample_unique(count):
+                course = self.courses[index]
+                enrolled = self.random_time(max(joined, course['published']))
+                lectures = course['lectures']
+                # Most learners stall early; a few finish
+                completed = min(len(lectures), int(rng.betavariate(0.6, 1.0) * (len(lectures) + 1)))
+
+                timestamp, spent = enrolled, 0
+                lecture_progress = []
+                for position, (lecture_id, duration) in enumerate(lectures[:completed + 1]):
+                    timestamp = self.random_time(timestamp, min(self.now, timestamp + timedelta(days=3)))
+                    done = position < completed
+                    watched = duration if done else rng.randint(0, duration)
+                    spent += watched
+                    lecture_progress.append(dict(
+                        lecture_id=lecture_id, is_completed=done,
+                        progress_seconds=watched, last_watched_position=watched, watch_count=1,
+                        completed_date=timestamp if done else None,
+                        created_at=timestamp, updated_at=timestamp
+                    ))
+
+                finished = completed == len(lectures)
+                enrollment_id = enrollments.add(
+                    student_id=student_id, course_id=course['id'], enrolled_date=enrolled,
+                    status='completed' if finished else 'active',
+                    completed_date=timestamp if finished else None,
+                    progress_percentage=Decimal(100 * completed / len(lectures)).quantize(Decimal('0.01')),
+                    last_accessed=timestamp, total_time_spent=spent,
+                    created_at=enrolled, updated_at=timestamp
+                )
+                for row in lecture_progress:
+                    progress.add(enrollment_id=enrollment_id, **row)
+                self.enrolled[course['id']] += 1
+                month = enrolled.date().replace(day=1)
+                self.monthly[course['id'], month, 'enrollments'] += 1
+                self.monthly[course['id'], month, 'minutes'] += spent // 60
+                if finished:
+                    self.monthly[course['id'], timestamp.date().replace(day=1), 'completions'] += 1
+
+                if completed * 2 >= len(lectures) and rng.random() < self.options['quiz_attempt_rate']:
+                    for attempt_number in range(1, rng.randint(1, 3) + 1):
+                        score = Decimal(rng.randint(30, 100))
+                        started = self.random_time(enrolled, timestamp)
+                        attempts.add(
+                            student_id=student_id, quiz_id=course['quiz_id'], enrollment_id=enrollment_id,
+                            attempt_number=attempt_number, start_time=started,
+                            end_time=started + timedelta(minutes=rng.randint(5, 40)),
+                            score=score, passed=score >= 60, created_at=started
+                        )
+                        if score >= 60:
+                            break
+
+                if rng.random() < self.options['review_rate']:
+                    rating = rng.choices(range(1, 6), REVIEW_RATING_WEIGHTS)[0]
+                    reviews.add(
+                        course_id=course['id'], student_id=student_id, enrollment_id=enrollment_id,
+                        rating=rating, title=f'{rating} stars', comment='Synthetic review.',
+                        is_verified_purchase=True, created_at=self.random_time(enrolled, max(enrolled, timestamp))
+                    )
+                    self.ratings.setdefault(course['id'], []).append(rating)
+
+                if len(self.contacts) < 100000:
+                    self.contacts.append((student_id, course['instructor_id']))
+
+        self.finish('enrollments', enrollments)
+        self.finish('lecture progress rows', progress)
+        self.finish('quiz attempts', attempts)
+        self.finish('reviews', reviews)
+        self.seed_earnings()
+
+    def seed_earnings(self):
+        earnings = self.writer(InstructorEarning, bulk=True)
+        instructors = {course['id']: course['instructor_id'] for course in self.courses}
+        months = sorted({(course_id, month) for course_id, month, _ in self.monthly})
+        for course_id, month in months:
+            enrolled = self.monthly[course_id, month, 'enrollments']
+            completions = self.monthly[course_id, month, 'completions']
+            minutes = self.monthly[course_id, month, 'minutes']
+            base = (Decimal(enrolled) * Decimal('2.50') + Decimal(minutes) * Decimal('0.01')).quantize(Decimal('0.01'))
+            multiplier = Decimal('1.20') if completions else Decimal('1.00')
+            earnings.add(
+                instructor_id=instructors[course_id], course_id=course_id, month=month,
+                enrollments_count=enrolled, completions_count=completions,
+                total_watch_minutes=minutes, base_amount=base, performance_multiplier=multiplier,
+                final_amount=(base * multiplier).quantize(Decimal('0.01')),
+                is_paid=month < self.now.date().replace(day=1)
+            )
+        self.finish('earnings', earnings)
+
+    def seed_messages(self):
+        rng = self.rng
+        messages = self.writer(DirectMessage)
+        remaining = self.options['messages']
+        while remaining > 0 and self.contacts:
+            user_a, user_b = rng.choice(self.contacts)
+            if rng.random() < 0.3:
+                # Classmates write to each other too
+                user_b = rng.choice(self.students)[0]
+                if user_b == user_a:
+                    continue
+            conversation_id = DirectMessage.get_conversation_id_for_ids(user_a, user_b)
+            length = min(remaining, 1 + int(rng.paretovariate(1.2)))
+            sent = self.random_time()
+            for number in range(length):
+                sender, recipient = (user_a, user_b) if number % 2 == 0 else (user_b, user_a)
+                sent = self.random_time(sent, min(self.now, sent + timedelta(hours=6)))
+                messages.add(
+                    sender_id=sender, recipient_id=recipient, conversation_id=conversation_id,
+                    content=f'Synthetic message {number + 1}', created_at=sent,
+                    is_read=sent < self.now - timedelta(days=1)
+                )
+            remaining -= length
+        self.finish('messages', messages)
+
+        # Conversation summaries are maintained by send_direct_message; rebuild them
+        call_command('backfill_conversations', batch_size=2000, stdout=StringIO())
+
+    def update_course_statistics(self):
+        courses = Course.objects.filter(id__in=[course['id'] for course in self.courses]).only('id')
+        updated = []
+        for course in courses:
+            ratings = self.ratings.get(course.id, [])
+            course.total_enrolled = self.enrolled[course.id]
+            course.total_reviews = len(ratings)
+            course.average_rating = (
+                Decimal(sum(ratings) / len(ratings)).quantize(Decimal('0.01')) if ratings else Decimal('0')
+            )
+            updated.append(course)
+        Course.objects.bulk_update(
+            updated, ['total_enrolled', 'total_reviews', 'average_rating'], batch_size=self.options['batch_size']
+        )
@@ -0,0 +1,167 @@
+# core/seeding.py
+"""
+Helpers for generating large synthetic datasets (see the seed_scale command).
+
+TableWriter inserts rows for one model in batches, either with bulk_create
+or with PostgreSQL COPY. It assigns primary keys itself, continuing from
+the table's current maximum, so rows can reference each other before they
+are written and nothing has to be read back; the id sequence is moved past
+the new rows when the writer is closed. It must not run while something
+else inserts into the same tables.
+
+Rows are written in batches as they are added, so a writer flushes the
+writers of the tables it references (its parents) before each batch.
+"""
+import bisect
+import io
+import itertools
+import json
+import random
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.management.color import no_style
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+
+
+class ZipfSampler:
+    """Draws indexes 0..n-1 with probability proportional to 1 / (rank + 1) ** exponent"""
+
+    def __init__(self, n, exponent=1.0, rng=random):
+        self.n = n
+        self.rng = rng
+        self.cum_weights = list(itertools.accumulate(1 / (rank + 1) ** exponent for rank in range(n)))
+        self.total = self.cum_weights[-1]
+
+    def sample(self):
+        return bisect.bisect(self.cum_weights, self.rng.random() * self.total, 0, self.n - 1)
+
+    def sample_unique(self, k):
+        """k distinct indexes in ascending order, i.e. most popular first"""
+        k = min(k, self.n)
+        chosen = set()
+        while len(chosen) < k:
+            chosen.add(self.sample())
+        return sorted(chosen)
+
+
+@contextmanager
+def historical_timestamps(*models):
+    """Let bulk_create keep the created_at/updated_at values it is given"""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+COPY_FORMATTERS = {
+    type(None): lambda value: '\\N',
+    bool: lambda value: 't' if value else 'f',
+    int: str,
+    Decimal: str,
+    uuid.UUID: str,
+    datetime: datetime.isoformat,
+    date: date.isoformat,
+    str: lambda value: value.translate(COPY_ESCAPES),
+    list: lambda value: json.dumps(value).translate(COPY_ESCAPES),
+    dict: lambda value: json.dumps(value).translate(COPY_ESCAPES),
+}
+
+
+def copy_value(value):
+    """Format one value for COPY ... FROM STDIN in text format"""
+    formatter = COPY_FORMATTERS.get(type(value))
+    if formatter is None:
+        return str(value).translate(COPY_ESCAPES)
+    return formatter(value)
+
+
+def random_uuid():
+    """A random version 4 UUID; cheaper than uuid4(), which reads os.urandom"""
+    return uuid.UUID(int=random.getrandbits(128), version=4)
+
+
+class TableWriter:
+    def __init__(self, model, use_copy=False, batch_size=5000, now=None, parents=()):
+        self.model = model
+        self.parents = parents
+        self.use_copy = use_copy
+        self.batch_size = batch_size
+        self.now = now or timezone.now()
+        self.fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+        self.has_uuid = any(field.attname == 'uuid' for field in self.fields)
+        # auto_now/auto_now_add fields default to the row's created_at
+        self.timestamps = [
+            field.attname for field in self.fields
+            if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+        ]
+        # Django defaults live in Python, so COPY rows spell every column out
+        self.defaults = {field.attname: field.get_default() for field in self.fields}
+        self.next_id = (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+        self.pending = []
+        self.written = 0
+
+    def add(self, **values):
+        """Queue a row and return the primary key it will be written with"""
+        pk = self.next_id
+        self.next_id += 1
+        values['id'] = pk
+        if self.has_uuid:
+            values.setdefault('uuid', random_uuid())
+        created = values.get('created_at', self.now)
+        for attname in self.timestamps:
+            values.setdefault(attname, created)
+        self.pending.append(values)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+        return pk
+
+    def flush(self):
+        rows, self.pending = self.pending, []
+        if not rows:
+            return
+        for parent in self.parents:
+            parent.flush()
+        if self.use_copy:
+            self.copy(rows)
+        else:
+            with historical_timestamps(self.model):
+                self.model.objects.bulk_create([self.model(**row) for row in rows])
+        self.written += len(rows)
+
+    def copy(self, rows):
+        attnames = ['id'] + [field.attname for field in self.fields]
+        defaults = self.defaults
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write('\t'.join(
+                copy_value(row[attname] if attname in row else defaults[attname]) for attname in attnames
+            ))
+            buffer.write('\n')
+        buffer.seek(0)
+
+        columns = ', '.join(connection.ops.quote_name(field.column) for field in [self.model._meta.pk] + self.fields)
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.cursor.copy_expert(f'COPY {table} ({columns}) FROM STDIN', buffer)
+
+    def close(self):
+        self.flush()
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [self.model]):
+                cursor.execute(sql)
+        return self.written
@@ -0,0 +1,17 @@
+# core/testing.py
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class QueryBudgetTestRunner(DiscoverRunner):
+    """Test runner that fails any request exceeding its view's query budget"""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.QUERY_BUDGET_ENFORCE = True
+        # Replica aliases only mirror default under test; keep reads on
+        # default so tests need not list the replicas in their databases
+        settings.DATABASE_REPLICAS = []
+        # Tests authenticate with DRF's force_authenticate(), which the
+        # async read views do not see; they are tested directly instead
+        settings.ASYNC_READ_VIEWS = False
@@ -1,3 +1,520 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import logging
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import psycopg2
+from psycopg2 import extensions
+
+from asgiref.sync import async_to_sync
+from django.apps import apps
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, router, transaction
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import path
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ParseError
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from courses.models import Course
+from discussions.models import Conversation, DirectMessage
+from enrollments.models import Enrollment, LectureProgress
+from . import fastjson
+from .backends.postgresql_pool.pool import ConnectionPool
+from .channel_broker import ChannelBroker, ProtocolError, encode_array, read_command
+from .checks import check_shared_cache
+from .dbrouting import read_from_replica, use_replica
+from .eventlog import EventLogger
+from .exports import ExportColumn, export_format_error, parquet_available, streaming_export
+from .fanout import fan_out
+from .importtime import parse_importtime, summarize
+from .instrumentation import (
+    QueryBudgetExceeded, get_endpoint_stats, query_budget, record_queries, reset_endpoint_stats
+)
+from .models import Category
+
+
+@query_budget(2, duplicates=0)
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def category_names(request):
+    """One query for the categories, then an N+1 over their parents"""
+    categories = list(Category.objects.order_by('name'))
+    return Response([
+        [category.name, category.parent.name if category.parent_id else None]
+        for category in categories
+    ])
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def rename_category(request):
+    Category.objects.filter(slug='python').update(name=request.data['name'])
+    return Response({})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@use_replica
+def category_database(request):
+    return Response({'database': Category.objects.all().db})
+
+
+urlpatterns = [
+    path('categories/', category_names),
+    path('categories/rename/', rename_category),
+    path('categories/database/', category_database),
+]
+
+
+class Unformattable:
+    def __str__(self):
+        raise AssertionError('formatted a field that was not logged')
+
+
+class EventLoggerTests(SimpleTestCase):
+    def setUp(self):
+        self.log = EventLogger('core.tests.events', sample_rates={'sampled': 0}, summary_interval=3600)
+
+    def test_disabled_events_are_counted_but_not_formatted(self):
+        logging.getLogger('core.tests.events').setLevel(logging.INFO)
+        self.log.debug('ws.receive', payload=Unformattable())
+        self.log.debug('ws.receive', payload=Unformattable())
+        self.assertEqual(self.log.snapshot(), {'ws.receive': 2})
+
+    def test_sampled_out_events_are_not_logged(self):
+        with self.assertLogs('core.tests.events', level='DEBUG') as logs:
+            self.log.info('sampled', payload=Unformattable())
+            self.log.info('kept', user_id=1, type='typing')
+        self.assertEqual(logs.output, ['INFO:core.tests.events:kept user_id=1 type=typing'])
+        self.assertEqual(logs.records[0].event_fields, {'user_id': 1, 'type': 'typing'})
+
+
+class FastJSONTests(SimpleTestCase):
+    data = {
+        'price': Decimal('49.99'),
+        'uuid': uuid.UUID(int=7),
+        'created_at': datetime(2024, 5, 1, 12, 30, 15, 250, tzinfo=timezone.utc),
+        'duration': timedelta(minutes=2),
+        'title': 'Line\u2028break',
+        1: [1, 2],
+    }
+
+    def test_renderer_matches_drf_with_and_without_orjson(self):
+        expected = fastjson.loads(JSONRenderer().render(self.data))
+        rendered = fastjson.FastJSONRenderer().render(self.data)
+        self.assertEqual(fastjson.loads(rendered), expected)
+        self.assertIn(b'"2024-05-01T12:30:15.000250Z"', rendered)
+        self.assertIn(b'\\u2028', rendered)
+
+        with mock.patch.object(fastjson, 'orjson', None):
+            self.assertEqual(fastjson.loads(fastjson.FastJSONRenderer().render(self.data)), expected)
+            self.assertEqual(fastjson.loads(fastjson.dumps(self.data)), expected)
+
+    def test_parser_rejects_invalid_json(self):
+        parser = fastjson.FastJSONParser()
+        self.assertEqual(parser.parse(io.BytesIO(b'{"content": "caf\xc3\xa9"}')), {'content': 'caf\u00e9'})
+        with self.assertRaises(ParseError):
+            parser.parse(io.BytesIO(b'{"content": '))
+
+
+class ExportTests(SimpleTestCase):
+    columns = [
+        ExportColumn('month', 'date'),
+        ExportColumn('course', 'string'),
+        ExportColumn('enrollments', 'int'),
+        ExportColumn('amount', 'decimal'),
+        ExportColumn('is_paid', 'bool'),
+        ExportColumn('payout_date', 'datetime'),
+    ]
+    paid_at = datetime(2024, 2, 5, 9, 30, tzinfo=timezone.utc)
+
+    def rows(self, count=1200):
+        return (
+            (date(2024, 1, 1), f'Course {index}', index, Decimal(index) / 4, index % 2 == 0,
+             self.paid_at if index % 2 == 0 else None)
+            for index in range(count)
+        )
+
+    def export(self, export_format, request=None):
+        response = streaming_export(
+            request or RequestFactory().get('/'), 'earnings', self.columns, self.rows(), export_format
+        )
+        return response, b''.join(response.streaming_content)
+
+    def test_csv_streams_every_row(self):
+        response, body = self.export('csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="earnings.csv"')
+
+        rows = list(csv.reader(io.StringIO(body.decode())))
+        self.assertEqual(rows[0], ['month', 'course', 'enrollments', 'amount', 'is_paid', 'payout_date'])
+        self.assertEqual(len(rows), 1201)
+        self.assertEqual(rows[1], ['2024-01-01', 'Course 0', '0', '0', 'True', self.paid_at.isoformat()])
+        self.assertEqual(rows[4], ['2024-01-01', 'Course 3', '3', '0.75', 'False', ''])
+
+    @skipUnless(parquet_available(), 'pyarrow is not installed')
+    def test_parquet_keeps_the_column_types(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        response, body = self.export('parquet')
+        self.assertEqual(response['Content-Type'], 'application/vnd.apache.parquet')
+        table = pq.read_table(io.BytesIO(body))
+        self.assertEqual(table.num_rows, 1200)
+        self.assertEqual(table.schema.field('amount').type, pa.decimal128(12, 2))
+        self.assertEqual(table.schema.field('enrollments').type, pa.int64())
+        self.assertEqual(table.schema.field('payout_date').type, pa.timestamp('us', tz='UTC'))
+
+        data = table.slice(0, 4).to_pydict()
+        self.assertEqual(data['amount'], [Decimal('0.00'), Decimal('0.25'), Decimal('0.50'), Decimal('0.75')])
+        self.assertEqual(data['month'][0], date(2024, 1, 1))
+        self.assertEqual(data['payout_date'][:2], [self.paid_at, None])
+
+    def test_asgi_requests_get_an_async_stream(self):
+        response = streaming_export(AsyncRequestFactory().get('/'), 'earnings', self.columns, self.rows(), 'csv')
+        self.assertTrue(response.is_async)
+
+        async def read():
+            return b''.join([chunk async for chunk in response.streaming_content])
+
+        _, body = self.export('csv')
+        self.assertEqual(async_to_sync(read)(), body)
+
+    def test_unknown_formats_are_rejected(self):
+        self.assertIn('Unsupported export format', export_format_error('xml'))
+        self.assertIsNone(export_format_error('csv'))
+
+
+@override_settings(ROOT_URLCONF='core.tests')
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        parent = Category.objects.create(name='Development', slug='development')
+        Category.objects.create(name='Python', slug='python', parent=parent)
+
+    def setUp(self):
+        reset_endpoint_stats()
+
+    def test_record_queries_fingerprints_duplicates(self):
+        with record_queries() as report:
+            list(User.objects.filter(id__in=[1, 2]))
+            list(User.objects.filter(id__in=[3, 4, 5]))
+            Category.objects.count()
+        self.assertEqual(report.count, 3)
+        self.assertEqual(report.duplicates, 1)
+        self.assertIn('IN (...)', report.duplicated_queries()[0][0])
+
+    @override_settings(DEBUG=True)
+    def test_debug_responses_carry_query_headers(self):
+        response = self.client.get('/categories/')
+        self.assertEqual(response['X-Query-Count'], '2')
+        self.assertEqual(response['X-Query-Duplicates'], '0')
+        self.assertEqual(response['X-Query-Budget'], '2')
+
+    def test_budget_failures_raise_under_the_test_runner(self):
+        Category.objects.create(name='Django', slug='django', parent=Category.objects.get(slug='python'))
+        with self.assertRaisesMessage(QueryBudgetExceeded, '3 queries (budget 2)'):
+            self.client.get('/categories/')
+
+    @override_settings(QUERY_BUDGET_ENFORCE=False)
+    def test_budget_failures_are_counted_in_production(self):
+        Category.objects.create(name='Django', slug='django', parent=Category.objects.get(slug='python'))
+        with self.assertLogs('core.instrumentation', level='WARNING') as logs:
+            self.client.get('/categories/')
+            self.client.get('/categories/')
+        self.assertIn('Most repeated: 2x SELECT', logs.output[0])
+
+        stats = get_endpoint_stats()['GET /categories/']
+        self.assertEqual(stats['requests'], 2)
+        self.assertEqual(stats['over_budget'], 2)
+        self.assertEqual(stats['queries'], {'le_5': 2})
+
+
+@override_settings(ROOT_URLCONF='core.tests', DATABASE_REPLICAS=['replica1'])
+class ReplicaRoutingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Category.objects.create(name='Python', slug='python')
+        cls.user = User.objects.create(username='writer', email='writer@test.com')
+        cls.other = User.objects.create(username='reader', email='reader@test.com')
+    
+    def setUp(self):
+        cache.clear()
+    
+    def get_database(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.get('/categories/database/').json()['database']
+    
+    def test_writes_never_go_to_replicas(self):
+        with read_from_replica():
+            self.assertEqual(Category.objects.all().db, 'replica1')
+            for model in apps.get_models():
+                self.assertEqual(router.db_for_write(model), 'default')
+            
+            category = Category.objects.create(name='Django', slug='django')
+            self.assertEqual(category._state.db, 'default')
+            self.assertEqual(Category.objects.filter(slug='django').select_for_update().db, 'default')
+        self.assertFalse(router.allow_migrate('replica1', 'courses', model_name='course'))
+    
+    def test_users_read_their_own_writes_from_the_primary(self):
+        self.assertEqual(self.get_database(self.user), 'replica1')
+        
+        client = APIClient()
+        client.force_authenticate(self.user)
+        client.post('/categories/rename/', {'name': 'Python 3'})
+        
+        self.assertEqual(self.get_database(self.user), 'default')
+        self.assertEqual(self.get_database(self.other), 'replica1')
+
+
+class FanOutTests(SimpleTestCase):
+    databases = {'default'}
+    
+    def query(self, seconds=0.2):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_sleep(%s)', [seconds])
+        return threading.get_ident()
+    
+    def test_queries_run_concurrently_on_their_own_connections(self):
+        started = time.perf_counter()
+        with record_queries() as report:
+            results = fan_out(first=self.query, second=self.query, third=self.query)
+        elapsed = time.perf_counter() - started
+        
+        self.assertEqual(list(results), ['first', 'second', 'third'])
+        self.assertEqual(results['first'], threading.get_ident())
+        self.assertEqual(len(set(results.values())), 3)
+        self.assertLess(elapsed, 0.5)
+        # Recorded from the worker threads too
+        self.assertEqual(report.count, 3)
+    
+    @override_settings(DATABASE_REPLICAS=['replica1'])
+    def test_workers_share_the_callers_context(self):
+        def database():
+            return Category.objects.all().db
+        
+        with read_from_replica():
+            results = fan_out(first=database, second=database)
+        self.assertEqual(results, {'first': 'replica1', 'second': 'replica1'})
+    
+    def test_errors_reach_the_caller(self):
+        def fail():
+            raise ValueError('query failed')
+        
+        with self.assertRaisesMessage(ValueError, 'query failed'):
+            fan_out(first=self.query, second=fail)
+    
+    def test_queries_in_a_transaction_run_inline(self):
+        with transaction.atomic():
+            results = fan_out(first=lambda: self.query(0), second=lambda: self.query(0))
+        self.assertEqual(set(results.values()), {threading.get_ident()})
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.info = SimpleNamespace(transaction_status=extensions.TRANSACTION_STATUS_IDLE)
+    
+    def close(self):
+        self.closed = 1
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def test_returned_connections_are_reused_unless_mid_transaction(self):
+        pool = ConnectionPool(max_size=2, timeout=1, check_idle=30)
+        connection = pool.getconn(FakeConnection)
+        pool.putconn(connection)
+        self.assertIs(pool.getconn(FakeConnection), connection)
+        
+        connection.info.transaction_status = extensions.TRANSACTION_STATUS_INTRANS
+        pool.putconn(connection)
+        self.assertTrue(connection.closed)
+        self.assertIsNot(pool.getconn(FakeConnection), connection)
+        self.assertEqual(pool.stats(), {'max_size': 2, 'in_use': 1, 'idle': 0, 'opened': 2, 'reused': 1})
+    
+    def test_full_pool_hands_connections_to_waiting_threads(self):
+        pool = ConnectionPool(max_size=1, timeout=0.05, check_idle=30)
+        connection = pool.getconn(FakeConnection)
+        with self.assertRaises(psycopg2.OperationalError):
+            pool.getconn(FakeConnection)
+        
+        pool.timeout = 5
+        returner = threading.Timer(0.05, pool.putconn, [connection])
+        returner.start()
+        started = time.monotonic()
+        self.assertIs(pool.getconn(FakeConnection), connection)
+        self.assertLess(time.monotonic() - started, 5)
+        returner.join()
+
+
+class ImportTimeTests(SimpleTestCase):
+    def test_importtime_output_is_summarized_per_module_and_package(self):
+        output = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       300 |        300 |     yaml.reader\n'
+            'import time:      1200 |       1500 |   yaml\n'
+            'import time:       500 |       2000 | rest_framework.compat\n'
+            'unrelated stderr line\n'
+        )
+        imports = parse_importtime(output)
+        self.assertEqual(imports[0], ('yaml.reader', 300, 300))
+        
+        summary = summarize(imports, top=2)
+        self.assertEqual(summary['modules'], 3)
+        self.assertEqual(summary['total_ms'], 2.0)
+        self.assertEqual(summary['cumulative'], [('rest_framework.compat', 2.0), ('yaml', 1.5)])
+        self.assertEqual(summary['self'], [('yaml', 1.2), ('rest_framework.compat', 0.5)])
+        self.assertEqual(summary['packages'], [('yaml', 1.5), ('rest_framework', 0.5)])
+
+
+def stream_of(data):
+    reader = asyncio.StreamReader()
+    reader.feed_data(data)
+    reader.feed_eof()
+    return reader
+
+
+REDIS_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache'}}
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+    def test_warns_when_several_workers_share_nothing(self):
+        with override_settings(CHANNEL_LAYER='memory', DATABASE_REPLICAS=[]):
+            self.assertEqual(check_shared_cache(None), [])
+        with override_settings(CHANNEL_LAYER='redis_pubsub', DATABASE_REPLICAS=[]):
+            self.assertEqual([warning.id for warning in check_shared_cache(None)], ['core.W001'])
+        with override_settings(CHANNEL_LAYER='redis_pubsub', DATABASE_REPLICAS=['replica1']):
+            self.assertEqual([warning.id for warning in check_shared_cache(None)], ['core.W001', 'core.W002'])
+        with override_settings(CHANNEL_LAYER='redis_pubsub', DATABASE_REPLICAS=['replica1'], CACHES=REDIS_CACHES):
+            self.assertEqual(check_shared_cache(None), [])
+
+
+class ChannelBrokerTests(SimpleTestCase):
+    async def test_commands_are_parsed(self):
+        self.assertEqual(await read_command(stream_of(b'*2\r\n$9\r\nSUBSCRIBE\r\n$3\r\nfoo\r\n')),
+                         [b'SUBSCRIBE', b'foo'])
+        self.assertEqual(await read_command(stream_of(b'*1\r\n$0\r\n\r\n')), [b''])
+        self.assertEqual(await read_command(stream_of(b'PING hello\r\n')), [b'PING', b'hello'])
+        self.assertIsNone(await read_command(stream_of(b'')))
+
+    async def test_malformed_commands_raise_protocol_errors(self):
+        for data in [
+            b'*x\r\n', b'*-1\r\n', b'*1\r\n$abc\r\n', b'*1\r\n$-5\r\n',
+            b'*1\r\n+OK\r\n', b'*1\r\n$3\r\nfoobar\r\n', b'PING',
+        ]:
+            with self.subTest(data=data), self.assertRaises(ProtocolError):
+                await read_command(stream_of(data))
+
+    async def connect(self, broker, *commands):
+        reader, writer = await asyncio.open_connection('127.0.0.1', broker.port)
+        for command in commands:
+            writer.write(encode_array(command))
+        self.writers.append(writer)
+        return reader, writer
+
+    @asynccontextmanager
+    async def running_broker(self):
+        broker = await ChannelBroker(port=0).start()
+        self.writers = []
+        try:
+            yield broker
+        finally:
+            for writer in self.writers:
+                writer.close()
+            await broker.close()
+
+    async def expect(self, reader, items):
+        expected = encode_array(items)
+        self.assertEqual(await asyncio.wait_for(reader.readexactly(len(expected)), 2), expected)
+
+    async def test_publish_fans_out_to_subscribers(self):
+        async with self.running_broker() as broker:
+            first, _ = await self.connect(broker, [b'SUBSCRIBE', b'chat.1', b'chat.2'])
+            second, _ = await self.connect(broker, [b'SUBSCRIBE', b'chat.1'])
+            pattern, _ = await self.connect(broker, [b'PSUBSCRIBE', b'chat.*'])
+            await self.expect(first, [b'subscribe', b'chat.1', 1])
+            await self.expect(first, [b'subscribe', b'chat.2', 2])
+            await self.expect(second, [b'subscribe', b'chat.1', 1])
+            await self.expect(pattern, [b'psubscribe', b'chat.*', 1])
+
+            publisher, _ = await self.connect(broker, [b'PUBLISH', b'chat.1', b'hello'])
+            self.assertEqual(await asyncio.wait_for(publisher.readline(), 2), b':3\r\n')
+            await self.expect(first, [b'message', b'chat.1', b'hello'])
+            await self.expect(second, [b'message', b'chat.1', b'hello'])
+            await self.expect(pattern, [b'pmessage', b'chat.*', b'chat.1', b'hello'])
+
+    async def test_malformed_input_closes_only_that_connection(self):
+        async with self.running_broker() as broker:
+            subscriber, _ = await self.connect(broker, [b'SUBSCRIBE', b'chat.1'])
+            await self.expect(subscriber, [b'subscribe', b'chat.1', 1])
+            broken, writer = await self.connect(broker, [b'SUBSCRIBE', b'chat.1'])
+            await self.expect(broken, [b'subscribe', b'chat.1', 1])
+
+            writer.write(b'*1\r\n$zz\r\n')
+            self.assertEqual(await asyncio.wait_for(broken.readline(), 2),
+                             b'-ERR Protocol error: Invalid bulk length\r\n')
+            self.assertEqual(await asyncio.wait_for(broken.read(), 2), b'')
+
+            publisher, _ = await self.connect(broker, [b'PUBLISH', b'chat.1', b'still here'])
+            self.assertEqual(await asyncio.wait_for(publisher.readline(), 2), b':1\r\n')
+            await self.expect(subscriber, [b'message', b'chat.1', b'still here'])
+
+    async def test_serves_the_redis_pubsub_channel_layer(self):
+        from channels_redis.pubsub import RedisPubSubChannelLayer
+
+        async with self.running_broker() as broker:
+            layers = [RedisPubSubChannelLayer(hosts=[f'redis://127.0.0.1:{broker.port}']) for _ in range(2)]
+            try:
+                channels = [await layer.new_channel() for layer in layers]
+                for layer, channel in zip(layers, channels):
+                    await layer.group_add('chat', channel)
+                await layers[0].group_send('chat', {'type': 'chat.message', 'content': 'hi'})
+                for layer, channel in zip(layers, channels):
+                    message = await asyncio.wait_for(layer.receive(channel), 2)
+                    self.assertEqual(message['content'], 'hi')
+            finally:
+                for layer in layers:
+                    await layer.flush()
+
+
+class SeedScaleTests(TestCase):
+    def seed(self, **options):
+        options = {'students': 60, 'instructors': 3, 'courses': 8, 'messages': 40, **options}
+        call_command('seed_scale', stdout=io.StringIO(), **options)
+
+    def test_bulk_create_and_copy_produce_consistent_data(self):
+        self.seed(prefix='bulk')
+        self.seed(prefix='copy', copy=True, batch_size=100)
+
+        self.assertEqual(User.objects.filter(email__startswith='copy-').count(), 63)
+        for prefix in ('bulk', 'copy'):
+            courses = Course.objects.filter(slug__startswith=f'{prefix}-')
+            enrollments = Enrollment.objects.filter(course__in=courses)
+            self.assertEqual(sum(course.total_enrolled for course in courses), enrollments.count())
+        self.assertEqual(DirectMessage.objects.count(), 80)
+        self.assertTrue(Conversation.objects.exists())
+        self.assertFalse(LectureProgress.objects.exclude(enrollment__in=Enrollment.objects.all()).exists())
+
+        # Sequences continue after the generated ids
+        self.assertGreater(User.objects.create(username='new', email='new@test.com').id,
+                           User.objects.filter(email__startswith='copy-').latest('id').id)
+
+    def test_existing_prefix_is_rejected(self):
+        self.seed(prefix='again', messages=0)
+        with self.assertRaisesMessage(CommandError, 'already exist'):
+            self.seed(prefix='again')
@@ -4,5 +4,5 @@ from . import views
 app_name = 'core'
 
 urlpatterns = [
-    # Add your URL patterns here
+    path('query-stats/', views.query_stats, name='query-stats'),
 ]
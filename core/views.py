@@ -1,3 +1,13 @@
-from django.shortcuts import render
+# core/views.py
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
 
-# Create your views here.
+from .instrumentation import get_endpoint_stats
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def query_stats(request):
+    """Query and latency histograms per endpoint, for this worker process"""
+    return Response({'endpoints': get_endpoint_stats()})
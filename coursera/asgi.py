@@ -19,7 +19,6 @@ django.setup()
 
 # Now import Django Channels modules
 from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
 from discussions.routing import websocket_urlpatterns
 from discussions.middleware import JWTAuthMiddlewareStack
 
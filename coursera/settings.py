@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 
+from decouple import Csv, config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -37,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 ]
 
 EXTERNAL_APPS = [
@@ -64,6 +67,8 @@ INSTALLED_APPS += EXTERNAL_APPS
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'core.instrumentation.QueryInstrumentationMiddleware',
+    'core.dbrouting.ReplicaStickinessMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -93,21 +98,70 @@ TEMPLATES = [
 WSGI_APPLICATION = 'coursera.wsgi.application'
 ASGI_APPLICATION = 'coursera.asgi.application'
 
+# Serve the catalog, enrolled courses and conversation list with async views
+# that await the ORM instead of running in a thread per request. For ASGI
+# workers only: under WSGI each async view call starts an event loop of its
+# own. python -m benchmarks.async_views compares the two.
+ASYNC_READ_VIEWS = config('ASYNC_READ_VIEWS', default=False, cast=bool)
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# By default each worker process shares a pool of at most DB_POOL_MAX_SIZE
+# connections between its threads (see core.backends.postgresql_pool).
+# With DB_POOL=False every thread has its own connection, kept for
+# DB_CONN_MAX_AGE seconds (0 closes it after every request) and checked
+# before reuse when DB_CONN_HEALTH_CHECKS is on. Keep DB_CONN_MAX_AGE at 0
+# under ASGI: requests run in short-lived threads whose persistent
+# connections are never reused (python -m benchmarks.db_connections)
+DB_POOL = config('DB_POOL', default=True, cast=bool)
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'core.backends.postgresql_pool' if DB_POOL else 'django.db.backends.postgresql',
         'NAME': 'coursera_db', # What is name here? Name is the name of your database
         'USER': 'coursera_admin',
         'PASSWORD': '123',
         'HOST': 'localhost',
         'PORT': '5432',
+        'CONN_MAX_AGE': 0 if DB_POOL else config('DB_CONN_MAX_AGE', default=0, cast=int),
+        'CONN_HEALTH_CHECKS': config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool),
+        'OPTIONS': {
+            'pool': {
+                'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+                'timeout': config('DB_POOL_TIMEOUT', default=10, cast=float),
+            },
+        } if DB_POOL else {},
     }
 }
 
+# Read replicas of the default database, as comma-separated host[:port][/name]
+# entries (e.g. replica-1:5432,localhost:5432/coursera_replica). Views marked
+# with core.dbrouting.use_replica read from them; writes always go to default
+DATABASE_REPLICAS = []
+for number, replica in enumerate(config('DATABASE_REPLICA_HOSTS', default='', cast=Csv()), 1):
+    address, _, name = replica.partition('/')
+    host, _, port = address.partition(':')
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'NAME': name or DATABASES['default']['NAME'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['core.dbrouting.ReplicaRouter']
+
+# Seconds a user's reads stay on the primary after a request of theirs wrote
+REPLICA_STICKINESS_SECONDS = config('REPLICA_STICKINESS_SECONDS', default=5, cast=float)
+
+# Threads per process that dashboards run their independent queries on
+# (core.fanout.fan_out); 0 runs them one after another. Each holds a
+# connection while it runs, so leave room for them in DB_POOL_MAX_SIZE
+QUERY_FANOUT_WORKERS = config('QUERY_FANOUT_WORKERS', default=4, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -161,10 +215,53 @@ CORS_ALLOW_ALL_ORIGINS = True  # Only for development!
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
+    ),
+    # orjson-backed JSON when orjson is installed, DRF's JSON otherwise
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.fastjson.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'core.fastjson.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ),
 }
 
+# Cache
+# Set CACHE_URL (redis://...) whenever more than one process serves the
+# site: the cached auth users, conversation members, WebSocket presence
+# counts and replica pins are only shared between workers through a shared
+# cache. Without it each
+# process has its own in-memory cache, which is only right for a single
+# worker (development)
+CACHE_URL = config('CACHE_URL', default='')
+
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+
+# Seconds a token's user stays cached for REST and WebSocket authentication.
+# A per-process cache is only invalidated in the worker that saved the user,
+# so the others may serve a deactivated user until the entry expires
+USER_CACHE_TIMEOUT = config('USER_CACHE_TIMEOUT', default=60 if CACHE_URL else 10, cast=int)
+
+# Seconds a group conversation's members stay cached for WebSocket checks;
+# like the user cache, a per-process cache may serve members that changed
+# on another worker until the entry expires
+MEMBERSHIP_CACHE_TIMEOUT = config('MEMBERSHIP_CACHE_TIMEOUT', default=300 if CACHE_URL else 10, cast=int)
+
 # JWT Settings
 from datetime import timedelta
 
@@ -177,17 +274,55 @@ SIMPLE_JWT = {
 }
 
 # Channels Configuration
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer',
-        'CONFIG': {
-            'capacity': 1500,  # Maximum number of messages to store
-            'expiry': 60,      # Messages expire after 60 seconds
+# CHANNEL_LAYER selects the backend:
+#   memory       - in-process only, single ASGI worker (default for development)
+#   redis_pubsub - Redis pub/sub; works with Redis or the bundled broker
+#                  (python manage.py run_channel_broker)
+#   redis        - channels_redis core layer; needs a real Redis server
+CHANNEL_LAYER = config('CHANNEL_LAYER', default='memory')
+CHANNEL_REDIS_URL = config('CHANNEL_REDIS_URL', default='redis://127.0.0.1:6379')
+
+if CHANNEL_LAYER == 'redis_pubsub':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.pubsub.RedisPubSubChannelLayer',
+            'CONFIG': {
+                'hosts': [CHANNEL_REDIS_URL],
+            },
         },
-    },
+    }
+elif CHANNEL_LAYER == 'redis':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {
+                'hosts': [CHANNEL_REDIS_URL],
+                'capacity': 1500,
+                'expiry': 60,
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+            'CONFIG': {
+                'capacity': 1500,  # Maximum number of messages to store
+                'expiry': 60,      # Messages expire after 60 seconds
+            },
+        },
+    }
+
+# Logging configuration for debugging WebSocket issues. The real-time path
+# logs through core.eventlog: connects and disconnects at INFO, per-message
+# events at DEBUG, sampled by EVENT_LOG_SAMPLE_RATES
+REALTIME_LOG_LEVEL = config('REALTIME_LOG_LEVEL', default='INFO')
+EVENT_LOG_SAMPLE_RATES = {
+    'ws.receive': config('WS_RECEIVE_LOG_SAMPLE_RATE', default=0.01, cast=float),
+    'ws.deliver': config('WS_DELIVER_LOG_SAMPLE_RATE', default=0.01, cast=float),
 }
+EVENT_LOG_SUMMARY_INTERVAL = config('EVENT_LOG_SUMMARY_INTERVAL', default=60, cast=int)
 
-# Logging configuration for debugging WebSocket issues
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -199,17 +334,22 @@ LOGGING = {
     'loggers': {
         'discussions.consumers': {
             'handlers': ['console'],
-            'level': 'INFO',
+            'level': REALTIME_LOG_LEVEL,
             'propagate': False,
         },
         'discussions.middleware': {
             'handlers': ['console'],
-            'level': 'INFO',
+            'level': REALTIME_LOG_LEVEL,
             'propagate': False,
         },
     },
 }
 
+# Requests over their view's query_budget raise instead of logging a warning;
+# core.testing.QueryBudgetTestRunner turns this on for the test suite
+QUERY_BUDGET_ENFORCE = config('QUERY_BUDGET_ENFORCE', default=False, cast=bool)
+TEST_RUNNER = 'core.testing.QueryBudgetTestRunner'
+
 AUTH_USER_MODEL = 'accounts.User'
 
 # Media files (uploads)
@@ -33,6 +33,7 @@ urlpatterns = [
     path('api/search/', include('search.urls')),
     path('api/content/', include('content.urls')),
     path('api/reviews/', include('reviews.urls')),
+    path('api/core/', include('core.urls')),
 ]
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
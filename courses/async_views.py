@@ -0,0 +1,32 @@
+# courses/async_views.py
+"""
+Async variants of the catalog and enrolled courses endpoints for ASGI
+workers, routed in place of the student_views ones when ASYNC_READ_VIEWS is
+set. They run the same single-statement querysets and return the same
+responses, awaiting the ORM instead of holding a thread for the request.
+"""
+from rest_framework.permissions import AllowAny
+
+from core.asyncapi import JSONResponse, async_api_view
+from core.dbrouting import use_replica
+from core.instrumentation import query_budget
+from .student_views import (
+    IsStudent, catalog_courses, enrolled_courses, serialize_catalog_course, serialize_enrollment
+)
+
+
+@query_budget(2, duplicates=0)
+@async_api_view(['GET'], permission_classes=[AllowAny])
+@use_replica
+async def all_courses(request):
+    """Get all available courses for students to explore"""
+    courses = catalog_courses(request.GET, request.user)
+    return JSONResponse([serialize_catalog_course(course) async for course in courses])
+
+
+@query_budget(2, duplicates=0)
+@async_api_view(['GET'], permission_classes=[IsStudent])
+async def student_enrolled_courses(request):
+    """Get student's enrolled courses with progress"""
+    enrollments = enrolled_courses(request.user)
+    return JSONResponse([serialize_enrollment(enrollment) async for enrollment in enrollments])
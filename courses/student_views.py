@@ -4,7 +4,8 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.shortcuts import get_object_or_404
-from django.db.models import Count, Avg, Sum, Q, F, Exists, OuterRef
+from django.db.models import Count, Avg, Sum, Q, F, Exists, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from datetime import datetime, timedelta, date
 from decimal import Decimal
@@ -15,23 +16,27 @@ from certificates.models import Certificate
 from reviews.models import CourseReview
 from accounts.models import User, StudentProfile
 from assessments.models import QuizAttempt
+from core.dbrouting import use_replica
+from core.fanout import fan_out
+from core.instrumentation import query_budget
 
 class IsStudent(IsAuthenticated):
     """Permission class for students only"""
     def has_permission(self, request, view):
         return super().has_permission(request, view) and request.user.user_type == 'student'
 
-@api_view(['GET'])
-@permission_classes([AllowAny])
-def all_courses(request):
-    """Get all available courses for students to explore"""
+# Courses returned by the catalog
+CATALOG_PAGE_SIZE = 20
+
+def catalog_courses(params, user):
+    """Published courses filtered and sorted by the catalog's query parameters"""
     
     # Get filter parameters
-    category = request.GET.get('category', 'all')
-    level = request.GET.get('level', 'all')
-    course_type = request.GET.get('type', 'all')
-    search = request.GET.get('search', '')
-    sort_by = request.GET.get('sort', 'popular')
+    category = params.get('category', 'all')
+    level = params.get('level', 'all')
+    course_type = params.get('type', 'all')
+    search = params.get('search', '')
+    sort_by = params.get('sort', 'popular')
     
     # Base queryset - only published courses
     courses = Course.objects.filter(status='published')
@@ -62,116 +67,137 @@ def all_courses(request):
     elif sort_by == 'newest':
         courses = courses.order_by('-created_at')
     
+    # Module count and running time come from correlated aggregates rather
+    # than per-course queries, so the page is a single statement
+    modules_count = Section.objects.filter(
+        course=OuterRef('pk')
+    ).order_by().values('course').annotate(total=Count('id')).values('total')
+    total_duration = Lecture.objects.filter(
+        section__course=OuterRef('pk')
+    ).order_by().values('section__course').annotate(total=Sum('video_duration')).values('total')
+    courses = courses.select_related('instructor', 'category').annotate(
+        modules_count=Coalesce(Subquery(modules_count), 0),
+        total_duration=Coalesce(Subquery(total_duration), 0)
+    )
+    
     # Annotate with additional data
-    if request.user.is_authenticated:
+    if user.is_authenticated:
         courses = courses.annotate(
             is_enrolled=Exists(
                 Enrollment.objects.filter(
                     course=OuterRef('pk'),
-                    student=request.user
+                    student=user
                 )
             ),
             is_bookmarked=Exists(
                 CourseBookmark.objects.filter(
                     course=OuterRef('pk'),
-                    student=request.user
+                    student=user
                 )
             )
         )
     
-    # Serialize data
-    course_data = []
-    for course in courses[:20]:  # Limit to 20 for performance
-        modules_count = course.sections.count()
-        total_duration = sum([
-            lecture.video_duration for section in course.sections.all() 
-            for lecture in section.lectures.all()
-        ]) / 3600  # Convert to hours
-        
-        course_data.append({
-            'id': str(course.uuid),
-            'title': course.title,
-            'instructor': f"{course.instructor.first_name} {course.instructor.last_name}",
-            'instructor_id': str(course.instructor.uuid),
-            'thumbnail': course.thumbnail.url if course.thumbnail else None,
-            'rating': float(course.average_rating),
-            'students': course.total_enrolled,
-            'duration': f"{int(total_duration)} hours",
-            'level': course.level,
-            'category': course.category.name if course.category else 'General',
-            'course_type': course.course_type,
-            'modules': modules_count,
-            'description': course.description[:200] + '...' if len(course.description) > 200 else course.description,
-            'is_enrolled': getattr(course, 'is_enrolled', False),
-            'is_bookmarked': getattr(course, 'is_bookmarked', False)
-        })
+    return courses[:CATALOG_PAGE_SIZE]
+
+def serialize_catalog_course(course):
+    total_duration = course.total_duration / 3600  # Convert to hours
+    return {
+        'id': str(course.uuid),
+        'title': course.title,
+        'instructor': f"{course.instructor.first_name} {course.instructor.last_name}",
+        'instructor_id': str(course.instructor.uuid),
+        'thumbnail': course.thumbnail.url if course.thumbnail else None,
+        'rating': float(course.average_rating),
+        'students': course.total_enrolled,
+        'duration': f"{int(total_duration)} hours",
+        'level': course.level,
+        'category': course.category.name if course.category else 'General',
+        'course_type': course.course_type,
+        'modules': course.modules_count,
+        'description': course.description[:200] + '...' if len(course.description) > 200 else course.description,
+        'is_enrolled': getattr(course, 'is_enrolled', False),
+        'is_bookmarked': getattr(course, 'is_bookmarked', False)
+    }
+
+@query_budget(2, duplicates=0)
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@use_replica
+def all_courses(request):
+    """Get all available courses for students to explore"""
+    courses = catalog_courses(request.query_params, request.user)
+    return Response([serialize_catalog_course(course) for course in courses])
+
+def enrolled_courses(user):
+    """The student's active enrollments with their lesson counts and next lesson"""
+    course_lectures = Lecture.objects.filter(section__course=OuterRef('course'))
+    completed = LectureProgress.objects.filter(enrollment=OuterRef('pk'), is_completed=True)
+    
+    total_lessons = course_lectures.order_by().values('section__course').annotate(
+        total=Count('id')
+    ).values('total')
+    completed_lessons = completed.order_by().values('enrollment').annotate(
+        total=Count('id')
+    ).values('total')
+    next_lesson = course_lectures.exclude(
+        Exists(LectureProgress.objects.filter(
+            enrollment=OuterRef(OuterRef('pk')),
+            lecture=OuterRef('pk'),
+            is_completed=True
+        ))
+    ).order_by('section__order', 'order').values('title')[:1]
     
-    return Response(course_data)
+    return Enrollment.objects.filter(
+        student=user,
+        status='active'
+    ).select_related('course', 'course__instructor').annotate(
+        total_lessons=Coalesce(Subquery(total_lessons), 0),
+        completed_lessons=Coalesce(Subquery(completed_lessons), 0),
+        next_lesson=Subquery(next_lesson)
+    ).order_by('-last_accessed')
+
+def serialize_enrollment(enrollment):
+    course = enrollment.course
+    
+    # Estimate completion time
+    remaining_lessons = enrollment.total_lessons - enrollment.completed_lessons
+    avg_lesson_time = 30  # minutes
+    estimated_hours = (remaining_lessons * avg_lesson_time) / 60
+    
+    if estimated_hours < 24:
+        estimated_completion = f"{int(estimated_hours)} hours"
+    elif estimated_hours < 168:
+        estimated_completion = f"{int(estimated_hours/24)} days"
+    else:
+        estimated_completion = f"{int(estimated_hours/168)} weeks"
+    
+    return {
+        'id': str(enrollment.uuid),
+        'course_id': str(course.uuid),
+        'title': course.title,
+        'instructor': f"{course.instructor.first_name} {course.instructor.last_name}",
+        'thumbnail': course.thumbnail.url if course.thumbnail else None,
+        'progress': float(enrollment.progress_percentage),
+        'last_accessed': enrollment.last_accessed.isoformat() if enrollment.last_accessed else None,
+        'next_lesson': enrollment.next_lesson or "All lessons completed",
+        'total_lessons': enrollment.total_lessons,
+        'completed_lessons': enrollment.completed_lessons,
+        'estimated_completion': estimated_completion
+    }
 
+@query_budget(2, duplicates=0)
 @api_view(['GET'])
 @permission_classes([IsStudent])
 def student_enrolled_courses(request):
     """Get student's enrolled courses with progress"""
-    
-    enrollments = Enrollment.objects.filter(
-        student=request.user,
-        status='active'
-    ).select_related('course', 'course__instructor').order_by('-last_accessed')
-    
-    enrolled_data = []
-    for enrollment in enrollments:
-        course = enrollment.course
-        
-        # Calculate total lessons and completed
-        total_lessons = Lecture.objects.filter(
-            section__course=course
-        ).count()
-        
-        completed_lessons = LectureProgress.objects.filter(
-            enrollment=enrollment,
-            is_completed=True
-        ).count()
-        
-        # Get next lesson
-        incomplete_lectures = Lecture.objects.filter(
-            section__course=course
-        ).exclude(
-            id__in=LectureProgress.objects.filter(
-                enrollment=enrollment,
-                is_completed=True
-            ).values_list('lecture_id', flat=True)
-        ).order_by('section__order', 'order').first()
-        
-        # Estimate completion time
-        remaining_lessons = total_lessons - completed_lessons
-        avg_lesson_time = 30  # minutes
-        estimated_hours = (remaining_lessons * avg_lesson_time) / 60
-        
-        if estimated_hours < 24:
-            estimated_completion = f"{int(estimated_hours)} hours"
-        elif estimated_hours < 168:
-            estimated_completion = f"{int(estimated_hours/24)} days"
-        else:
-            estimated_completion = f"{int(estimated_hours/168)} weeks"
-        
-        enrolled_data.append({
-            'id': str(enrollment.uuid),
-            'course_id': str(course.uuid),
-            'title': course.title,
-            'instructor': f"{course.instructor.first_name} {course.instructor.last_name}",
-            'thumbnail': course.thumbnail.url if course.thumbnail else None,
-            'progress': float(enrollment.progress_percentage),
-            'last_accessed': enrollment.last_accessed.isoformat() if enrollment.last_accessed else None,
-            'next_lesson': incomplete_lectures.title if incomplete_lectures else "All lessons completed",
-            'total_lessons': total_lessons,
-            'completed_lessons': completed_lessons,
-            'estimated_completion': estimated_completion
-        })
-    
-    return Response(enrolled_data)
+    enrollments = enrolled_courses(request.user)
+    return Response([serialize_enrollment(enrollment) for enrollment in enrollments])
 
+# The streak is read for the stats and again for the achievements
+@query_budget(12, duplicates=1)
 @api_view(['GET'])
 @permission_classes([IsStudent])
+@use_replica
 def student_stats(request):
     """Get student statistics and achievements"""
     
@@ -180,36 +206,39 @@ def student_stats(request):
     # Get or create student profile
     profile, created = StudentProfile.objects.get_or_create(user=student)
     
-    # Calculate stats
-    total_courses = Enrollment.objects.filter(student=student).count()
-    completed_courses = Enrollment.objects.filter(
-        student=student,
-        status='completed'
-    ).count()
-    
-    certificates_earned = Certificate.objects.filter(student=student).count()
-    
-    # Calculate total learning hours
-    total_seconds = LectureProgress.objects.filter(
-        enrollment__student=student
-    ).aggregate(Sum('progress_seconds'))['progress_seconds__sum'] or 0
-    total_learning_hours = total_seconds / 3600
-    
-    # Calculate learning streak
+    # Calculate stats; the queries are independent, so run them concurrently
     today = timezone.now().date()
-    current_streak = calculate_learning_streak(student)
-    longest_streak = profile.learning_streak  # Stored in profile
-    
-    # This week's hours
     week_start = today - timedelta(days=today.weekday())
-    week_seconds = LectureProgress.objects.filter(
-        enrollment__student=student,
-        updated_at__gte=week_start
-    ).aggregate(Sum('progress_seconds'))['progress_seconds__sum'] or 0
-    this_week_hours = week_seconds / 3600
+    stats = fan_out(
+        total_courses=lambda: Enrollment.objects.filter(student=student).count(),
+        completed_courses=lambda: Enrollment.objects.filter(
+            student=student,
+            status='completed'
+        ).count(),
+        certificates_earned=lambda: Certificate.objects.filter(student=student).count(),
+        # Total learning hours
+        total_seconds=lambda: LectureProgress.objects.filter(
+            enrollment__student=student
+        ).aggregate(Sum('progress_seconds'))['progress_seconds__sum'] or 0,
+        # This week's hours
+        week_seconds=lambda: LectureProgress.objects.filter(
+            enrollment__student=student,
+            updated_at__gte=week_start
+        ).aggregate(Sum('progress_seconds'))['progress_seconds__sum'] or 0,
+        current_streak=lambda: calculate_learning_streak(student),
+        # Achievements (simplified version)
+        achievements=lambda: calculate_achievements(student),
+    )
+    total_courses = stats['total_courses']
+    completed_courses = stats['completed_courses']
+    certificates_earned = stats['certificates_earned']
+    total_learning_hours = stats['total_seconds'] / 3600
+    this_week_hours = stats['week_seconds'] / 3600
     
-    # Achievements (simplified version)
-    achievements = calculate_achievements(student)
+    # Calculate learning streak
+    current_streak = stats['current_streak']
+    longest_streak = profile.learning_streak  # Stored in profile
+    achievements = stats['achievements']
     
     return Response({
         'total_courses': total_courses,
@@ -315,6 +344,7 @@ def student_certificates(request):
 
 @api_view(['GET'])
 @permission_classes([IsStudent])
+@use_replica
 def student_achievements(request):
     """Get student achievements and gamification data"""
     
@@ -352,16 +382,16 @@ def student_achievements(request):
 def calculate_learning_streak(student):
     """Calculate current learning streak"""
     today = timezone.now().date()
+    active_days = set(LectureProgress.objects.filter(
+        enrollment__student=student,
+        updated_at__date__gte=today - timedelta(days=29)
+    ).values_list('updated_at__date', flat=True).distinct())
     streak = 0
     
     for i in range(30):  # Check last 30 days
         check_date = today - timedelta(days=i)
-        has_activity = LectureProgress.objects.filter(
-            enrollment__student=student,
-            updated_at__date=check_date
-        ).exists()
         
-        if has_activity:
+        if check_date in active_days:
             streak += 1
         elif i > 0:  # Don't break on today if no activity yet
             break
@@ -515,6 +545,7 @@ def get_all_achievements(student):
 
 @api_view(['GET'])
 @permission_classes([IsStudent])
+@use_replica
 def weekly_progress(request):
     """Get weekly learning progress for charts"""
     
@@ -1,3 +1,175 @@
-from django.test import TestCase
+import json
+from io import StringIO
 
-# Create your tests here.
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.db.models import Avg, Sum
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import User
+from enrollments.models import Enrollment, LectureProgress
+from payments.models import InstructorEarning
+from . import async_views
+from .models import Course, Lecture
+from .services import course_metrics, with_metrics
+from .student_views import calculate_learning_streak
+
+
+class StudentReadViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_scale', students=30, instructors=2, courses=6, messages=0, prefix='reads',
+                     stdout=StringIO())
+        cls.student = User.objects.filter(
+            email__startswith='reads-', user_type='student', enrollments__status='active'
+        ).first()
+
+    def setUp(self):
+        self.authorization = f'Bearer {AccessToken.for_user(self.student)}'
+        self.client = APIClient(HTTP_AUTHORIZATION=self.authorization)
+        # Warm the user cache so only the views' own queries are counted
+        self.client.get('/api/courses/enrolled/')
+
+    def async_get(self, view, path, params=None):
+        request = RequestFactory().get(path, params, HTTP_AUTHORIZATION=self.authorization)
+        return async_to_sync(view)(request)
+
+    def test_catalog_is_a_single_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/courses/all/', {'sort': 'newest'})
+        self.assertEqual(response.status_code, 200)
+
+        with self.assertNumQueries(1):
+            async_response = self.async_get(async_views.all_courses, '/api/courses/all/', {'sort': 'newest'})
+        self.assertEqual(json.loads(async_response.content), response.json())
+
+    def test_enrolled_courses_count_lessons_in_the_same_query(self):
+        enrollment = Enrollment.objects.filter(student=self.student, status='active').first()
+        lectures = list(Lecture.objects.filter(section__course=enrollment.course).order_by('section__order', 'order'))
+        LectureProgress.objects.filter(enrollment=enrollment).delete()
+        LectureProgress.objects.create(enrollment=enrollment, lecture=lectures[0], is_completed=True)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/courses/enrolled/')
+        entry = next(entry for entry in response.json() if entry['id'] == str(enrollment.uuid))
+        self.assertEqual(entry['total_lessons'], len(lectures))
+        self.assertEqual(entry['completed_lessons'], 1)
+        self.assertEqual(entry['next_lesson'], lectures[1].title if len(lectures) > 1 else 'All lessons completed')
+
+        with self.assertNumQueries(1):
+            async_response = self.async_get(async_views.student_enrolled_courses, '/api/courses/enrolled/')
+        self.assertEqual(json.loads(async_response.content), response.json())
+
+    def test_async_views_check_permissions_like_drf(self):
+        response = async_to_sync(async_views.student_enrolled_courses)(
+            RequestFactory().get('/api/courses/enrolled/')
+        )
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer realm="api"')
+
+        instructor = User.objects.filter(email__startswith='reads-', user_type='instructor').first()
+        self.authorization = f'Bearer {AccessToken.for_user(instructor)}'
+        response = self.async_get(async_views.student_enrolled_courses, '/api/courses/enrolled/')
+        self.assertEqual(response.status_code, 403)
+
+    def test_learning_streak_is_read_in_one_query(self):
+        enrollment = Enrollment.objects.filter(student=self.student).first()
+        lectures = Lecture.objects.filter(section__course=enrollment.course)[:4]
+        LectureProgress.objects.filter(enrollment__student=self.student).delete()
+        now = timezone.now()
+        for lecture, days_ago in zip(lectures, [1, 2, 4, 40]):
+            progress = LectureProgress.objects.create(enrollment=enrollment, lecture=lecture)
+            LectureProgress.objects.filter(pk=progress.pk).update(updated_at=now - timedelta(days=days_ago))
+
+        with self.assertNumQueries(1):
+            streak = calculate_learning_streak(self.student)
+        # Today has no activity yet, so the streak runs from yesterday
+        self.assertEqual(streak, 2)
+
+        response = self.client.get('/api/courses/student/stats/')
+        self.assertEqual(response.json()['current_streak'], 2)
+
+
+class CourseMetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_scale', students=30, instructors=2, courses=6, messages=0, prefix='metrics',
+                     stdout=StringIO())
+        cls.instructor = User.objects.filter(
+            email__startswith='metrics-', user_type='instructor', courses_created__reviews__isnull=False
+        ).first()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.instructor)
+
+    def test_metrics_of_many_courses_in_one_query(self):
+        courses = Course.objects.filter(instructor=self.instructor)
+        active_since = timezone.now() - timedelta(days=7)
+        with self.assertNumQueries(1):
+            metrics = course_metrics(courses, active_since)
+
+        self.assertEqual(set(metrics), set(courses.values_list('pk', flat=True)))
+        for course in courses:
+            enrollments = Enrollment.objects.filter(course=course)
+            total = enrollments.count()
+            completed = enrollments.filter(status='completed').count()
+            revenue = InstructorEarning.objects.filter(course=course).aggregate(total=Sum('final_amount'))['total']
+            self.assertEqual(metrics[course.pk], {
+                'total_students': total,
+                'active_students': enrollments.filter(last_accessed__gte=active_since).count(),
+                'completed_students': completed,
+                'completion_rate': completed / total * 100 if total else 0,
+                'average_progress': enrollments.aggregate(avg=Avg('progress_percentage'))['avg'] or 0,
+                'total_revenue': revenue or 0,
+            })
+
+    def test_analytics_reads_metrics_and_reviews_in_two_queries(self):
+        course = Course.objects.filter(instructor=self.instructor, reviews__isnull=False).first()
+        metrics = course_metrics(Course.objects.filter(pk=course.pk))[course.pk]
+
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/courses/instructor/courses/{course.uuid}/analytics/')
+        data = response.json()
+        self.assertEqual(data['total_students'], metrics['total_students'])
+        self.assertEqual(data['completion_rate'], float(metrics['completion_rate']))
+        self.assertEqual(data['total_revenue'], float(metrics['total_revenue']))
+        reviews = course.reviews.order_by('-created_at')[:5]
+        self.assertEqual([review['student_name'] for review in data['recent_reviews']],
+                         [f'{review.student.first_name} {review.student.last_name}' for review in reviews])
+
+    def test_course_list_reads_revenue_with_the_courses(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/courses/instructor/courses/')
+        revenue = {str(course.uuid): float(course.total_revenue or 0)
+                   for course in with_metrics(Course.objects.filter(instructor=self.instructor))}
+        self.assertEqual({course['id']: course['total_revenue'] for course in response.json()}, revenue)
+
+    def test_dashboard_reports_the_instructors_totals(self):
+        response = self.client.get('/api/courses/instructor/dashboard/')
+        data = response.json()
+        self.assertNotIn('error', data)
+
+        courses = Course.objects.filter(instructor=self.instructor)
+        earnings = InstructorEarning.objects.filter(instructor=self.instructor)
+        self.assertEqual(data['stats']['total_courses'], courses.count())
+        self.assertEqual(data['stats']['published_courses'], courses.filter(status='published').count())
+        self.assertEqual(data['stats']['total_students'], Enrollment.objects.filter(
+            course__instructor=self.instructor
+        ).values('student').distinct().count())
+        self.assertEqual(data['stats']['total_revenue'],
+                         float(earnings.aggregate(total=Sum('final_amount'))['total'] or 0))
+        self.assertTrue(earnings.exists())
+
+        revenue = {course.pk: InstructorEarning.objects.filter(course=course).aggregate(
+            total=Sum('final_amount'))['total'] or 0 for course in courses}
+        top = sorted(courses, key=lambda course: revenue[course.pk], reverse=True)[:3]
+        self.assertEqual([course['total_revenue'] for course in data['top_courses']],
+                         [float(revenue[course.pk]) for course in top])
+        self.assertEqual(len(data['recent_enrollments']), min(10, Enrollment.objects.filter(
+            course__instructor=self.instructor).count()))
@@ -1,8 +1,13 @@
 # courses/urls.py
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from . import views
 from . import student_views
+from . import async_views
+
+# Async variants of the hottest read views, for ASGI workers
+read_views = async_views if getattr(settings, 'ASYNC_READ_VIEWS', False) else student_views
 
 router = DefaultRouter()
 router.register('instructor/courses', views.InstructorCourseViewSet, basename='instructor-courses')
@@ -30,8 +35,8 @@ urlpatterns = [
          name='lecture-detail'),
     
     #student URLs
-    path('all/', student_views.all_courses, name='all-courses'),
-    path('enrolled/', student_views.student_enrolled_courses, name='enrolled-courses'),
+    path('all/', read_views.all_courses, name='all-courses'),
+    path('enrolled/', read_views.student_enrolled_courses, name='enrolled-courses'),
     path('<uuid:course_uuid>/enroll/', student_views.enroll_course, name='enroll-course'),
     path('<uuid:course_uuid>/bookmark/', student_views.bookmark_course, name='bookmark-course'),
 
@@ -11,21 +11,54 @@ from django.utils.text import slugify
 from decimal import Decimal
 
 from .models import Course, Section, Lecture, CourseAnnouncement
+from .services import completion_rate, recent_reviews, with_metrics
 from .serializers import (
     CourseListSerializer, CourseDetailSerializer, CourseCreateSerializer,
     SectionSerializer, LectureSerializer
 )
 from enrollments.models import Enrollment
 from payments.models import InstructorEarning
-from reviews.models import CourseReview
+from assessments.models import QuizAttempt
+from core.dbrouting import bind_read_database, use_replica
+from core.exports import (
+    EXPORT_CHUNK_SIZE, ExportColumn, export_format_error, streaming_export
+)
+from core.fanout import fan_out
+from core.instrumentation import query_budget
+
+STUDENT_EXPORT_COLUMNS = [
+    ExportColumn('student_id', 'string'),
+    ExportColumn('first_name', 'string'),
+    ExportColumn('last_name', 'string'),
+    ExportColumn('email', 'string'),
+    ExportColumn('enrolled_date', 'datetime'),
+    ExportColumn('status', 'string'),
+    ExportColumn('progress', 'decimal'),
+    ExportColumn('last_accessed', 'datetime'),
+    ExportColumn('completed_date', 'datetime'),
+    ExportColumn('time_spent_seconds', 'int'),
+]
+
+QUIZ_RESULT_EXPORT_COLUMNS = [
+    ExportColumn('quiz', 'string'),
+    ExportColumn('student_id', 'string'),
+    ExportColumn('student_email', 'string'),
+    ExportColumn('attempt_number', 'int'),
+    ExportColumn('start_time', 'datetime'),
+    ExportColumn('end_time', 'datetime'),
+    ExportColumn('score', 'decimal'),
+    ExportColumn('passed', 'bool'),
+]
 
 class IsInstructor(IsAuthenticated):
     """Custom permission for instructors only"""
     def has_permission(self, request, view):
         return super().has_permission(request, view) and request.user.user_type == 'instructor'
 
+@query_budget(7, duplicates=0)
 @api_view(['GET'])
 @permission_classes([IsInstructor])
+@use_replica
 def instructor_dashboard(request):
     """Get dashboard overview stats for instructor"""
     try:
@@ -33,24 +66,42 @@ def instructor_dashboard(request):
         
         # Get all instructor's courses
         courses = Course.objects.filter(instructor=instructor)
+        thirty_days_ago = timezone.now() - timedelta(days=30)
         
-        # Calculate stats
-        total_students = Enrollment.objects.filter(
-            course__instructor=instructor
-        ).values('student').distinct().count()
-        
-        total_revenue = InstructorEarning.objects.filter(
-            instructor=instructor
-        ).aggregate(Sum('final_amount'))['final_amount__sum'] or Decimal('0')
-        
-        avg_rating = courses.aggregate(
-            avg=Avg('average_rating')
-        )['avg'] or Decimal('0')
-        
-        # Recent enrollments (last 10)
-        recent_enrollments = Enrollment.objects.filter(
-            course__instructor=instructor
-        ).select_related('student', 'course').order_by('-enrolled_date')[:10]
+        # The queries are independent, so run them concurrently
+        results = fan_out(
+            course_stats=lambda: courses.aggregate(
+                total=Count('id'),
+                published=Count('id', filter=Q(status='published')),
+                draft=Count('id', filter=Q(status='draft')),
+                avg_rating=Avg('average_rating'),
+            ),
+            total_students=lambda: Enrollment.objects.filter(
+                course__instructor=instructor
+            ).values('student').distinct().count(),
+            total_revenue=lambda: InstructorEarning.objects.filter(
+                instructor=instructor
+            ).aggregate(Sum('final_amount'))['final_amount__sum'] or Decimal('0'),
+            # Recent enrollments (last 10)
+            recent_enrollments=lambda: list(Enrollment.objects.filter(
+                course__instructor=instructor
+            ).select_related('student', 'course').order_by('-enrolled_date')[:10]),
+            # Revenue chart data (last 30 days)
+            earnings=lambda: list(InstructorEarning.objects.filter(
+                instructor=instructor,
+                created_at__gte=thirty_days_ago
+            ).values('created_at__date').annotate(
+                daily_revenue=Sum('final_amount')
+            )),
+            # Top performing courses
+            top_courses=lambda: list(courses.annotate(
+                total_revenue=Sum('instructorearning__final_amount')
+            ).order_by(F('total_revenue').desc(nulls_last=True), '-created_at')[:3]),
+        )
+        course_stats = results['course_stats']
+        total_students = results['total_students']
+        total_revenue = results['total_revenue']
+        avg_rating = course_stats['avg_rating'] or Decimal('0')
         
         recent_enrollments_data = [
             {
@@ -59,26 +110,17 @@ def instructor_dashboard(request):
                 'course_title': e.course.title,
                 'enrolled_date': e.enrolled_date.isoformat()
             }
-            for e in recent_enrollments
+            for e in results['recent_enrollments']
         ]
         
-        # Revenue chart data (last 30 days)
-        thirty_days_ago = timezone.now() - timedelta(days=30)
         revenue_by_day = {}
         
-        earnings = InstructorEarning.objects.filter(
-            instructor=instructor,
-            created_at__gte=thirty_days_ago
-        ).values('created_at__date').annotate(
-            daily_revenue=Sum('final_amount')
-        )
-        
         # Fill in missing days with 0
         for i in range(30):
             date = (timezone.now() - timedelta(days=29-i)).date()
             revenue_by_day[date.isoformat()] = 0
         
-        for earning in earnings:
+        for earning in results['earnings']:
             date_str = earning['created_at__date'].isoformat()
             revenue_by_day[date_str] = float(earning['daily_revenue'])
         
@@ -88,35 +130,27 @@ def instructor_dashboard(request):
         ]
         revenue_chart.sort(key=lambda x: x['date'])
         
-        # Top performing courses
-        top_courses_qs = courses.annotate(
-            total_revenue=Sum('earnings__final_amount')
-        ).order_by('-total_revenue')[:3]
-        
-        top_courses_data = []
-        for course in top_courses_qs:
-            revenue = InstructorEarning.objects.filter(
-                course=course
-            ).aggregate(Sum('final_amount'))['final_amount__sum'] or 0
-            
-            top_courses_data.append({
+        top_courses_data = [
+            {
                 'id': str(course.uuid),
                 'title': course.title,
                 'course_type': course.course_type,  # Add course_type
                 'total_enrolled': course.total_enrolled,
                 'average_rating': float(course.average_rating),
-                'total_revenue': float(revenue),
+                'total_revenue': float(course.total_revenue or 0),
                 'thumbnail': course.thumbnail.url if course.thumbnail else None
-            })
+            }
+            for course in results['top_courses']
+        ]
         
         return Response({
             'stats': {
-                'total_courses': courses.count(),
+                'total_courses': course_stats['total'],
                 'total_students': total_students,
                 'total_revenue': float(total_revenue),
                 'average_rating': float(avg_rating),
-                'published_courses': courses.filter(status='published').count(),
-                'draft_courses': courses.filter(status='draft').count(),
+                'published_courses': course_stats['published'],
+                'draft_courses': course_stats['draft'],
             },
             'recent_enrollments': recent_enrollments_data,
             'revenue_chart': revenue_chart,
@@ -152,7 +186,10 @@ class InstructorCourseViewSet(viewsets.ModelViewSet):
         return CourseListSerializer
     
     def get_queryset(self):
-        return Course.objects.filter(instructor=self.request.user)
+        courses = Course.objects.filter(instructor=self.request.user)
+        if self.action in ('list', 'analytics'):
+            return with_metrics(courses)
+        return courses
     
     def get_object(self):
         # Use UUID from URL
@@ -168,13 +205,6 @@ class InstructorCourseViewSet(viewsets.ModelViewSet):
             data = []
             
             for course in courses:
-                try:
-                    revenue = InstructorEarning.objects.filter(
-                        course=course
-                    ).aggregate(Sum('final_amount'))['final_amount__sum'] or 0
-                except:
-                    revenue = 0
-                
                 data.append({
                     'id': str(course.uuid),
                     'title': course.title,
@@ -182,7 +212,7 @@ class InstructorCourseViewSet(viewsets.ModelViewSet):
                     'course_type': course.course_type,  # Add course_type instead of price
                     'total_enrolled': course.total_enrolled or 0,
                     'average_rating': float(course.average_rating or 0),
-                    'total_revenue': float(revenue),
+                    'total_revenue': float(course.total_revenue or 0),
                     'created_at': course.created_at.isoformat(),
                     'thumbnail': course.thumbnail.url if course.thumbnail else None
                 })
@@ -256,37 +286,59 @@ class InstructorCourseViewSet(viewsets.ModelViewSet):
         
         return Response(data)
     
-    @action(detail=True, methods=['get'])
-    def analytics(self, request, pk=None):
-        """Get course-specific analytics"""
+    @action(detail=True, methods=['get'], url_path='students/export')
+    @use_replica
+    def export_students(self, request, pk=None):
+        """Stream every enrolled student as CSV or Parquet"""
         course = self.get_object()
         
-        total_students = Enrollment.objects.filter(course=course).count()
-        active_students = Enrollment.objects.filter(
-            course=course,
-            last_accessed__gte=timezone.now() - timedelta(days=7)
-        ).count()
-        
-        completion_rate = 0
-        if total_students > 0:
-            completed = Enrollment.objects.filter(
-                course=course,
-                status='completed'
-            ).count()
-            completion_rate = (completed / total_students) * 100
+        export_format = request.query_params.get('export_format', 'csv')
+        error = export_format_error(export_format)
+        if error:
+            return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
         
-        avg_progress = Enrollment.objects.filter(
+        # Rows are streamed after the view returns, outside use_replica
+        rows = bind_read_database(Enrollment.objects.filter(
             course=course
-        ).aggregate(Avg('progress_percentage'))['progress_percentage__avg'] or 0
-        
-        total_revenue = InstructorEarning.objects.filter(
-            course=course
-        ).aggregate(Sum('final_amount'))['final_amount__sum'] or 0
+        ).order_by('enrolled_date', 'id').values_list(
+            'student__uuid', 'student__first_name', 'student__last_name',
+            'student__email', 'enrolled_date', 'status', 'progress_percentage',
+            'last_accessed', 'completed_date', 'total_time_spent'
+        )).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        rows = ((str(row[0]),) + row[1:] for row in rows)
+        
+        return streaming_export(
+            request, f'{course.slug}-students', STUDENT_EXPORT_COLUMNS, rows, export_format
+        )
+    
+    @action(detail=True, methods=['get'], url_path='quiz-results/export')
+    @use_replica
+    def export_quiz_results(self, request, pk=None):
+        """Stream every quiz attempt in the course as CSV or Parquet"""
+        course = self.get_object()
         
-        # Recent reviews
-        recent_reviews = CourseReview.objects.filter(
-            course=course
-        ).order_by('-created_at')[:5]
+        export_format = request.query_params.get('export_format', 'csv')
+        error = export_format_error(export_format)
+        if error:
+            return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+        
+        rows = bind_read_database(QuizAttempt.objects.filter(
+            quiz__course=course
+        ).order_by('quiz_id', 'student_id', 'attempt_number').values_list(
+            'quiz__title', 'student__uuid', 'student__email', 'attempt_number',
+            'start_time', 'end_time', 'score', 'passed'
+        )).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        rows = (row[:1] + (str(row[1]),) + row[2:] for row in rows)
+        
+        return streaming_export(
+            request, f'{course.slug}-quiz-results', QUIZ_RESULT_EXPORT_COLUMNS, rows, export_format
+        )
+    
+    @action(detail=True, methods=['get'])
+    @use_replica
+    def analytics(self, request, pk=None):
+        """Get course-specific analytics"""
+        course = self.get_object()  # with its metrics, see get_queryset()
         
         reviews_data = [
             {
@@ -296,15 +348,15 @@ class InstructorCourseViewSet(viewsets.ModelViewSet):
                 'comment': r.comment,
                 'created_at': r.created_at.isoformat()
             }
-            for r in recent_reviews
+            for r in recent_reviews(course)
         ]
         
         return Response({
-            'total_students': total_students,
-            'active_students': active_students,
-            'completion_rate': float(completion_rate),
-            'average_progress': float(avg_progress),
-            'total_revenue': float(total_revenue),
+            'total_students': course.total_students,
+            'active_students': course.active_students,
+            'completion_rate': float(completion_rate(course.completed_students, course.total_students)),
+            'average_progress': float(course.average_progress or 0),
+            'total_revenue': float(course.total_revenue or 0),
             'average_rating': float(course.average_rating),
             'total_reviews': course.total_reviews,
             'recent_reviews': reviews_data
@@ -0,0 +1,28 @@
+# discussions/async_views.py
+"""
+Async variant of the conversation list for ASGI workers, routed in place of
+views.get_conversations when ASYNC_READ_VIEWS is set.
+"""
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+
+from core.asyncapi import JSONResponse, async_api_view
+from core.instrumentation import query_budget
+from .pagination import InvalidCursor, apaginate_keyset
+from .views import conversation_memberships, serialize_membership
+
+
+@query_budget(2, duplicates=0)
+@async_api_view(['GET'], permission_classes=[IsAuthenticated])
+async def get_conversations(request):
+    """Get the authenticated user's conversations, most recently active first"""
+    user = request.user
+    try:
+        memberships, next_cursor = await apaginate_keyset(
+            conversation_memberships(user), request, field='last_activity_at'
+        )
+    except InvalidCursor as e:
+        return JSONResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    conversations_list = [serialize_membership(membership, user) for membership in memberships]
+    return JSONResponse({'conversations': conversations_list, 'next_cursor': next_cursor})
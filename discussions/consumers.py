@@ -1,15 +1,69 @@
 # discussions/consumers.py
-import json
-import logging
+import asyncio
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from django.contrib.auth import get_user_model
-from .models import DirectMessage
 
-User = get_user_model()
-logger = logging.getLogger(__name__)
+from core import fastjson
+from core.eventlog import EventLogger
+from .delivery import DeliveryFilter, normalize_event, user_group_name
+from .membership import is_member
+from .receipts import get_read_receipt_buffer
+from .presence import get_partner_ids, get_presence, get_presence_tracker, get_typing_coalescer
+from .writer import get_message_writer
 
-class ChatConsumer(AsyncWebsocketConsumer):
+log = EventLogger(__name__)
+
+class ChatMessageMixin:
+    """Sends each chat event to the socket once, marked for the socket's user"""
+    
+    async def chat_message(self, event):
+        message = normalize_event(event)
+        if not self.delivery_filter.accept(message):
+            return
+        
+        log.debug('ws.deliver', user_id=self.user.id, message_id=message['id'])
+        await self.send(text_data=fastjson.dumps({
+            'type': 'chat_message',
+            'message': {**message, 'is_own_message': message['sender']['id'] == self.user.id}
+        }))
+    
+    async def user_message_notification(self, event):
+        """Legacy event type, still sent by workers running older code during a deploy"""
+        await self.chat_message(event)
+    
+    async def message_persisted(self, event):
+        """Database ids for messages that were broadcast with a provisional id"""
+        messages = [
+            message for message in event['messages']
+            if self.delivery_filter.conversation_id in (None, message['conversation_id'])
+        ]
+        if messages:
+            await self.send(text_data=fastjson.dumps({
+                'type': 'message_persisted',
+                'messages': messages
+            }))
+    
+    async def read_receipt(self, event):
+        """Read pointer moves in the user's conversations"""
+        receipts = [
+            receipt for receipt in event['receipts']
+            if self.delivery_filter.conversation_id in (None, receipt['conversation_id'])
+        ]
+        if receipts:
+            await self.send(text_data=fastjson.dumps({
+                'type': 'read_receipt',
+                'receipts': receipts
+            }))
+    
+    async def message_failed(self, event):
+        """Messages from this user that could not be saved"""
+        await self.send(text_data=fastjson.dumps({
+            'type': 'message_failed',
+            'client_ids': event['client_ids']
+        }))
+
+
+class ChatConsumer(ChatMessageMixin, AsyncWebsocketConsumer):
     async def connect(self):
         # Get the conversation ID from the URL
         self.conversation_id = self.scope['url_route']['kwargs']['conversation_id']
@@ -18,197 +72,124 @@ class ChatConsumer(AsyncWebsocketConsumer):
         # Get the user from the scope
         self.user = self.scope["user"]
         
-        logger.info(f"WebSocket connection attempt for user: {self.user}, conversation: {self.conversation_id}")
-        
         # Check if user is authenticated
         if self.user.is_anonymous:
-            logger.warning(f"Anonymous user attempted to connect to conversation: {self.conversation_id}")
+            log.warning('ws.chat.reject', reason='anonymous', conversation_id=self.conversation_id)
             await self.close()
             return
         
         # Check if user is part of this conversation
         if not await self.user_in_conversation():
-            logger.warning(f"User {self.user.email} not authorized for conversation: {self.conversation_id}")
+            log.warning('ws.chat.reject', reason='not_member', user_id=self.user.id,
+                        conversation_id=self.conversation_id)
             await self.close()
             return
         
-        # Join room group
-        await self.channel_layer.group_add(
-            self.room_group_name,
-            self.channel_name
+        self.user_group_name = user_group_name(self.user.id)
+        self.delivery_filter = DeliveryFilter(self.conversation_id)
+        
+        # Join the room group for typing indicators and the user's personal
+        # group, which carries chat messages for all of their sockets
+        await asyncio.gather(
+            self.channel_layer.group_add(self.room_group_name, self.channel_name),
+            self.channel_layer.group_add(self.user_group_name, self.channel_name)
         )
         
-        logger.info(f"User {self.user.email} successfully connected to conversation: {self.conversation_id}")
+        log.info('ws.chat.connect', user_id=self.user.id, conversation_id=self.conversation_id)
         await self.accept()
+        await get_presence_tracker().connect(self.user.id)
 
     async def disconnect(self, close_code):
-        # Leave room group
-        if hasattr(self, 'room_group_name'):
-            await self.channel_layer.group_discard(
-                self.room_group_name,
-                self.channel_name
+        # Leave room and user groups
+        if hasattr(self, 'user_group_name'):
+            await asyncio.gather(
+                self.channel_layer.group_discard(self.room_group_name, self.channel_name),
+                self.channel_layer.group_discard(self.user_group_name, self.channel_name)
             )
-            logger.info(f"User {getattr(self.user, 'email', 'Unknown')} disconnected from conversation: {self.conversation_id}")
+            await get_typing_coalescer().update(self.conversation_id, self.user.id, False)
+            await get_presence_tracker().disconnect(self.user.id)
+            log.info('ws.chat.disconnect', user_id=self.user.id, conversation_id=self.conversation_id,
+                     code=close_code)
 
     async def receive(self, text_data):
         try:
-            text_data_json = json.loads(text_data)
-            message_type = text_data_json.get('type', 'chat_message')
-            
-            logger.info(f"Received WebSocket message type: {message_type} from user: {self.user.email}")
-            
-            if message_type == 'chat_message':
-                await self.handle_chat_message(text_data_json)
-            elif message_type == 'typing':
-                await self.handle_typing(text_data_json)
-        except json.JSONDecodeError:
-            logger.error("Invalid JSON received in WebSocket message")
-            await self.send(text_data=json.dumps({
+            text_data_json = fastjson.loads(text_data)
+        except ValueError:
+            log.warning('ws.invalid_json', user_id=self.user.id)
+            await self.send(text_data=fastjson.dumps({
                 'error': 'Invalid JSON'
             }))
+            return
+        
+        message_type = text_data_json.get('type', 'chat_message')
+        log.debug('ws.receive', user_id=self.user.id, type=message_type)
+        
+        if message_type == 'chat_message':
+            await self.handle_chat_message(text_data_json)
+        elif message_type == 'typing':
+            await self.handle_typing(text_data_json)
+        elif message_type == 'read':
+            await self.handle_read(text_data_json)
 
     async def handle_chat_message(self, data):
         message_content = data.get('message', '').strip()
-        recipient_id = data.get('recipient_id')
         
-        logger.info(f"Processing chat message from {self.user.email} to recipient {recipient_id}")
+        try:
+            recipient_id = int(data.get('recipient_id'))
+        except (TypeError, ValueError):
+            recipient_id = None
         
         if not message_content or not recipient_id:
-            logger.warning("Missing message content or recipient_id")
-            return
-        
-        # Get recipient
-        recipient = await self.get_user(recipient_id)
-        if not recipient:
-            logger.warning(f"Recipient with ID {recipient_id} not found")
+            log.warning('ws.chat.invalid_message', user_id=self.user.id)
             return
         
-        # Save message to database
-        message = await self.save_message(self.user, recipient, message_content)
-        logger.info(f"Message saved with ID: {message.id}, conversation_id: {message.conversation_id}")
-        
-        # Send message to room group (both users should be in the same group)
-        broadcast_data = {
-            'type': 'chat_message',
-            'message_id': message.id,
-            'message': message.content,
-            'sender_id': message.sender.id,
-            'sender_name': f"{message.sender.first_name} {message.sender.last_name}".strip() or message.sender.email,
-            'timestamp': message.created_at.isoformat(),
-            'conversation_id': message.conversation_id
-        }
-        
-        logger.info(f"Broadcasting message to group: {self.room_group_name}, data: {broadcast_data}")
-        
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            broadcast_data
-        )
-        
-        # Also send to individual user groups for notification purposes
-        sender_group = f'user_{message.sender.id}'
-        recipient_group = f'user_{message.recipient.id}'
-        
-        # Send to sender's personal group
-        await self.channel_layer.group_send(
-            sender_group,
-            {**broadcast_data, 'type': 'user_message_notification'}
-        )
-        
-        # Send to recipient's personal group
-        await self.channel_layer.group_send(
-            recipient_group,
-            {**broadcast_data, 'type': 'user_message_notification'}
-        )
+        # Broadcast now under the message's uuid; the writer saves it with the
+        # next batch and then sends message_persisted with the database id
+        message = await get_message_writer().submit(self.user, recipient_id, message_content)
+        log.debug('ws.chat.queued', user_id=self.user.id, message_id=message['id'],
+                  conversation_id=message['conversation_id'])
 
     async def handle_typing(self, data):
-        is_typing = data.get('is_typing', False)
+        is_typing = bool(data.get('is_typing', False))
         
-        # Send typing indicator to room group (excluding sender)
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'typing_indicator',
-                'user_id': self.user.id,
-                'is_typing': is_typing
-            }
-        )
+        # Coalesced with other typing changes in this conversation and
+        # broadcast to the room group at a bounded rate
+        await get_typing_coalescer().update(self.conversation_id, self.user.id, is_typing)
 
-    # Receive message from room group
-    async def chat_message(self, event):
-        # Send message to WebSocket in the format frontend expects
-        logger.info(f"ChatConsumer: Sending message to WebSocket client: {event}")
+    async def handle_read(self, data):
+        try:
+            message_id = int(data.get('message_id'))
+        except (TypeError, ValueError):
+            return
         
-        # Handle both old format (from WebSocket) and new format (from API)
-        if 'message' in event and isinstance(event['message'], dict):
-            # New format from API
-            message_data = event['message']
-            response_data = {
-                'type': 'chat_message',
-                'message': {
-                    'id': message_data['id'],
-                    'sender': message_data['sender'],
-                    'content': message_data['content'],
-                    'created_at': message_data['created_at'],
-                    'conversation_id': message_data['conversation_id'],
-                    'is_own_message': message_data.get('is_own_message', message_data['sender']['id'] == self.user.id)
-                }
-            }
-            logger.info(f"ChatConsumer: Sending new format message: {response_data}")
-            await self.send(text_data=json.dumps(response_data))
-        else:
-            # Old format from WebSocket
-            response_data = {
-                'type': 'chat_message',
-                'message_id': event.get('message_id'),
-                'message': event.get('message'),
-                'sender_id': event.get('sender_id'),
-                'sender_name': event.get('sender_name'),
-                'timestamp': event.get('timestamp'),
-                'conversation_id': event.get('conversation_id')
-            }
-            logger.info(f"ChatConsumer: Sending old format message: {response_data}")
-            await self.send(text_data=json.dumps(response_data))
-
-    # Receive typing indicator from room group
+        # Buffered: repeated reports collapse into one pointer write and receipt
+        get_read_receipt_buffer().advance(self.conversation_id, self.user.id, message_id)
+    
+    # Receive typing indicators from room group
     async def typing_indicator(self, event):
+        # Single updates still arrive from workers running older code
+        updates = event.get('updates') or [{'user_id': event['user_id'], 'is_typing': event['is_typing']}]
+        
         # Don't send typing indicator to the person who is typing
-        if event['user_id'] != self.user.id:
-            await self.send(text_data=json.dumps({
-                'type': 'typing',
-                'user_id': event['user_id'],
-                'is_typing': event['is_typing']
-            }))
-
-    @database_sync_to_async
-    def user_in_conversation(self):
-        """Check if user is part of this conversation"""
-        from django.db.models import Q
-        return DirectMessage.objects.filter(
-            conversation_id=self.conversation_id
-        ).filter(
-            Q(sender=self.user) | Q(recipient=self.user)
-        ).exists()
-
-    @database_sync_to_async
-    def get_user(self, user_id):
-        """Get user by ID"""
-        try:
-            return User.objects.get(id=user_id)
-        except User.DoesNotExist:
-            return None
+        for update in updates:
+            if update['user_id'] != self.user.id:
+                await self.send(text_data=fastjson.dumps({
+                    'type': 'typing',
+                    'user_id': update['user_id'],
+                    'is_typing': update['is_typing']
+                }))
+    
+    async def presence_snapshot(self, event):
+        # Presence is shown from the UserConsumer socket; this socket only
+        # shares the user's group for chat messages
+        pass
 
-    @database_sync_to_async
-    def save_message(self, sender, recipient, content):
-        """Save message to database"""
-        return DirectMessage.objects.create(
-            sender=sender,
-            recipient=recipient,
-            content=content
-        )
+    async def user_in_conversation(self):
+        """Check if user is part of this conversation, without a query for direct messages"""
+        return await is_member(self.conversation_id, self.user.id)
 
 
-class UserConsumer(AsyncWebsocketConsumer):
+class UserConsumer(ChatMessageMixin, AsyncWebsocketConsumer):
     """
     Consumer for user-specific WebSocket connections.
     Handles notifications for messages across all conversations.
@@ -217,16 +198,15 @@ class UserConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.user = self.scope["user"]
         
-        logger.info(f"User-specific WebSocket connection attempt for user: {self.user}")
-        
         # Check if user is authenticated
         if self.user.is_anonymous:
-            logger.warning("Anonymous user attempted to connect to user-specific WebSocket")
+            log.warning('ws.user.reject', reason='anonymous')
             await self.close()
             return
         
         # Create user-specific group
-        self.user_group_name = f'user_{self.user.id}'
+        self.user_group_name = user_group_name(self.user.id)
+        self.delivery_filter = DeliveryFilter()
         
         # Join user group
         await self.channel_layer.group_add(
@@ -234,8 +214,17 @@ class UserConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
         
-        logger.info(f"User {self.user.email} connected to user-specific WebSocket")
+        log.info('ws.user.connect', user_id=self.user.id)
         await self.accept()
+        await get_presence_tracker().connect(self.user.id)
+        
+        # Current presence of everyone the user has a conversation with;
+        # later changes arrive as batched presence_snapshot events
+        partners = await database_sync_to_async(get_partner_ids)([self.user.id])
+        await self.send(text_data=fastjson.dumps({
+            'type': 'presence',
+            'users': await get_presence(sorted(partners.get(self.user.id, ())))
+        }))
     
     async def disconnect(self, close_code):
         # Leave user group
@@ -244,45 +233,12 @@ class UserConsumer(AsyncWebsocketConsumer):
                 self.user_group_name,
                 self.channel_name
             )
-            logger.info(f"User {getattr(self.user, 'email', 'Unknown')} disconnected from user-specific WebSocket")
+            await get_presence_tracker().disconnect(self.user.id)
+            log.info('ws.user.disconnect', user_id=self.user.id, code=close_code)
     
-    async def chat_message(self, event):
-        """Handle chat messages sent to this user"""
-        logger.info(f"UserConsumer: Sending chat message to user: {self.user.email}")
-        
-        # Handle both old format (from WebSocket) and new format (from API)
-        if 'message' in event and isinstance(event['message'], dict):
-            # New format from API
-            message_data = event['message']
-            response_data = {
-                'type': 'chat_message',
-                'message': {
-                    'id': message_data['id'],
-                    'sender': message_data['sender'],
-                    'content': message_data['content'],
-                    'created_at': message_data['created_at'],
-                    'conversation_id': message_data['conversation_id'],
-                    'is_own_message': message_data.get('is_own_message', message_data['sender']['id'] == self.user.id)
-                }
-            }
-            logger.info(f"UserConsumer: Sending new format message: {response_data}")
-            await self.send(text_data=json.dumps(response_data))
-        else:
-            # Old format from WebSocket or legacy notifications
-            response_data = {
-                'type': 'chat_message',
-                'message_id': event.get('message_id'),
-                'message': event.get('message'),
-                'sender_id': event.get('sender_id'),
-                'sender_name': event.get('sender_name'),
-                'timestamp': event.get('timestamp'),
-                'conversation_id': event.get('conversation_id')
-            }
-            logger.info(f"UserConsumer: Sending old format message: {response_data}")
-            await self.send(text_data=json.dumps(response_data))
-    
-    async def user_message_notification(self, event):
-        """Handle message notifications for this user (legacy method)"""
-        logger.info(f"UserConsumer: Sending message notification to user: {self.user.email}")
-        # Use the same logic as chat_message for consistency
-        await self.chat_message(event)
+    async def presence_snapshot(self, event):
+        """Batched online/offline changes of the user's conversation partners"""
+        await self.send(text_data=fastjson.dumps({
+            'type': 'presence',
+            'users': event['users']
+        }))
@@ -0,0 +1,115 @@
+# discussions/delivery.py
+"""
+Routing of chat events to WebSocket consumers.
+
+Every socket a user opens (the UserConsumer and any ChatConsumer) joins the
+user's personal group, so a message is delivered with one group_send per
+participant instead of separate sends to the conversation group and each
+user group. Consumers filter and dedupe events on their side with
+DeliveryFilter.
+"""
+import asyncio
+from collections import OrderedDict
+
+from channels.layers import get_channel_layer
+
+# Message ids remembered per socket for dropping repeated deliveries
+RECENT_IDS_PER_SOCKET = 256
+
+
+def user_group_name(user_id):
+    return f'user_{user_id}'
+
+
+def conversation_group_name(conversation_id):
+    return f'chat_{conversation_id}'
+
+
+def serialize_message(message):
+    """Message payload shared by every recipient; is_own_message is added per socket"""
+    sender = message.sender
+    return {
+        'id': message.id,
+        'sender': {
+            'id': sender.id,
+            'name': f"{sender.first_name} {sender.last_name}".strip() or sender.email,
+            'user_type': sender.user_type
+        },
+        'content': message.content,
+        'created_at': message.created_at.isoformat(),
+        'conversation_id': message.conversation_id
+    }
+
+
+def message_groups(message):
+    """The minimal set of groups reaching every socket of both participants"""
+    return sorted({user_group_name(message.sender_id), user_group_name(message.recipient_id)})
+
+
+async def group_send_many(channel_layer, sends):
+    """Issue several group_send calls concurrently rather than one after another"""
+    await asyncio.gather(*(
+        channel_layer.group_send(group, event) for group, event in sends
+    ))
+
+
+async def deliver_messages(messages, channel_layer=None):
+    """Broadcast saved messages to their participants' sockets"""
+    channel_layer = channel_layer or get_channel_layer()
+    sends = []
+    for message in messages:
+        event = {'type': 'chat_message', 'message': serialize_message(message)}
+        sends.extend((group, event) for group in message_groups(message))
+    await group_send_many(channel_layer, sends)
+
+
+async def deliver_message(message, channel_layer=None):
+    await deliver_messages([message], channel_layer)
+
+
+def normalize_event(event):
+    """
+    Return the message payload of a chat event.
+
+    Events in the flat format the consumers used to broadcast (message_id,
+    sender_id, ...) can still arrive from workers running older code
+    during a deploy.
+    """
+    if isinstance(event.get('message'), dict):
+        return event['message']
+    return {
+        'id': event.get('message_id'),
+        'sender': {
+            'id': event.get('sender_id'),
+            'name': event.get('sender_name')
+        },
+        'content': event.get('message'),
+        'created_at': event.get('timestamp'),
+        'conversation_id': event.get('conversation_id')
+    }
+
+
+class DeliveryFilter:
+    """
+    Per-socket filter for chat events.
+
+    Drops messages for other conversations when the socket is bound to one
+    conversation, and messages the socket has already been sent.
+    """
+
+    def __init__(self, conversation_id=None, size=RECENT_IDS_PER_SOCKET):
+        self.conversation_id = conversation_id
+        self.size = size
+        self.recent_ids = OrderedDict()
+
+    def accept(self, message):
+        if self.conversation_id is not None and message['conversation_id'] != self.conversation_id:
+            return False
+
+        message_id = message['id']
+        if message_id in self.recent_ids:
+            return False
+        self.recent_ids[message_id] = None
+        if len(self.recent_ids) > self.size:
+            self.recent_ids.popitem(last=False)
+        return True
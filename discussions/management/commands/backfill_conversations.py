@@ -0,0 +1,163 @@
+# discussions/management/commands/backfill_conversations.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from discussions.models import Conversation, ConversationParticipant, DirectMessage
+from discussions.services import PREVIEW_LENGTH
+
+
+class Command(BaseCommand):
+    help = 'Build conversation summaries from existing direct messages, in batches'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of conversations rebuilt per transaction')
+    
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_conversation_id = ''
+        total = 0
+        
+        while True:
+            conversation_ids = list(
+                DirectMessage.objects.filter(
+                    conversation_id__gt=last_conversation_id
+                ).order_by('conversation_id').values_list(
+                    'conversation_id', flat=True
+                ).distinct()[:batch_size]
+            )
+            if not conversation_ids:
+                break
+            
+            with transaction.atomic():
+                self.backfill_batch(conversation_ids)
+            
+            total += len(conversation_ids)
+            last_conversation_id = conversation_ids[-1]
+            self.stdout.write(f'Backfilled {total} conversations (up to {last_conversation_id})')
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'Conversation backfill completed: {total} conversations')
+        )
+    
+    def backfill_batch(self, conversation_ids):
+        messages = DirectMessage.objects.filter(conversation_id__in=conversation_ids)
+        
+        # The latest message is the one with the highest id, as in
+        # services.record_messages; activity is the newest send time
+        latest_messages = {
+            row['conversation_id']: row
+            for row in messages.order_by(
+                'conversation_id', '-id'
+            ).distinct('conversation_id').values(
+                'conversation_id', 'id', 'content', 'created_at', 'sender_id', 'recipient_id'
+            )
+        }
+        totals = {
+            row['conversation_id']: row
+            for row in messages.order_by().values('conversation_id').annotate(
+                total=Count('id'),
+                last_activity_at=Max('created_at')
+            )
+        }
+        
+        # Read state per participant comes from read pointers: the
+        # participant's current pointer, their own latest message (they have
+        # read everything up to it) and, for messages from before pointers
+        # existed, the legacy is_read flags. Received messages after the
+        # furthest of those are unread
+        current_pointers = {
+            (row['conversation__conversation_id'], row['user_id']): row
+            for row in ConversationParticipant.objects.filter(
+                conversation__conversation_id__in=conversation_ids,
+                last_read_message__isnull=False
+            ).values('conversation__conversation_id', 'user_id', 'last_read_message_id', 'last_read_at')
+        }
+        current_pointer = ConversationParticipant.objects.filter(
+            conversation__conversation_id=OuterRef('conversation_id'),
+            user_id=OuterRef('recipient_id')
+        ).values('last_read_message_id')
+        last_sent_by_recipient = DirectMessage.objects.filter(
+            conversation_id=OuterRef('conversation_id'),
+            sender_id=OuterRef('recipient_id')
+        ).order_by().values('sender_id').annotate(last_id=Max('id')).values('last_id')
+        legacy_read_by_recipient = DirectMessage.objects.filter(
+            conversation_id=OuterRef('conversation_id'),
+            recipient_id=OuterRef('recipient_id'),
+            is_read=True
+        ).order_by().values('recipient_id').annotate(last_id=Max('id')).values('last_id')
+        read_pointer = Greatest(
+            Coalesce(Subquery(current_pointer), 0),
+            Coalesce(Subquery(last_sent_by_recipient), 0),
+            Coalesce(Subquery(legacy_read_by_recipient), 0)
+        )
+        received = {
+            (row['conversation_id'], row['recipient_id']): row
+            for row in messages.exclude(
+                sender_id=F('recipient_id')
+            ).order_by().values('conversation_id', 'recipient_id').annotate(
+                unread=Count('id', filter=Q(id__gt=read_pointer)),
+                last_read_id=Max('id', filter=Q(is_read=True)),
+                last_read_at=Max('read_at', filter=Q(is_read=True))
+            )
+        }
+        sent = {
+            (row['conversation_id'], row['sender_id']): row
+            for row in messages.order_by().values('conversation_id', 'sender_id').annotate(
+                last_sent_id=Max('id'),
+                last_sent_at=Max('created_at')
+            )
+        }
+        
+        Conversation.objects.bulk_create(
+            [
+                Conversation(
+                    conversation_id=conversation_id,
+                    last_message_id=latest['id'],
+                    last_message_preview=latest['content'][:PREVIEW_LENGTH],
+                    last_activity_at=totals[conversation_id]['last_activity_at'],
+                    message_count=totals[conversation_id]['total']
+                )
+                for conversation_id, latest in latest_messages.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['conversation_id'],
+            update_fields=['last_message', 'last_message_preview', 'last_activity_at', 'message_count']
+        )
+        conversation_pks = dict(
+            Conversation.objects.filter(
+                conversation_id__in=conversation_ids
+            ).values_list('conversation_id', 'id')
+        )
+        
+        participants = []
+        for conversation_id, latest in latest_messages.items():
+            for user_id in {latest['sender_id'], latest['recipient_id']}:
+                received_row = received.get((conversation_id, user_id), {})
+                sent_row = sent.get((conversation_id, user_id), {})
+                current_row = current_pointers.get((conversation_id, user_id), {})
+                pointers = [
+                    (current_row.get('last_read_message_id'), current_row.get('last_read_at')),
+                    (received_row.get('last_read_id'), received_row.get('last_read_at')),
+                    (sent_row.get('last_sent_id'), sent_row.get('last_sent_at')),
+                ]
+                pointers = [pointer for pointer in pointers if pointer[0] is not None]
+                last_read_id, last_read_at = max(pointers, key=lambda p: p[0], default=(None, None))
+                
+                participants.append(ConversationParticipant(
+                    conversation_id=conversation_pks[conversation_id],
+                    user_id=user_id,
+                    unread_count=received_row.get('unread', 0),
+                    last_read_message_id=last_read_id,
+                    last_read_at=last_read_at,
+                    last_activity_at=totals[conversation_id]['last_activity_at']
+                ))
+        
+        ConversationParticipant.objects.bulk_create(
+            participants,
+            update_conflicts=True,
+            unique_fields=['conversation', 'user'],
+            update_fields=['unread_count', 'last_read_message', 'last_read_at', 'last_activity_at']
+        )
@@ -0,0 +1,65 @@
+# discussions/membership.py
+"""
+Conversation membership checks for the WebSocket connect path.
+
+Direct message conversation ids (conv_<a>_<b>) name both participants, so
+membership is answered by parsing the id without touching the database.
+Any other conversation id, e.g. a future group conversation, is resolved
+from ConversationParticipant once and kept in the default cache for
+MEMBERSHIP_CACHE_TIMEOUT seconds. discussions.signals drops a
+conversation's entry when a participant is added or removed or the
+conversation is deleted. With a shared cache (CACHE_URL) that reaches
+every worker; with the default per-process cache the other workers keep
+their entry until it expires.
+"""
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import ConversationParticipant, DirectMessage
+
+MEMBERSHIP_CACHE_TIMEOUT = getattr(settings, 'MEMBERSHIP_CACHE_TIMEOUT', 60)
+
+
+def membership_key(conversation_id):
+    return f'discussions:members:{conversation_id}'
+
+
+class MembershipCache:
+    """conversation_id -> frozenset of member user ids, in the default cache"""
+
+    def __init__(self, timeout=MEMBERSHIP_CACHE_TIMEOUT):
+        self.timeout = timeout
+
+    def get(self, conversation_id):
+        return cache.get(membership_key(conversation_id))
+
+    def set(self, conversation_id, members):
+        cache.set(membership_key(conversation_id), members, self.timeout)
+
+    def invalidate(self, conversation_id):
+        cache.delete(membership_key(conversation_id))
+
+
+membership_cache = MembershipCache()
+
+
+def load_member_ids(conversation_id):
+    """Member ids of a stored conversation, cached; empty results are not cached"""
+    members = membership_cache.get(conversation_id)
+    if members is None:
+        members = frozenset(
+            ConversationParticipant.objects.filter(
+                conversation__conversation_id=conversation_id
+            ).values_list('user_id', flat=True)
+        )
+        if members:
+            membership_cache.set(conversation_id, members)
+    return members
+
+
+async def is_member(conversation_id, user_id):
+    participant_ids = DirectMessage.get_participant_ids(conversation_id)
+    if participant_ids is not None:
+        return user_id in participant_ids
+    return user_id in await database_sync_to_async(load_member_ids)(conversation_id)
@@ -1,30 +1,30 @@
 # discussions/middleware.py
 from channels.middleware import BaseMiddleware
-from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
-from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from urllib.parse import parse_qs
-import logging
+from accounts.cache import aget_cached_user
+from core.eventlog import EventLogger
 
-User = get_user_model()
-logger = logging.getLogger(__name__)
+log = EventLogger(__name__)
 
-@database_sync_to_async
-def get_user_from_token(token_string):
+async def get_user_from_token(token_string):
     """Get user from JWT token"""
     try:
         # Validate the token
         token = AccessToken(token_string)
         user_id = token['user_id']
         
-        # Get the user
-        user = User.objects.get(id=user_id)
-        logger.info(f"WebSocket authentication successful for user: {user.email}")
+        # Get the user from the user cache; only a miss leaves the event loop
+        user = await aget_cached_user(user_id)
+        if user is None or not user.is_active:
+            log.warning('ws.auth.failed', reason='inactive_user', user_id=user_id)
+            return AnonymousUser()
+        log.debug('ws.auth.ok', user_id=user.id)
         return user
-    except (InvalidToken, TokenError, User.DoesNotExist) as e:
-        logger.warning(f"WebSocket authentication failed: {e}")
+    except (InvalidToken, TokenError) as e:
+        log.warning('ws.auth.failed', reason='invalid_token', error=e)
         return AnonymousUser()
 
 class JWTAuthMiddleware(BaseMiddleware):
@@ -44,9 +44,8 @@ class JWTAuthMiddleware(BaseMiddleware):
             if token:
                 # Get user from token
                 scope['user'] = await get_user_from_token(token)
-                logger.info(f"WebSocket scope user set to: {scope['user']}")
             else:
-                logger.warning("No token found in WebSocket query parameters")
+                log.warning('ws.auth.failed', reason='no_token')
                 scope['user'] = AnonymousUser()
         
         return await super().__call__(scope, receive, send)
@@ -1,6 +1,7 @@
 # discussions/models.py
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from core.models import BaseModel
 from courses.models import Course, Lecture
 
@@ -85,6 +86,9 @@ class DirectMessage(BaseModel):
     subject = models.CharField(max_length=200, blank=True)  # Optional for chat-style messages
     content = models.TextField()
     
+    # Deprecated: read state is the participants' read pointers
+    # (ConversationParticipant.last_read_message) and these are no longer
+    # written; backfill_conversations only reads them for older messages
     is_read = models.BooleanField(default=False)
     read_at = models.DateTimeField(null=True, blank=True)
     
@@ -92,6 +96,10 @@ class DirectMessage(BaseModel):
     parent_message = models.ForeignKey('self', null=True, blank=True,
                                       on_delete=models.SET_NULL, related_name='replies')
     
+    # Not auto_now_add: bulk_create would overwrite the time the
+    # write-behind writer recorded when the message was sent
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    
     class Meta:
         db_table = 'direct_messages'
         ordering = ['-created_at']
@@ -120,24 +128,62 @@ class DirectMessage(BaseModel):
     @classmethod
     def get_conversation_id(cls, user1, user2):
         """Generate conversation ID for two users"""
-        user_ids = sorted([str(user1.id), str(user2.id)])
+        return cls.get_conversation_id_for_ids(user1.id, user2.id)
+    
+    @staticmethod
+    def get_conversation_id_for_ids(user1_id, user2_id):
+        """Generate conversation ID for two user IDs"""
+        user_ids = sorted([str(user1_id), str(user2_id)])
         return f"conv_{user_ids[0]}_{user_ids[1]}"
     
-    @classmethod
-    def get_conversations_for_user(cls, user):
-        """Get all conversations for a user with latest message info"""
-        from django.db.models import Max, Q, Count, Case, When
-        
-        # Get latest message for each conversation the user is part of
-        conversations = cls.objects.filter(
-            Q(sender=user) | Q(recipient=user)
-        ).values('conversation_id').annotate(
-            latest_message_time=Max('created_at'),
-            message_count=Count('id'),
-            unread_count=Count(Case(
-                When(recipient=user, is_read=False, then=1),
-                default=0
-            ))
-        ).order_by('-latest_message_time')
-        
-        return conversations
\ No newline at end of file
+    @staticmethod
+    def get_participant_ids(conversation_id):
+        """Get the two user IDs encoded in a conversation ID, or None if malformed"""
+        try:
+            prefix, first, second = conversation_id.split('_')
+            if prefix != 'conv':
+                return None
+            return int(first), int(second)
+        except ValueError:
+            return None
+
+class Conversation(BaseModel):
+    """
+    Summary row per direct-message conversation, maintained on every write
+    (see discussions.services) so inbox reads never scan direct_messages.
+    """
+    conversation_id = models.CharField(max_length=100, unique=True)
+    participants = models.ManyToManyField(settings.AUTH_USER_MODEL,
+                                          through='ConversationParticipant',
+                                          related_name='conversations')
+    
+    last_message = models.ForeignKey(DirectMessage, null=True, blank=True,
+                                     on_delete=models.SET_NULL, related_name='+')
+    last_message_preview = models.CharField(max_length=255, blank=True)
+    last_activity_at = models.DateTimeField()
+    message_count = models.IntegerField(default=0)
+    
+    class Meta:
+        db_table = 'conversations'
+
+class ConversationParticipant(BaseModel):
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE,
+                                     related_name='memberships')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                             related_name='conversation_memberships')
+    
+    # Per-participant read state
+    unread_count = models.IntegerField(default=0)
+    last_read_message = models.ForeignKey(DirectMessage, null=True, blank=True,
+                                          on_delete=models.SET_NULL, related_name='+')
+    last_read_at = models.DateTimeField(null=True, blank=True)
+    
+    # Copy of Conversation.last_activity_at so the inbox is one index scan
+    last_activity_at = models.DateTimeField()
+    
+    class Meta:
+        db_table = 'conversation_participants'
+        unique_together = ['conversation', 'user']
+        indexes = [
+            models.Index(fields=['user', '-last_activity_at']),
+        ]
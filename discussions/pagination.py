@@ -0,0 +1,117 @@
+# discussions/pagination.py
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(timestamp, pk):
+    """Encode a (timestamp, id) keyset position as an opaque URL-safe token"""
+    raw = f"{timestamp.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Decode a token produced by encode_cursor back into (timestamp, id)"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        timestamp, pk = base64.urlsafe_b64decode(padded).decode().split('|')
+        return datetime.fromisoformat(timestamp), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor(f'Invalid cursor: {token}')
+
+
+def get_page_size(request):
+    """Read ?limit= from the request, DRF's or Django's, clamped to MAX_PAGE_SIZE"""
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_PAGE_SIZE))
+    except (TypeError, ValueError):
+        limit = DEFAULT_PAGE_SIZE
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def before_cursor(queryset, token, field='created_at'):
+    """
+    Restrict a queryset ordered by (-field, -id) to rows strictly after the
+    cursor position, i.e. older than the last row of the previous page.
+    """
+    if not token:
+        return queryset
+    timestamp, pk = decode_cursor(token)
+    return queryset.filter(
+        Q(**{f'{field}__lt': timestamp}) | Q(**{field: timestamp, 'id__lt': pk})
+    )
+
+
+def keyset_page(queryset, request, field='created_at'):
+    """The rows of one page of a queryset ordered by (-field, -id), plus one, and the page size"""
+    limit = get_page_size(request)
+    queryset = before_cursor(queryset, request.GET.get('before'), field)
+    return queryset[:limit + 1], limit
+
+
+def close_keyset_page(rows, limit, field='created_at'):
+    """Trim the extra row fetched by keyset_page; it shows another page follows"""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, field), last.pk)
+    return rows, next_cursor
+
+
+def paginate_keyset(queryset, request, field='created_at'):
+    """
+    Fetch one page of a queryset ordered by (-field, -id).
+
+    Returns the rows of the page and the cursor for the next page, or None
+    when this is the last page. Only one query is issued: the page is
+    fetched with one extra row to detect whether more rows follow.
+    """
+    page, limit = keyset_page(queryset, request, field)
+    return close_keyset_page(list(page), limit, field)
+
+
+async def apaginate_keyset(queryset, request, field='created_at'):
+    """paginate_keyset() for async views"""
+    page, limit = keyset_page(queryset, request, field)
+    return close_keyset_page([row async for row in page], limit, field)
+
+
+def encode_id_cursor(pk):
+    """Encode an id keyset position as an opaque URL-safe token"""
+    return base64.urlsafe_b64encode(str(pk).encode()).decode().rstrip('=')
+
+
+def decode_id_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        return int(base64.urlsafe_b64decode(padded).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor(f'Invalid cursor: {token}')
+
+
+def paginate_by_id(queryset, request):
+    """
+    Fetch one page of a queryset in ascending id order, continuing after
+    the ?after= cursor. Returns the rows and the next cursor, or None on
+    the last page.
+    """
+    limit = get_page_size(request)
+    token = request.query_params.get('after')
+    if token:
+        queryset = queryset.filter(id__gt=decode_id_cursor(token))
+    rows = list(queryset.order_by('id')[:limit + 1])
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_id_cursor(rows[-1].pk)
+    return rows, next_cursor
@@ -0,0 +1,271 @@
+# discussions/presence.py
+"""
+Presence and typing indicators.
+
+Presence counts each user's open sockets in the default cache. With
+several ASGI workers that cache must be shared (CACHE_URL, a Redis cache
+next to the channel layer's): a per-process cache only counts the
+worker's own sockets, so a user would show offline as soon as one worker
+has none for them (core.checks warns about that setup). Counts expire
+after PRESENCE_TIMEOUT unless refreshed, which each worker does for its
+own open sockets every PRESENCE_REFRESH_INTERVAL.
+
+When a user comes online or goes offline the change is queued and, once
+per PRESENCE_FLUSH_INTERVAL, sent to the personal groups of everyone who
+shares a conversation with them: one presence_snapshot event per
+watcher, covering every change in the window.
+
+Typing updates are coalesced per conversation: repeated keystrokes that do
+not change a user's state are dropped, and a conversation's changes go out
+as one typing_indicator event at most TYPING_UPDATES_PER_SECOND times a
+second.
+"""
+import asyncio
+import logging
+import time
+import weakref
+from collections import Counter, defaultdict
+
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .delivery import conversation_group_name, group_send_many, user_group_name
+from .models import ConversationParticipant
+
+logger = logging.getLogger(__name__)
+
+TYPING_UPDATES_PER_SECOND = getattr(settings, 'TYPING_UPDATES_PER_SECOND', 2)
+PRESENCE_FLUSH_INTERVAL = getattr(settings, 'PRESENCE_FLUSH_INTERVAL', 1.0)
+
+# Rate-limit timestamps kept before expired ones are swept
+TYPING_STATE_LIMIT = 10000
+
+# Socket counts expire so a crashed worker cannot leave users online for
+# long; each worker refreshes the counts of its own users' open sockets
+# every PRESENCE_REFRESH_INTERVAL seconds, however long they stay open
+PRESENCE_TIMEOUT = 60 * 5
+PRESENCE_REFRESH_INTERVAL = 60
+LAST_SEEN_TIMEOUT = 60 * 60 * 24 * 30
+
+
+def presence_key(user_id):
+    return f'presence:sockets:{user_id}'
+
+
+def last_seen_key(user_id):
+    return f'presence:last_seen:{user_id}'
+
+
+def refresh_presence(local_sockets):
+    """Extend the given users' socket counts, restoring any that were evicted"""
+    for user_id, sockets in local_sockets.items():
+        if not cache.touch(presence_key(user_id), PRESENCE_TIMEOUT):
+            cache.add(presence_key(user_id), sockets, PRESENCE_TIMEOUT)
+
+
+# Flush tasks are referenced here until they finish so they are not
+# garbage collected mid-flight
+_running_flushes = set()
+
+
+def schedule_flush(delay, flush, *args):
+    """Run the flush coroutine function after delay seconds on the running loop"""
+    loop = asyncio.get_running_loop()
+
+    async def run():
+        try:
+            await flush(*args)
+        except Exception:
+            logger.exception('Presence/typing flush failed')
+
+    def start():
+        task = loop.create_task(run())
+        _running_flushes.add(task)
+        task.add_done_callback(_running_flushes.discard)
+
+    return loop.call_later(delay, start)
+
+
+def get_partner_ids(user_ids):
+    """Map each user to the users they share a conversation with"""
+    partners = defaultdict(set)
+    pairs = ConversationParticipant.objects.filter(
+        conversation__memberships__user_id__in=user_ids
+    ).values_list('conversation__memberships__user_id', 'user_id')
+    for user_id, partner_id in pairs:
+        if user_id != partner_id:
+            partners[user_id].add(partner_id)
+    return partners
+
+
+async def get_presence(user_ids):
+    """Presence entries for the given users, as sent in presence_snapshot events"""
+    keys = [presence_key(user_id) for user_id in user_ids]
+    keys += [last_seen_key(user_id) for user_id in user_ids]
+    values = await cache.aget_many(keys)
+    return [
+        {
+            'user_id': user_id,
+            'online': values.get(presence_key(user_id), 0) > 0,
+            'last_seen': values.get(last_seen_key(user_id))
+        }
+        for user_id in user_ids
+    ]
+
+
+class PresenceTracker:
+    """Counts sockets per user and batches online/offline changes to watchers"""
+
+    def __init__(self, channel_layer=None, interval=None):
+        self.channel_layer = channel_layer
+        self.interval = PRESENCE_FLUSH_INTERVAL if interval is None else interval
+        self.changed = set()
+        self.flush_handle = None
+        self.local_sockets = Counter()
+        self.refresh_handle = None
+
+    async def connect(self, user_id):
+        self.local_sockets[user_id] += 1
+        if self.refresh_handle is None:
+            self.refresh_handle = schedule_flush(PRESENCE_REFRESH_INTERVAL, self.refresh)
+        
+        key = presence_key(user_id)
+        await cache.aadd(key, 0, PRESENCE_TIMEOUT)
+        try:
+            sockets = await cache.aincr(key)
+        except ValueError:
+            # Expired between add and incr
+            await cache.aset(key, 1, PRESENCE_TIMEOUT)
+            sockets = 1
+        if sockets == 1:
+            self.mark_changed(user_id)
+
+    async def disconnect(self, user_id):
+        self.local_sockets[user_id] -= 1
+        if self.local_sockets[user_id] <= 0:
+            del self.local_sockets[user_id]
+        
+        key = presence_key(user_id)
+        try:
+            sockets = await cache.adecr(key)
+        except ValueError:
+            sockets = 0
+        if sockets <= 0:
+            await cache.adelete(key)
+            await cache.aset(last_seen_key(user_id), timezone.now().isoformat(), LAST_SEEN_TIMEOUT)
+            self.mark_changed(user_id)
+
+    async def refresh(self):
+        """Keep the counts of users with sockets on this worker from expiring"""
+        self.refresh_handle = None
+        if not self.local_sockets:
+            return
+        await sync_to_async(refresh_presence)(dict(self.local_sockets))
+        if self.local_sockets and self.refresh_handle is None:
+            self.refresh_handle = schedule_flush(PRESENCE_REFRESH_INTERVAL, self.refresh)
+    
+    def mark_changed(self, user_id):
+        self.changed.add(user_id)
+        if self.flush_handle is None:
+            self.flush_handle = schedule_flush(self.interval, self.flush)
+
+    async def flush(self):
+        self.flush_handle = None
+        changed, self.changed = sorted(self.changed), set()
+        if not changed:
+            return
+
+        presence = {entry['user_id']: entry for entry in await get_presence(changed)}
+        partners = await database_sync_to_async(get_partner_ids)(changed)
+
+        updates = defaultdict(list)
+        for user_id in changed:
+            for partner_id in partners.get(user_id, ()):
+                updates[partner_id].append(presence[user_id])
+
+        channel_layer = self.channel_layer or get_channel_layer()
+        await group_send_many(channel_layer, [
+            (user_group_name(partner_id), {'type': 'presence_snapshot', 'users': users})
+            for partner_id, users in updates.items()
+        ])
+
+
+class TypingCoalescer:
+    """Rate-limits typing_indicator broadcasts per conversation"""
+
+    def __init__(self, channel_layer=None, rate=TYPING_UPDATES_PER_SECOND):
+        self.channel_layer = channel_layer
+        self.min_interval = 1 / rate
+        self.pending = {}
+        self.last_sent = {}
+        self.next_allowed = {}
+        self.scheduled = set()
+
+    async def update(self, conversation_id, user_id, is_typing):
+        pending = self.pending.get(conversation_id, {})
+        current = self.last_sent.get(conversation_id, {}).get(user_id, False)
+        if pending.get(user_id, current) == is_typing:
+            return
+        self.pending.setdefault(conversation_id, {})[user_id] = is_typing
+
+        delay = self.next_allowed.get(conversation_id, 0) - time.monotonic()
+        if delay <= 0:
+            await self.flush(conversation_id)
+        elif conversation_id not in self.scheduled:
+            self.scheduled.add(conversation_id)
+            schedule_flush(delay, self.flush, conversation_id)
+
+    async def flush(self, conversation_id):
+        self.scheduled.discard(conversation_id)
+        last_sent = self.last_sent.setdefault(conversation_id, {})
+        updates = [
+            {'user_id': user_id, 'is_typing': is_typing}
+            for user_id, is_typing in self.pending.pop(conversation_id, {}).items()
+            if last_sent.get(user_id, False) != is_typing
+        ]
+        if not updates:
+            return
+
+        for update in updates:
+            if update['is_typing']:
+                last_sent[update['user_id']] = True
+            else:
+                last_sent.pop(update['user_id'], None)
+        if not last_sent:
+            del self.last_sent[conversation_id]
+
+        now = time.monotonic()
+        if len(self.next_allowed) > TYPING_STATE_LIMIT:
+            self.next_allowed = {
+                key: allowed for key, allowed in self.next_allowed.items() if allowed > now
+            }
+        self.next_allowed[conversation_id] = now + self.min_interval
+
+        channel_layer = self.channel_layer or get_channel_layer()
+        await channel_layer.group_send(
+            conversation_group_name(conversation_id),
+            {'type': 'typing_indicator', 'updates': updates}
+        )
+
+
+# One tracker and coalescer per event loop: their timers belong to the loop
+_presence_trackers = weakref.WeakKeyDictionary()
+_typing_coalescers = weakref.WeakKeyDictionary()
+
+
+def get_presence_tracker():
+    loop = asyncio.get_running_loop()
+    if loop not in _presence_trackers:
+        _presence_trackers[loop] = PresenceTracker()
+    return _presence_trackers[loop]
+
+
+def get_typing_coalescer():
+    loop = asyncio.get_running_loop()
+    if loop not in _typing_coalescers:
+        _typing_coalescers[loop] = TypingCoalescer()
+    return _typing_coalescers[loop]
@@ -0,0 +1,103 @@
+# discussions/receipts.py
+"""
+Read receipts.
+
+Reading a conversation moves the reader's last-read pointer on its
+ConversationParticipant row (services.advance_read_pointer) and the move is
+broadcast as a read_receipt event to both participants' personal groups.
+
+Chat sockets report what they have displayed with {"type": "read",
+"message_id": ...}. Those reports are buffered per event loop: only the
+furthest pointer per conversation and user is kept, and the buffer is
+written and broadcast once per READ_RECEIPT_DELAY seconds.
+"""
+import asyncio
+import logging
+import weakref
+from collections import defaultdict
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from .delivery import group_send_many, user_group_name
+from .membership import membership_cache
+from .models import DirectMessage
+from .services import apply_read_pointers
+
+logger = logging.getLogger(__name__)
+
+READ_RECEIPT_DELAY = getattr(settings, 'READ_RECEIPT_DELAY', 1.0)
+
+
+def receipt_groups(conversation_id):
+    participant_ids = (
+        DirectMessage.get_participant_ids(conversation_id)
+        or membership_cache.get(conversation_id)
+        or ()
+    )
+    return [user_group_name(user_id) for user_id in sorted(set(participant_ids))]
+
+
+async def deliver_read_receipts(receipts, channel_layer=None):
+    """Broadcast receipts, one read_receipt event per participant group"""
+    by_group = defaultdict(list)
+    for receipt in receipts:
+        for group in receipt_groups(receipt['conversation_id']):
+            by_group[group].append(receipt)
+
+    await group_send_many(channel_layer or get_channel_layer(), [
+        (group, {'type': 'read_receipt', 'receipts': group_receipts})
+        for group, group_receipts in by_group.items()
+    ])
+
+
+class ReadReceiptBuffer:
+    """Debounces pointer advances reported by sockets"""
+
+    def __init__(self, delay=None, channel_layer=None):
+        self.delay = READ_RECEIPT_DELAY if delay is None else delay
+        self.channel_layer = channel_layer
+        self.pending = {}
+        self.flush_handle = None
+        self.flush_tasks = set()
+
+    def advance(self, conversation_id, user_id, message_id):
+        key = (conversation_id, user_id)
+        if message_id > self.pending.get(key, 0):
+            self.pending[key] = message_id
+        if self.flush_handle is None:
+            self.flush_handle = asyncio.get_running_loop().call_later(self.delay, self.start_flush)
+
+    def start_flush(self):
+        self.flush_handle = None
+        task = asyncio.get_running_loop().create_task(self.flush())
+        self.flush_tasks.add(task)
+        task.add_done_callback(self.flush_tasks.discard)
+
+    async def flush(self):
+        pending, self.pending = self.pending, {}
+        if not pending:
+            return
+
+        pointers = [
+            (conversation_id, user_id, message_id)
+            for (conversation_id, user_id), message_id in sorted(pending.items())
+        ]
+        try:
+            receipts = await database_sync_to_async(apply_read_pointers)(pointers)
+        except Exception:
+            logger.exception('Failed to store %s read pointers', len(pointers))
+            return
+        await deliver_read_receipts(receipts, self.channel_layer)
+
+
+# One buffer per event loop: its timers belong to the loop
+_buffers = weakref.WeakKeyDictionary()
+
+
+def get_read_receipt_buffer():
+    loop = asyncio.get_running_loop()
+    if loop not in _buffers:
+        _buffers[loop] = ReadReceiptBuffer()
+    return _buffers[loop]
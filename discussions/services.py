@@ -0,0 +1,216 @@
+# discussions/services.py
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import BigIntegerField, Case, Count, F, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from accounts.models import User
+from .models import Conversation, ConversationParticipant, DirectMessage
+
+PREVIEW_LENGTH = 255
+
+
+def send_direct_message(sender, recipient, content):
+    """Create a message and update its conversation summary in one transaction"""
+    with transaction.atomic():
+        message = DirectMessage.objects.create(
+            sender=sender,
+            recipient=recipient,
+            content=content
+        )
+        record_messages([message])
+    return message
+
+
+def create_direct_messages(messages):
+    """
+    Insert unsaved messages in order and update their conversation summaries.
+    
+    Messages whose recipient no longer exists are skipped. Returns the saved
+    messages, which get ascending ids in the order given.
+    """
+    recipient_ids = set(User.objects.filter(
+        id__in={message.recipient_id for message in messages}
+    ).values_list('id', flat=True))
+    messages = [message for message in messages if message.recipient_id in recipient_ids]
+    if not messages:
+        return []
+    
+    with transaction.atomic():
+        saved = DirectMessage.objects.bulk_create(messages)
+        record_messages(saved)
+    return saved
+
+
+def record_messages(messages):
+    """
+    Apply newly created messages to their conversation summaries.
+
+    Must run in the same transaction as the message inserts. Conversations
+    are locked in conversation_id order so concurrent writers cannot
+    deadlock, and each one costs a fixed number of queries however many of
+    the messages belong to it.
+    """
+    by_conversation = defaultdict(list)
+    for message in messages:
+        by_conversation[message.conversation_id].append(message)
+
+    for conversation_id in sorted(by_conversation):
+        conversation_messages = sorted(by_conversation[conversation_id], key=lambda m: m.id)
+        _record_conversation_messages(conversation_id, conversation_messages)
+
+
+def _record_conversation_messages(conversation_id, messages):
+    latest = messages[-1]
+    newest = max(message.created_at for message in messages)
+
+    conversation, created = Conversation.objects.select_for_update().get_or_create(
+        conversation_id=conversation_id,
+        defaults={'last_activity_at': newest}
+    )
+    if created:
+        ConversationParticipant.objects.bulk_create([
+            ConversationParticipant(
+                conversation=conversation,
+                user_id=user_id,
+                last_activity_at=newest
+            )
+            for user_id in {latest.sender_id, latest.recipient_id}
+        ], ignore_conflicts=True)
+
+    conversation.message_count = F('message_count') + len(messages)
+    update_fields = ['message_count', 'updated_at']
+    # The latest message is the one with the highest id, the order read
+    # pointers and unread counts use: a message written behind
+    # (discussions.writer) can get a higher id than one sent later over
+    # REST. Activity is the newest send time
+    if created or latest.id > (conversation.last_message_id or 0):
+        conversation.last_message = latest
+        conversation.last_message_preview = latest.content[:PREVIEW_LENGTH]
+        update_fields += ['last_message', 'last_message_preview']
+    if created or newest > conversation.last_activity_at:
+        conversation.last_activity_at = newest
+        update_fields.append('last_activity_at')
+    conversation.save(update_fields=update_fields)
+
+    # Messages count as unread for their recipient; a sender has read
+    # everything up to their own latest message, so sending resets their
+    # unread count to what they received after it
+    unread_by_user = defaultdict(int)
+    last_sent_by_user = {}
+    for message in messages:
+        if message.recipient_id != message.sender_id:
+            unread_by_user[message.recipient_id] += 1
+        last_sent_by_user[message.sender_id] = message
+        unread_by_user[message.sender_id] = 0
+    
+    unread_whens = [
+        When(user_id=user_id, then=Value(count) if user_id in last_sent_by_user else F('unread_count') + count)
+        for user_id, count in unread_by_user.items()
+    ]
+
+    ConversationParticipant.objects.filter(conversation=conversation).update(
+        last_activity_at=conversation.last_activity_at,
+        unread_count=Case(*unread_whens, default=F('unread_count')),
+        last_read_message=Case(
+            *[When(user_id=user_id, then=message.id)
+              for user_id, message in last_sent_by_user.items()],
+            default=F('last_read_message'),
+            output_field=BigIntegerField()
+        ),
+        last_read_at=Case(
+            *[When(user_id=user_id, then=message.created_at)
+              for user_id, message in last_sent_by_user.items()],
+            default=F('last_read_at')
+        ),
+        updated_at=timezone.now()
+    )
+
+
+def get_read_state(conversation_id):
+    """Read pointer of every participant, with the conversation's latest message id"""
+    return list(ConversationParticipant.objects.filter(
+        conversation__conversation_id=conversation_id
+    ).values('id', 'user_id', 'unread_count', 'last_read_message_id', 'conversation__last_message_id'))
+
+
+def get_read_pointers(read_state):
+    """Map user id -> id of the last message they have read"""
+    return {row['user_id']: row['last_read_message_id'] or 0 for row in read_state}
+
+
+def is_message_read(message, read_pointers):
+    """A message is read once its recipient's pointer has reached it"""
+    return message.id <= read_pointers.get(message.recipient_id, 0)
+
+
+def advance_read_pointer(conversation_id, user_id, message_id=None, read_state=None):
+    """
+    Move a participant's last-read pointer forward to message_id, or to the
+    conversation's latest message.
+    
+    This single row update is all that reading costs: message rows are not
+    touched, their read state is derived from the recipient's pointer. The
+    pointer never moves back. Returns a read receipt, or None when the
+    pointer did not move.
+    """
+    if read_state is None:
+        read_state = get_read_state(conversation_id)
+    state = next((row for row in read_state if row['user_id'] == user_id), None)
+    if state is None or state['conversation__last_message_id'] is None:
+        return None
+    
+    latest = state['conversation__last_message_id']
+    current = state['last_read_message_id'] or 0
+    target = latest if message_id is None else min(message_id, latest)
+    if current >= target:
+        return None
+    
+    now = timezone.now()
+    unread_after_target = DirectMessage.objects.filter(
+        conversation_id=conversation_id,
+        recipient_id=user_id,
+        id__gt=target
+    ).order_by().values('conversation_id').annotate(total=Count('id')).values('total')
+    updated = ConversationParticipant.objects.filter(
+        Q(last_read_message__isnull=True) | Q(last_read_message_id__lt=target),
+        pk=state['id']
+    ).update(
+        last_read_message_id=target,
+        last_read_at=now,
+        unread_count=Coalesce(Subquery(unread_after_target), 0),
+        updated_at=now
+    )
+    if not updated:
+        return None
+    return {
+        'conversation_id': conversation_id,
+        'user_id': user_id,
+        'last_read_message_id': target,
+        'read_at': now.isoformat()
+    }
+
+
+def apply_read_pointers(pointers):
+    """Advance several (conversation_id, user_id, message_id) pointers; returns the receipts"""
+    receipts = []
+    with transaction.atomic():
+        for conversation_id, user_id, message_id in pointers:
+            receipt = advance_read_pointer(conversation_id, user_id, message_id)
+            if receipt is not None:
+                receipts.append(receipt)
+    return receipts
+
+
+def get_unread_summary(user):
+    """Total unread messages and conversations with unread messages for a user"""
+    summary = ConversationParticipant.objects.filter(user=user).aggregate(
+        unread_messages=Sum('unread_count'),
+        unread_conversations=Count('id', filter=Q(unread_count__gt=0))
+    )
+    return {
+        'unread_messages': summary['unread_messages'] or 0,
+        'unread_conversations': summary['unread_conversations'],
+    }
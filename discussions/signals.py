@@ -0,0 +1,22 @@
+# discussions/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .membership import membership_cache
+from .models import Conversation, ConversationParticipant
+
+
+@receiver(post_save, sender=ConversationParticipant)
+@receiver(post_delete, sender=ConversationParticipant)
+def invalidate_membership(sender, instance, **kwargs):
+    """Drop the cached members of a conversation a participant joined or left"""
+    conversation_ids = Conversation.objects.filter(
+        pk=instance.conversation_id
+    ).values_list('conversation_id', flat=True)
+    for conversation_id in conversation_ids:
+        membership_cache.invalidate(conversation_id)
+
+
+@receiver(post_delete, sender=Conversation)
+def invalidate_conversation_membership(sender, instance, **kwargs):
+    membership_cache.invalidate(instance.conversation_id)
@@ -1,3 +1,653 @@
-from django.test import TestCase
+import json
+import logging
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import InMemoryChannelLayer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import User
+from courses.models import Course
+from enrollments.models import Enrollment
+from core.instrumentation import record_queries
+from . import async_views
+from .delivery import DeliveryFilter, message_groups, normalize_event, user_group_name
+from .membership import is_member, membership_cache, membership_key
+from .models import Conversation, ConversationParticipant, DirectMessage
+from .presence import PresenceTracker, get_presence, presence_key
+from .routing import websocket_urlpatterns
+from .services import create_direct_messages, send_direct_message
+from .writer import MessageWriter
+
+
+def create_users(count, prefix='user'):
+    return User.objects.bulk_create([
+        User(username=f'{prefix}{i}@test.com', email=f'{prefix}{i}@test.com',
+             first_name=prefix.title(), last_name=str(i), password='!')
+        for i in range(count)
+    ])
+
+
+def create_messages(sender, recipients, content='Hello'):
+    """Bulk create one message per recipient; bulk_create skips save() so set conversation_id here"""
+    return DirectMessage.objects.bulk_create([
+        DirectMessage(
+            sender=sender,
+            recipient=recipient,
+            content=f'{content} {recipient.id}',
+            conversation_id=DirectMessage.get_conversation_id(sender, recipient)
+        )
+        for recipient in recipients
+    ])
+
+
+def connect_socket(path, user):
+    communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), path)
+    communicator.scope['user'] = user
+    return communicator
+
+
+class WebSocketTestCase(TransactionTestCase):
+    def setUp(self):
+        # Keep the consumers' connect and disconnect events out of the test output
+        logging.disable(logging.INFO)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+
+async def receive_frames(communicator, timeout=0.3):
+    """Every frame the socket is sent until it has been quiet for timeout seconds"""
+    frames = []
+    while not await communicator.receive_nothing(timeout):
+        frames.append(await communicator.receive_json_from())
+    return frames
+
+
+class ConversationListTests(TestCase):
+    CONVERSATION_COUNT = 500
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='owner@test.com', email='owner@test.com', password='testpass123'
+        )
+        cls.others = create_users(cls.CONVERSATION_COUNT, prefix='other')
+        create_messages(cls.user, cls.others, content='Outgoing')
+        # A reply in every other conversation leaves one unread message each
+        replies = [
+            DirectMessage(
+                sender=other,
+                recipient=cls.user,
+                content='Reply',
+                conversation_id=DirectMessage.get_conversation_id(other, cls.user)
+            )
+            for other in cls.others[::2]
+        ]
+        DirectMessage.objects.bulk_create(replies)
+        call_command('backfill_conversations', batch_size=200, stdout=StringIO())
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_conversation_page_is_a_single_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/discussions/messages/conversations/')
+
+        self.assertEqual(response.status_code, 200)
+        conversations = response.data['conversations']
+        self.assertEqual(len(conversations), 50)
+        self.assertIsNotNone(response.data['next_cursor'])
+
+        latest = conversations[0]
+        self.assertEqual(latest['last_message'], 'Reply')
+        self.assertEqual(latest['unread_count'], 1)
+        self.assertEqual(latest['message_count'], 2)
+
+    def test_cursor_walks_every_conversation_once(self):
+        seen = []
+        cursor = None
+        while True:
+            params = {'limit': 100}
+            if cursor:
+                params['before'] = cursor
+            with self.assertNumQueries(1):
+                response = self.client.get('/api/discussions/messages/conversations/', params)
+            seen.extend(conversation['id'] for conversation in response.data['conversations'])
+            cursor = response.data['next_cursor']
+            if not cursor:
+                break
+
+        self.assertEqual(len(seen), self.CONVERSATION_COUNT)
+        self.assertEqual(len(set(seen)), self.CONVERSATION_COUNT)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/discussions/messages/conversations/', {'before': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_async_view_returns_the_same_page(self):
+        params = {'limit': 20, 'before': self.client.get(
+            '/api/discussions/messages/conversations/', {'limit': 20}
+        ).data['next_cursor']}
+        request = RequestFactory().get(
+            '/api/discussions/messages/conversations/', params,
+            HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}'
+        )
+        async_to_sync(async_views.get_conversations)(request)  # caches the user
+        
+        with self.assertNumQueries(1):
+            response = async_to_sync(async_views.get_conversations)(request)
+        self.assertEqual(
+            json.loads(response.content),
+            self.client.get('/api/discussions/messages/conversations/', params).json()
+        )
+
+
+class ConversationSummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student, cls.instructor = create_users(2)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def send(self, sender, recipient, content):
+        self.client.force_authenticate(sender)
+        return self.client.post('/api/discussions/messages/send/', {
+            'recipient_id': recipient.id,
+            'content': content
+        })
+
+    def test_send_message_maintains_summary(self):
+        self.send(self.student, self.instructor, 'First question')
+        response = self.send(self.student, self.instructor, 'Second question')
+        self.assertEqual(response.status_code, 201)
+
+        conversation = Conversation.objects.get()
+        self.assertEqual(conversation.message_count, 2)
+        self.assertEqual(conversation.last_message_preview, 'Second question')
+        self.assertEqual(conversation.last_message_id, response.data['message']['id'])
+
+        recipient_state = ConversationParticipant.objects.get(user=self.instructor)
+        sender_state = ConversationParticipant.objects.get(user=self.student)
+        self.assertEqual(recipient_state.unread_count, 2)
+        self.assertEqual(sender_state.unread_count, 0)
+        self.assertEqual(sender_state.last_read_message_id, conversation.last_message_id)
+
+    def test_unread_count_and_mark_read(self):
+        self.send(self.student, self.instructor, 'Hello')
+        self.send(self.student, self.instructor, 'Are you there?')
+
+        self.client.force_authenticate(self.instructor)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/discussions/messages/unread-count/')
+        self.assertEqual(response.data, {'unread_messages': 2, 'unread_conversations': 1})
+
+        conversation_id = DirectMessage.get_conversation_id(self.student, self.instructor)
+        self.client.post(f'/api/discussions/messages/conversations/{conversation_id}/mark-read/')
+        response = self.client.get('/api/discussions/messages/unread-count/')
+        self.assertEqual(response.data, {'unread_messages': 0, 'unread_conversations': 0})
+
+    def test_backfill_matches_live_summary(self):
+        self.send(self.student, self.instructor, 'Hello')
+        self.send(self.instructor, self.student, 'Hi there')
+        self.send(self.student, self.instructor, 'Thanks')
+        live = list(ConversationParticipant.objects.order_by('user_id').values_list(
+            'user_id', 'unread_count', 'last_read_message_id'
+        ))
+
+        ConversationParticipant.objects.all().delete()
+        Conversation.objects.all().delete()
+        call_command('backfill_conversations', stdout=StringIO())
+
+        rebuilt = list(ConversationParticipant.objects.order_by('user_id').values_list(
+            'user_id', 'unread_count', 'last_read_message_id'
+        ))
+        self.assertEqual(rebuilt, live)
+        self.assertEqual(Conversation.objects.get().message_count, 3)
+
+    def test_backfill_keeps_read_pointers(self):
+        self.send(self.student, self.instructor, 'Hello')
+        self.send(self.student, self.instructor, 'Are you there?')
+        conversation_id = DirectMessage.get_conversation_id(self.student, self.instructor)
+        self.client.force_authenticate(self.instructor)
+        self.client.post(f'/api/discussions/messages/conversations/{conversation_id}/mark-read/')
+        self.send(self.student, self.instructor, 'Thanks')
+
+        call_command('backfill_conversations', stdout=StringIO())
+        participant = ConversationParticipant.objects.get(user=self.instructor)
+        self.assertEqual(participant.unread_count, 1)
+        self.assertEqual(participant.last_read_message.content, 'Are you there?')
+
+
+class ConversationHistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student, cls.instructor, cls.outsider, cls.newcomer = create_users(4)
+        cls.conversation_id = DirectMessage.get_conversation_id(cls.student, cls.instructor)
+        DirectMessage.objects.bulk_create([
+            DirectMessage(
+                sender=cls.instructor if i % 2 else cls.student,
+                recipient=cls.student if i % 2 else cls.instructor,
+                content=f'Message {i}',
+                conversation_id=cls.conversation_id
+            )
+            for i in range(300)
+        ])
+        cls.short_conversation_id = DirectMessage.get_conversation_id(cls.student, cls.newcomer)
+        create_messages(cls.newcomer, [cls.student])
+        call_command('backfill_conversations', stdout=StringIO())
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def get_page(self, conversation_id, **params):
+        return self.client.get(f'/api/discussions/messages/conversations/{conversation_id}/', params)
+
+    def test_first_page_cost_does_not_depend_on_history_length(self):
+        # Read state, read pointer update, page
+        with self.assertNumQueries(3):
+            response = self.get_page(self.conversation_id)
+        with self.assertNumQueries(3):
+            self.get_page(self.short_conversation_id)
+
+        messages = response.data['messages']
+        self.assertEqual(len(messages), 50)
+        self.assertEqual(messages[-1]['content'], 'Message 299')
+        self.assertEqual(messages[0]['content'], 'Message 250')
+        self.assertIsNotNone(response.data['next_cursor'])
+
+    def test_before_cursor_scrolls_back_through_history(self):
+        contents = []
+        cursor = None
+        while True:
+            params = {'limit': 100}
+            if cursor:
+                params['before'] = cursor
+            response = self.get_page(self.conversation_id, **params)
+            contents = [m['content'] for m in response.data['messages']] + contents
+            cursor = response.data['next_cursor']
+            if not cursor:
+                break
+
+        self.assertEqual(contents, [f'Message {i}' for i in range(300)])
+
+    def test_non_participant_is_rejected_without_a_query(self):
+        self.client.force_authenticate(self.outsider)
+        with self.assertNumQueries(0):
+            response = self.get_page(self.conversation_id)
+        self.assertEqual(response.status_code, 404)
+    
+    def test_reading_moves_the_pointer_without_updating_messages(self):
+        latest_id = DirectMessage.objects.filter(conversation_id=self.conversation_id).latest('id').id
+        
+        response = self.get_page(self.conversation_id)
+        received = [m for m in response.data['messages'] if not m['is_own_message']]
+        self.assertTrue(all(m['is_read'] for m in received))
+        self.assertFalse(DirectMessage.objects.filter(is_read=True).exists())
+        
+        state = ConversationParticipant.objects.get(
+            conversation__conversation_id=self.conversation_id, user=self.student
+        )
+        self.assertEqual(state.last_read_message_id, latest_id)
+        self.assertEqual(state.unread_count, 0)
+        
+        # The pointer is already at the latest message: no write
+        with self.assertNumQueries(2):
+            self.get_page(self.conversation_id)
+        
+        # The instructor has not read the student's messages yet
+        self.client.force_authenticate(self.instructor)
+        response = self.get_page(self.conversation_id, before=response.data['next_cursor'])
+        sent = [m for m in response.data['messages'] if m['is_own_message']]
+        self.assertTrue(all(m['is_read'] for m in sent))
+
+
+class DeliveryFilterTests(SimpleTestCase):
+    def message(self, message_id, conversation_id='conv_1_2'):
+        return {'id': message_id, 'conversation_id': conversation_id}
+
+    def test_messages_go_to_each_participants_group(self):
+        message = DirectMessage(sender_id=2, recipient_id=1)
+        self.assertEqual(message_groups(message), ['user_1', 'user_2'])
+        self.assertEqual(message_groups(DirectMessage(sender_id=1, recipient_id=1)), ['user_1'])
+
+    def test_repeats_and_other_conversations_are_dropped(self):
+        delivery_filter = DeliveryFilter('conv_1_2', size=2)
+        self.assertTrue(delivery_filter.accept(self.message(1)))
+        self.assertFalse(delivery_filter.accept(self.message(1)))
+        self.assertFalse(delivery_filter.accept(self.message(2, 'conv_1_3')))
+
+        # Only the latest ids are remembered
+        self.assertTrue(delivery_filter.accept(self.message(2)))
+        self.assertTrue(delivery_filter.accept(self.message(3)))
+        self.assertTrue(delivery_filter.accept(self.message(1)))
+
+        self.assertTrue(DeliveryFilter().accept(self.message(1, 'conv_1_3')))
+
+    def test_legacy_flat_events_are_normalized(self):
+        message = normalize_event({
+            'type': 'user_message_notification', 'message_id': 7, 'sender_id': 2,
+            'sender_name': 'Ann', 'message': 'Hi', 'timestamp': '2024-01-01T00:00:00',
+            'conversation_id': 'conv_1_2',
+        })
+        self.assertEqual(message['id'], 7)
+        self.assertEqual(message['sender'], {'id': 2, 'name': 'Ann'})
+        self.assertEqual(message['content'], 'Hi')
+
+
+class MessageDeliveryTests(WebSocketTestCase):
+    async def test_every_socket_gets_each_message_once(self):
+        sender, recipient = await database_sync_to_async(create_users)(2)
+        first = await database_sync_to_async(send_direct_message)(sender, recipient, 'Hi')
+        conversation_id = first.conversation_id
+        other = await database_sync_to_async(send_direct_message)(sender, sender, 'Note to self')
+
+        sockets = {
+            'sender_user': connect_socket('/ws/user/', sender),
+            'sender_chat': connect_socket(f'/ws/chat/{conversation_id}/', sender),
+            'sender_other_chat': connect_socket(f'/ws/chat/{other.conversation_id}/', sender),
+            'recipient_user': connect_socket('/ws/user/', recipient),
+            'recipient_chat': connect_socket(f'/ws/chat/{conversation_id}/', recipient),
+        }
+        for communicator in sockets.values():
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+        for communicator in sockets.values():
+            await receive_frames(communicator)
+
+        await sockets['sender_chat'].send_json_to({
+            'type': 'chat_message', 'message': 'Hello there', 'recipient_id': recipient.id
+        })
+        for name, communicator in sockets.items():
+            messages = [frame['message'] for frame in await receive_frames(communicator)
+                        if frame['type'] == 'chat_message']
+            if name == 'sender_other_chat':
+                self.assertEqual(messages, [])
+                continue
+            with self.subTest(socket=name):
+                self.assertEqual([message['content'] for message in messages], ['Hello there'])
+                self.assertEqual(messages[0]['is_own_message'], name.startswith('sender'))
+
+        for communicator in sockets.values():
+            await communicator.disconnect()
+
+
+class PresenceTests(WebSocketTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    async def test_sockets_are_counted_across_workers(self):
+        user_id = 1
+        # Two trackers on one cache stand for two workers on a shared cache
+        first, second = PresenceTracker(interval=60), PresenceTracker(interval=60)
+        await first.connect(user_id)
+        await second.connect(user_id)
+        await first.disconnect(user_id)
+        self.assertTrue((await get_presence([user_id]))[0]['online'])
+
+        await second.disconnect(user_id)
+        entry, = await get_presence([user_id])
+        self.assertFalse(entry['online'])
+        self.assertIsNotNone(entry['last_seen'])
+        for tracker in (first, second):
+            tracker.flush_handle.cancel()
+            tracker.refresh_handle.cancel()
+    
+    async def test_open_sockets_keep_their_count_alive(self):
+        tracker = PresenceTracker(interval=60)
+        await tracker.connect(1)
+        await tracker.connect(1)
+        await tracker.connect(2)
+        await tracker.disconnect(2)
+        # As if the count had expired while the sockets stayed open
+        await cache.adelete(presence_key(1))
+        
+        tracker.refresh_handle.cancel()
+        await tracker.refresh()
+        self.assertEqual(await cache.aget(presence_key(1)), 2)
+        self.assertIsNone(await cache.aget(presence_key(2)))
+        self.assertIsNotNone(tracker.refresh_handle)
+        tracker.flush_handle.cancel()
+        tracker.refresh_handle.cancel()
+
+    @mock.patch('discussions.presence.PRESENCE_FLUSH_INTERVAL', 0.05)
+    async def test_partners_get_batched_presence_changes(self):
+        watcher, partner = await database_sync_to_async(create_users)(2, prefix='presence')
+        await database_sync_to_async(send_direct_message)(watcher, partner, 'Hi')
+
+        watcher_socket = connect_socket('/ws/user/', watcher)
+        await watcher_socket.connect()
+        snapshot, = await receive_frames(watcher_socket)
+        self.assertEqual(snapshot['users'][0]['online'], False)
+
+        partner_sockets = [connect_socket('/ws/user/', partner) for _ in range(2)]
+        for communicator in partner_sockets:
+            await communicator.connect()
+            # The socket is counted before its own snapshot is sent
+            await communicator.receive_json_from()
+        self.assertEqual(
+            [[user['online'] for user in frame['users']] for frame in await receive_frames(watcher_socket)],
+            [[True]]
+        )
+
+        await partner_sockets[0].disconnect()
+        self.assertEqual(await receive_frames(watcher_socket), [])
+        await partner_sockets[1].disconnect()
+        frames = await receive_frames(watcher_socket)
+        self.assertEqual([[user['online'] for user in frame['users']] for frame in frames], [[False]])
+        await watcher_socket.disconnect()
+
+
+class MessageWriterTests(WebSocketTestCase):
+    def setUp(self):
+        super().setUp()
+        self.sender, self.recipient = create_users(2, prefix='writer')
+        self.channel_layer = InMemoryChannelLayer()
+        self.writer = MessageWriter(batch_size=3, delay=60, channel_layer=self.channel_layer)
+
+    async def events(self, user):
+        channel = await self.channel_layer.new_channel()
+        await self.channel_layer.group_add(user_group_name(user.id), channel)
+        return channel
+
+    async def test_backlog_is_written_in_bounded_batches_in_order(self):
+        with mock.patch('discussions.writer.create_direct_messages', wraps=create_direct_messages) as create:
+            payloads = [await self.writer.submit(self.sender, self.recipient.id, f'Message {i}')
+                        for i in range(8)]
+            await self.writer.drain()
+
+        self.assertTrue(all(len(call.args[0]) <= 3 for call in create.call_args_list))
+        self.assertEqual(sum(len(call.args[0]) for call in create.call_args_list), 8)
+        saved = [message async for message in DirectMessage.objects.order_by('id')]
+        self.assertEqual([message.content for message in saved], [f'Message {i}' for i in range(8)])
+        # The stored time is the submit time the clients were sent
+        self.assertEqual([message.created_at.isoformat() for message in saved],
+                         [payload['created_at'] for payload in payloads])
+
+    async def test_a_message_written_after_a_later_rest_send_can_be_read(self):
+        await self.writer.submit(self.sender, self.recipient.id, 'Over the socket')
+        client = APIClient()
+        client.force_authenticate(self.sender)
+        await database_sync_to_async(client.post)('/api/discussions/messages/send/', {
+            'recipient_id': self.recipient.id, 'content': 'Over REST'
+        })
+        await self.writer.drain()
+
+        rest = await DirectMessage.objects.aget(content='Over REST')
+        written = await DirectMessage.objects.aget(content='Over the socket')
+        self.assertGreater(written.id, rest.id)
+        self.assertLess(written.created_at, rest.created_at)
+        self.assertEqual((await Conversation.objects.aget()).last_message_id, written.id)
+
+        client.force_authenticate(self.recipient)
+        await database_sync_to_async(client.post)(
+            f'/api/discussions/messages/conversations/{written.conversation_id}/mark-read/'
+        )
+        participant = await ConversationParticipant.objects.aget(user=self.recipient)
+        self.assertEqual((participant.unread_count, participant.last_read_message_id), (0, written.id))
+
+        await database_sync_to_async(call_command)('backfill_conversations', stdout=StringIO())
+        conversation = await Conversation.objects.aget()
+        self.assertEqual(conversation.last_message_id, written.id)
+        self.assertEqual(conversation.last_activity_at, rest.created_at)
+
+    async def test_one_flush_task_runs_at_a_time(self):
+        await self.writer.submit(self.sender, self.recipient.id, 'Hi')
+        self.writer.start_flush()
+        task = self.writer.flush_task
+        self.writer.start_flush()
+        self.assertIs(self.writer.flush_task, task)
+        await self.writer.drain()
+        self.assertEqual(await DirectMessage.objects.acount(), 1)
+
+    async def test_sender_is_told_about_messages_that_were_not_saved(self):
+        channel = await self.events(self.sender)
+        await self.writer.submit(self.sender, self.recipient.id, 'Hi')
+        missing = await self.writer.submit(self.sender, 0, 'Nobody there')
+        await self.writer.drain()
+
+        events = [await self.channel_layer.receive(channel) for _ in range(4)]
+        self.assertEqual([event['type'] for event in events],
+                         ['chat_message', 'chat_message', 'message_persisted', 'message_failed'])
+        self.assertEqual(events[3]['client_ids'], [missing['id']])
+        self.assertEqual(await DirectMessage.objects.acount(), 1)
+
+
+class ReadReceiptTests(WebSocketTestCase):
+    @mock.patch('discussions.receipts.READ_RECEIPT_DELAY', 0.05)
+    async def test_reports_are_stored_and_broadcast_once_per_window(self):
+        sender, reader = await database_sync_to_async(create_users)(2, prefix='receipt')
+        messages = [await database_sync_to_async(send_direct_message)(sender, reader, f'Message {i}')
+                    for i in range(3)]
+        conversation_id = messages[0].conversation_id
+        sockets = [connect_socket(f'/ws/chat/{conversation_id}/', user) for user in (sender, reader)]
+        for communicator in sockets:
+            await communicator.connect()
+
+        for message in reversed(messages[:2]):
+            await sockets[1].send_json_to({'type': 'read', 'message_id': message.id})
+        for communicator in sockets:
+            frames = await receive_frames(communicator)
+            self.assertEqual([frame['type'] for frame in frames], ['read_receipt'])
+
+        participant = await ConversationParticipant.objects.aget(user=reader)
+        self.assertEqual((participant.last_read_message_id, participant.unread_count), (messages[1].id, 1))
+        for communicator in sockets:
+            await communicator.disconnect()
+
+
+class MembershipTests(TransactionTestCase):
+    def setUp(self):
+        self.users = create_users(3, prefix='member')
+        self.conversation = Conversation.objects.create(conversation_id='group_1', last_activity_at=timezone.now())
+        for user in self.users[:2]:
+            ConversationParticipant.objects.create(
+                conversation=self.conversation, user=user, last_activity_at=timezone.now()
+            )
+        membership_cache.invalidate('group_1')
+
+    async def test_members_are_kept_in_the_shared_cache(self):
+        first, second, _ = self.users
+        self.assertTrue(await is_member('group_1', first.id))
+        # Any worker on the same cache reads, and drops, this entry
+        self.assertEqual(cache.get(membership_key('group_1')), frozenset({first.id, second.id}))
+
+    async def test_direct_conversations_need_no_query(self):
+        first, second, outsider = self.users
+        conversation_id = DirectMessage.get_conversation_id(first, second)
+        with record_queries() as report:
+            self.assertTrue(await is_member(conversation_id, first.id))
+            self.assertFalse(await is_member(conversation_id, outsider.id))
+        self.assertEqual(report.count, 0)
+
+    async def test_stored_conversations_are_cached(self):
+        first, _, outsider = self.users
+        with record_queries() as report:
+            self.assertTrue(await is_member('group_1', first.id))
+            self.assertFalse(await is_member('group_1', outsider.id))
+        self.assertEqual(report.count, 1)
+
+    async def test_membership_changes_invalidate_the_cache(self):
+        first, second, outsider = self.users
+        self.assertTrue(await is_member('group_1', second.id))
+
+        await ConversationParticipant.objects.filter(conversation=self.conversation, user=second).adelete()
+        self.assertFalse(await is_member('group_1', second.id))
+
+        await ConversationParticipant.objects.acreate(
+            conversation=self.conversation, user=outsider, last_activity_at=timezone.now()
+        )
+        self.assertTrue(await is_member('group_1', outsider.id))
+
+        await self.conversation.adelete()
+        self.assertIsNone(membership_cache.get('group_1'))
+        self.assertFalse(await is_member('group_1', first.id))
+
+
+class DirectoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        def user(email, first_name, last_name='', user_type='student'):
+            return User.objects.create(username=email, email=email, first_name=first_name,
+                                       last_name=last_name, user_type=user_type)
+
+        cls.me = user('me@test.com', 'Me')
+        cls.instructor = user('teach@test.com', 'Ada', 'Lovelace', 'instructor')
+        cls.classmate = user('mate@test.com', 'Bob', 'Adams')
+        cls.stranger = user('other@test.com', 'Alan', 'Turing')
+        course = Course.objects.create(title='Course', slug='course', description='Course',
+                                       instructor=cls.instructor)
+        Enrollment.objects.create(student=cls.me, course=course)
+        Enrollment.objects.create(student=cls.classmate, course=course)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.me)
+
+    def emails(self, **params):
+        response = self.client.get('/api/discussions/messages/users/', params)
+        self.assertEqual(response.status_code, 200)
+        return [user['email'] for user in response.data['users']]
+
+    def test_every_other_user_is_listed(self):
+        self.assertEqual(self.emails(), ['teach@test.com', 'mate@test.com', 'other@test.com'])
+        self.assertEqual(self.emails(user_type='instructor'), ['teach@test.com'])
+
+    def test_search_matches_every_term(self):
+        self.assertEqual(self.emails(search='ada'), ['teach@test.com', 'mate@test.com'])
+        self.assertEqual(self.emails(search='ada love'), ['teach@test.com'])
+        # Short terms only match the start of a name or email
+        self.assertEqual(self.emails(search='al'), ['other@test.com'])
+        self.assertEqual(self.emails(search='nobody'), [])
+
+    def test_shared_courses_filter(self):
+        self.assertEqual(self.emails(shared='instructors'), ['teach@test.com'])
+        self.assertEqual(self.emails(shared='classmates'), ['mate@test.com'])
+        self.assertEqual(self.emails(shared='all'), ['teach@test.com', 'mate@test.com'])
+        response = self.client.get('/api/discussions/messages/users/', {'shared': 'friends'})
+        self.assertEqual(response.status_code, 400)
+
+        self.client.force_authenticate(self.instructor)
+        self.assertEqual(self.emails(shared='students'), ['me@test.com', 'mate@test.com'])
+
+    def test_pages_follow_the_cursor(self):
+        response = self.client.get('/api/discussions/messages/users/', {'limit': 2})
+        self.assertEqual([user['email'] for user in response.data['users']],
+                         ['teach@test.com', 'mate@test.com'])
+        self.assertEqual(self.emails(limit=2, after=response.data['next_cursor']), ['other@test.com'])
+
+        response = self.client.get('/api/discussions/messages/users/', {'after': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
 
-# Create your tests here.
@@ -1,108 +1,170 @@
 # discussions/views.py
-from rest_framework import generics, status
+from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.shortcuts import get_object_or_404
-from django.db.models import Q, Max, Count, Case, When
-from django.contrib.auth import get_user_model
-from django.utils import timezone
-from channels.layers import get_channel_layer
+from django.db.models import Q, Exists, OuterRef
 from asgiref.sync import async_to_sync
-import json
 
-from .models import DirectMessage
+from .delivery import deliver_message, serialize_message
+from .models import ConversationParticipant, DirectMessage
+from .receipts import deliver_read_receipts
+from .services import (
+    advance_read_pointer, get_read_pointers, get_read_state, get_unread_summary, is_message_read,
+    send_direct_message
+)
+from .pagination import InvalidCursor, paginate_by_id, paginate_keyset
 from accounts.models import User
+from core.instrumentation import query_budget
+from courses.models import Course
+from enrollments.models import Enrollment
 
+def _instructors_of_my_courses(user):
+    return Course.objects.filter(instructor=OuterRef('pk'), enrollments__student=user)
+
+
+def _classmates(user):
+    return Enrollment.objects.filter(
+        student=OuterRef('pk'), course__enrollments__student=user
+    )
+
+
+def _students_of_my_courses(user):
+    return Enrollment.objects.filter(student=OuterRef('pk'), course__instructor=user)
+
+
+# Correlated subqueries for ?shared= in the messaging directory
+SHARED_COURSE_FILTERS = {
+    'instructors': [_instructors_of_my_courses],
+    'classmates': [_classmates],
+    'students': [_students_of_my_courses],
+    'all': [_instructors_of_my_courses, _classmates, _students_of_my_courses],
+}
+
+def serialize_conversation(latest_message, user, unread_count, message_count):
+    """Build the conversation list entry for the user from its latest message"""
+    other_user = latest_message.recipient if latest_message.sender_id == user.id else latest_message.sender
+    return {
+        'id': latest_message.conversation_id,
+        'other_user': {
+            'id': other_user.id,
+            'first_name': other_user.first_name or '',
+            'last_name': other_user.last_name or '',
+            'name': f"{other_user.first_name} {other_user.last_name}".strip() or other_user.email,
+            'email': other_user.email,
+            'user_type': other_user.user_type,
+            'avatar': f"https://ui-avatars.com/api/?name={other_user.first_name}+{other_user.last_name}&background=4F46E5&color=fff"
+        },
+        'last_message': latest_message.content,
+        'last_message_time': latest_message.created_at,
+        'last_message_sender': latest_message.sender_id,
+        'unread_count': unread_count,
+        'message_count': message_count
+    }
+
+def conversation_memberships(user):
+    """The user's conversations with a message, most recently active first"""
+    return ConversationParticipant.objects.filter(
+        user=user,
+        conversation__last_message__isnull=False
+    ).select_related(
+        'conversation__last_message__sender',
+        'conversation__last_message__recipient'
+    ).order_by('-last_activity_at', '-id')
+
+def serialize_membership(membership, user):
+    return serialize_conversation(
+        membership.conversation.last_message,
+        user,
+        membership.unread_count,
+        membership.conversation.message_count
+    )
+
+@query_budget(2, duplicates=0)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_conversations(request):
-    """Get all conversations for the authenticated user"""
+    """
+    Get the authenticated user's conversations, most recently active first.
+    
+    Paginated by cursor: pass the returned `next_cursor` as `?before=` to
+    fetch the next page, and `?limit=` to change the page size.
+    """
     user = request.user
     
-    # Get all conversations with their latest message info
-    conversations_data = DirectMessage.get_conversations_for_user(user)
-    
-    conversations_list = []
-    for conv_data in conversations_data:
-        conversation_id = conv_data['conversation_id']
-        
-        # Get the latest message for this conversation
-        latest_message = DirectMessage.objects.filter(
-            conversation_id=conversation_id
-        ).select_related('sender', 'recipient').first()
-        
-        if latest_message:
-            # Determine the other user
-            other_user = latest_message.recipient if latest_message.sender == user else latest_message.sender
-            
-            # Double-check unread count calculation with explicit query
-            actual_unread_count = DirectMessage.objects.filter(
-                conversation_id=conversation_id,
-                recipient=user,
-                is_read=False
-            ).count()
-            
-            conversations_list.append({
-                'id': conversation_id,
-                'other_user': {
-                    'id': other_user.id,
-                    'first_name': other_user.first_name or '',
-                    'last_name': other_user.last_name or '',
-                    'name': f"{other_user.first_name} {other_user.last_name}".strip() or other_user.email,
-                    'email': other_user.email,
-                    'user_type': other_user.user_type,
-                    'avatar': f"https://ui-avatars.com/api/?name={other_user.first_name}+{other_user.last_name}&background=4F46E5&color=fff"
-                },
-                'last_message': latest_message.content,
-                'last_message_time': latest_message.created_at,
-                'last_message_sender': latest_message.sender.id,
-                'unread_count': actual_unread_count,  # Use the explicit count
-                'message_count': conv_data['message_count']
-            })
-    
-    return Response({'conversations': conversations_list})
+    try:
+        memberships, next_cursor = paginate_keyset(
+            conversation_memberships(user), request, field='last_activity_at'
+        )
+    except InvalidCursor as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    conversations_list = [serialize_membership(membership, user) for membership in memberships]
+    
+    return Response({'conversations': conversations_list, 'next_cursor': next_cursor})
 
+@query_budget(4, duplicates=0)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_conversation_messages(request, conversation_id):
-    """Get all messages for a specific conversation"""
+    """
+    Get messages for a specific conversation, newest page first.
+    
+    Each page is returned oldest-first for display. To scroll back, pass the
+    returned `next_cursor` as `?before=`; `?limit=` sets the page size.
+    """
     user = request.user
+    before = request.query_params.get('before')
+    
+    # Verify user is part of this conversation from the conversation ID itself
+    participant_ids = DirectMessage.get_participant_ids(conversation_id)
+    if not participant_ids or user.id not in participant_ids:
+        return Response({'error': 'Conversation not found'}, status=404)
+    
+    # Opening the latest page moves the user's read pointer to the newest
+    # message; is_read below is derived from both participants' pointers
+    read_state = get_read_state(conversation_id)
+    if not before:
+        receipt = advance_read_pointer(conversation_id, user.id, read_state=read_state)
+        if receipt:
+            async_to_sync(deliver_read_receipts)([receipt])
+            read_state = [
+                {**row, 'last_read_message_id': receipt['last_read_message_id']}
+                if row['user_id'] == user.id else row
+                for row in read_state
+            ]
+    read_pointers = get_read_pointers(read_state)
     
-    # Verify user is part of this conversation
     messages = DirectMessage.objects.filter(
         conversation_id=conversation_id
-    ).filter(
-        Q(sender=user) | Q(recipient=user)
-    ).select_related('sender', 'recipient').order_by('created_at')
+    ).select_related('sender').order_by('-created_at', '-id')
+    try:
+        page, next_cursor = paginate_keyset(messages, request)
+    except InvalidCursor as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
-    if not messages.exists():
+    if not page and not before:
         return Response({'error': 'Conversation not found'}, status=404)
     
-    # Mark messages as read for the current user
-    DirectMessage.objects.filter(
-        conversation_id=conversation_id,
-        recipient=user,
-        is_read=False
-    ).update(is_read=True, read_at=timezone.now())
-    
     messages_data = []
-    for message in messages:
+    for message in reversed(page):
+        sender = message.sender
         messages_data.append({
             'id': message.id,
             'sender': {
-                'id': message.sender.id,
-                'name': f"{message.sender.first_name} {message.sender.last_name}".strip() or message.sender.email,
-                'user_type': message.sender.user_type
+                'id': sender.id,
+                'name': f"{sender.first_name} {sender.last_name}".strip() or sender.email,
+                'user_type': sender.user_type
             },
             'content': message.content,
             'created_at': message.created_at,
-            'is_read': message.is_read,
-            'is_own_message': message.sender == user
+            'is_read': is_message_read(message, read_pointers),
+            'is_own_message': message.sender_id == user.id
         })
     
-    return Response({'messages': messages_data})
+    return Response({'messages': messages_data, 'next_cursor': next_cursor})
 
+@query_budget(8, duplicates=0)
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def send_message(request):
@@ -123,72 +185,69 @@ def send_message(request):
             'error': 'Recipient not found'
         }, status=status.HTTP_404_NOT_FOUND)
     
-    # Create the message
-    message = DirectMessage.objects.create(
-        sender=sender,
-        recipient=recipient,
-        content=content
-    )
+    # Create the message and update the conversation summary
+    message = send_direct_message(sender, recipient, content)
     
-    # Prepare message data for WebSocket broadcasting
-    message_data = {
-        'id': message.id,
-        'sender': {
-            'id': sender.id,
-            'name': f"{sender.first_name} {sender.last_name}".strip() or sender.email,
-            'user_type': sender.user_type
-        },
-        'content': message.content,
-        'created_at': message.created_at.isoformat(),
-        'conversation_id': message.conversation_id
-    }
-    
-    # Broadcast message via WebSocket
-    channel_layer = get_channel_layer()
-    
-    # Send to conversation-specific group
-    conversation_id = message.conversation_id
-    async_to_sync(channel_layer.group_send)(
-        f'chat_{conversation_id}',
-        {
-            'type': 'chat_message',
-            'message': message_data
-        }
-    )
-    
-    # Send to both users' personal channels
-    async_to_sync(channel_layer.group_send)(
-        f'user_{sender.id}',
-        {
-            'type': 'chat_message', 
-            'message': {**message_data, 'is_own_message': True}
-        }
-    )
-    
-    async_to_sync(channel_layer.group_send)(
-        f'user_{recipient.id}',
-        {
-            'type': 'chat_message',
-            'message': {**message_data, 'is_own_message': False}
-        }
-    )
+    # Broadcast to every socket of both participants
+    async_to_sync(deliver_message)(message)
     
     # Return the message data
     return Response({
-        'message': {**message_data, 'is_own_message': True}
+        'message': {**serialize_message(message), 'is_own_message': True}
     }, status=status.HTTP_201_CREATED)
 
+@query_budget(2, duplicates=0)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_available_users(request):
-    """Get list of users available for messaging (any user can message any other user)"""
+    """
+    Directory of users available for messaging (any user can message any other user).
+    
+    Query parameters:
+    - search: whitespace-separated terms, each matched against first name,
+      last name and email (prefix match for terms under 3 characters)
+    - user_type: student, instructor or admin
+    - shared: instructors (of my courses), classmates (enrolled in my
+      courses), students (enrolled in courses I teach) or all of them
+    - limit / after: page size and the cursor returned as next_cursor
+    """
     user = request.user
+    users = User.objects.exclude(id=user.id).only(
+        'id', 'first_name', 'last_name', 'email', 'user_type'
+    )
+    
+    for term in request.query_params.get('search', '').split():
+        # Trigram indexes serve both lookups; a substring needs 3 characters
+        lookup = 'icontains' if len(term) >= 3 else 'istartswith'
+        users = users.filter(
+            Q(**{f'first_name__{lookup}': term})
+            | Q(**{f'last_name__{lookup}': term})
+            | Q(**{f'email__{lookup}': term})
+        )
+    
+    user_type = request.query_params.get('user_type')
+    if user_type:
+        users = users.filter(user_type=user_type)
     
-    # Any user can message any other user (excluding themselves)
-    available_users = User.objects.exclude(id=user.id)
+    shared = request.query_params.get('shared')
+    if shared:
+        relations = SHARED_COURSE_FILTERS.get(shared)
+        if relations is None:
+            return Response({
+                'error': f"shared must be one of: {', '.join(SHARED_COURSE_FILTERS)}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        condition = Q()
+        for relation in relations:
+            condition |= Exists(relation(user))
+        users = users.filter(condition)
+    
+    try:
+        page, next_cursor = paginate_by_id(users, request)
+    except InvalidCursor as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
     users_data = []
-    for user_obj in available_users:
+    for user_obj in page:
         users_data.append({
             'id': user_obj.id,
             'first_name': user_obj.first_name,
@@ -199,22 +258,31 @@ def get_available_users(request):
             'avatar': f"https://ui-avatars.com/api/?name={user_obj.first_name}+{user_obj.last_name}&background=4F46E5&color=fff"
         })
     
-    return Response({'users': users_data})
+    return Response({'users': users_data, 'next_cursor': next_cursor})
 
+@query_budget(2, duplicates=0)
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def mark_messages_read(request, conversation_id):
     """Mark all unread messages in a conversation as read for the current user"""
     user = request.user
     
-    # Verify user is part of this conversation and mark messages as read
-    updated_count = DirectMessage.objects.filter(
-        conversation_id=conversation_id,
-        recipient=user,
-        is_read=False
-    ).update(is_read=True, read_at=timezone.now())
+    # Move the user's read pointer to the latest message and tell both participants
+    read_state = get_read_state(conversation_id)
+    receipt = advance_read_pointer(conversation_id, user.id, read_state=read_state)
+    marked_read = 0
+    if receipt:
+        async_to_sync(deliver_read_receipts)([receipt])
+        marked_read = next(row['unread_count'] for row in read_state if row['user_id'] == user.id)
     
     return Response({
-        'marked_read': updated_count,
+        'marked_read': marked_read,
         'conversation_id': conversation_id
     }, status=status.HTTP_200_OK)
+
+@query_budget(2, duplicates=0)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_unread_count(request):
+    """Get unread message totals for the authenticated user's badge"""
+    return Response(get_unread_summary(request.user))
@@ -0,0 +1,147 @@
+# discussions/writer.py
+"""
+Write-behind persistence for chat messages sent over WebSocket.
+
+ChatConsumer hands a message to the MessageWriter, which broadcasts it
+straight away under a provisional id (the message's uuid, which is kept
+when it is saved) and its submit time as created_at. Pending messages are
+written once MESSAGE_BATCH_SIZE of them are waiting or MESSAGE_BATCH_DELAY
+seconds after the first one, whichever comes first.
+
+A single flush task works through the backlog in batches of at most
+MESSAGE_BATCH_SIZE messages, one bulk_create each, in the order messages
+were submitted, so saved ids and conversation summaries follow the order
+clients saw.
+After each batch the participants get a message_persisted event mapping
+provisional ids to database ids; senders get message_failed for messages
+that could not be saved. Messages still pending when a worker is killed
+are lost, so the delay is kept short.
+"""
+import asyncio
+import logging
+import weakref
+from collections import defaultdict
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.utils import timezone
+
+from .delivery import group_send_many, message_groups, serialize_message, user_group_name
+from .models import DirectMessage
+from .services import create_direct_messages
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_BATCH_SIZE = getattr(settings, 'MESSAGE_BATCH_SIZE', 50)
+MESSAGE_BATCH_DELAY = getattr(settings, 'MESSAGE_BATCH_DELAY', 0.05)
+
+
+def provisional_id(message):
+    return str(message.uuid)
+
+
+class MessageWriter:
+    def __init__(self, batch_size=MESSAGE_BATCH_SIZE, delay=MESSAGE_BATCH_DELAY, channel_layer=None):
+        self.batch_size = batch_size
+        self.delay = delay
+        self.channel_layer = channel_layer
+        self.pending = []
+        self.flush_handle = None
+        self.flush_task = None
+        self.lock = asyncio.Lock()
+
+    async def submit(self, sender, recipient_id, content):
+        """Queue a message and broadcast it; returns the broadcast payload"""
+        message = DirectMessage(
+            sender=sender,
+            recipient_id=recipient_id,
+            content=content,
+            created_at=timezone.now(),
+            conversation_id=DirectMessage.get_conversation_id_for_ids(sender.id, recipient_id)
+        )
+        self.pending.append(message)
+        if len(self.pending) >= self.batch_size:
+            self.start_flush()
+        elif self.flush_handle is None:
+            self.flush_handle = asyncio.get_running_loop().call_later(self.delay, self.start_flush)
+
+        payload = {**serialize_message(message), 'id': provisional_id(message)}
+        event = {'type': 'chat_message', 'message': payload}
+        await group_send_many(self.get_channel_layer(), [
+            (group, event) for group in message_groups(message)
+        ])
+        return payload
+
+    def get_channel_layer(self):
+        return self.channel_layer or get_channel_layer()
+
+    def start_flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        # A running flush picks up whatever is submitted while it writes
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.get_running_loop().create_task(self.flush())
+
+    async def flush(self):
+        """Persist everything pending, batch_size messages at a time; batches never overlap"""
+        async with self.lock:
+            if self.flush_handle is not None:
+                self.flush_handle.cancel()
+                self.flush_handle = None
+
+            while self.pending:
+                batch = self.pending[:self.batch_size]
+                del self.pending[:self.batch_size]
+                try:
+                    saved = await database_sync_to_async(create_direct_messages)(batch)
+                except Exception:
+                    logger.exception('Failed to persist %s chat messages', len(batch))
+                    saved = []
+                await self.notify(batch, saved)
+
+    async def drain(self):
+        """Wait until every submitted message has been written"""
+        if self.flush_task is not None:
+            await self.flush_task
+        await self.flush()
+
+    async def notify(self, batch, saved):
+        persisted = defaultdict(list)
+        for message in saved:
+            entry = {
+                'client_id': provisional_id(message),
+                'id': message.id,
+                'conversation_id': message.conversation_id,
+                'created_at': message.created_at.isoformat()
+            }
+            for group in message_groups(message):
+                persisted[group].append(entry)
+
+        saved_ids = {provisional_id(message) for message in saved}
+        failed = defaultdict(list)
+        for message in batch:
+            if provisional_id(message) not in saved_ids:
+                failed[user_group_name(message.sender_id)].append(provisional_id(message))
+
+        sends = [
+            (group, {'type': 'message_persisted', 'messages': entries})
+            for group, entries in persisted.items()
+        ]
+        sends += [
+            (group, {'type': 'message_failed', 'client_ids': client_ids})
+            for group, client_ids in failed.items()
+        ]
+        await group_send_many(self.get_channel_layer(), sends)
+
+
+# One writer per event loop: its lock and timers belong to the loop
+_writers = weakref.WeakKeyDictionary()
+
+
+def get_message_writer():
+    loop = asyncio.get_running_loop()
+    if loop not in _writers:
+        _writers[loop] = MessageWriter()
+    return _writers[loop]
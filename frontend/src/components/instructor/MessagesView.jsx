@@ -16,8 +16,17 @@ const MessagesView = () => {
   const [isTyping, setIsTyping] = useState(false);
   const [socket, setSocket] = useState(null);
   const [userSocket, setUserSocket] = useState(null);
+  // Cursors of the next page of each paginated list, null on the last page
+  const [conversationsCursor, setConversationsCursor] = useState(null);
+  const [messagesCursor, setMessagesCursor] = useState(null);
+  const [usersCursor, setUsersCursor] = useState(null);
+  // user_id -> {online, last_seen} of the users in the conversation list
+  const [presence, setPresence] = useState({});
   const messagesEndRef = useRef(null);
   const typingTimeoutRef = useRef(null);
+  const keepScrollRef = useRef(false);
+  // provisional message id -> changes from message_persisted/message_failed
+  const settledMessagesRef = useRef({});
 
   // Helper function to safely get user initials
   const getUserInitials = (user) => {
@@ -28,11 +37,77 @@ const MessagesView = () => {
     return firstInitial + lastInitial || user.email?.[0]?.toUpperCase() || '?';
   };
 
+  // Online state of conversation partners, from the user socket's presence frames
+  const updatePresence = (users) => {
+    setPresence(prev => {
+      const next = { ...prev };
+      users.forEach(user => {
+        next[user.user_id] = user;
+      });
+      return next;
+    });
+  };
+
+  const presenceLabel = (userId) => {
+    const state = presence[userId];
+    if (!state) return null;
+    if (state.online) return 'Online';
+    if (!state.last_seen) return 'Offline';
+    return `Last seen ${new Date(state.last_seen).toLocaleString([], {
+      month: 'short',
+      day: 'numeric',
+      hour: '2-digit',
+      minute: '2-digit'
+    })}`;
+  };
+
+  // Messages sent over a socket are broadcast under a provisional id before
+  // they are saved; message_persisted and message_failed settle them later.
+  // Settlements are remembered because the other socket may still deliver
+  // the provisional copy afterwards.
+  const settleMessage = (message) => {
+    const changes = settledMessagesRef.current[message.id];
+    return changes ? { ...message, ...changes } : message;
+  };
+
+  const settleMessages = (changesById) => {
+    Object.assign(settledMessagesRef.current, changesById);
+    setMessages(prev => {
+      const ids = new Set(prev.map(msg => msg.id));
+      return prev.flatMap(msg => {
+        const changes = changesById[msg.id];
+        if (!changes) return [msg];
+        // History loaded since the send may already hold the saved copy
+        if (changes.id !== undefined && ids.has(changes.id)) return [];
+        return [{ ...msg, ...changes }];
+      });
+    });
+  };
+
+  const handleSettlement = (data) => {
+    if (data.type === 'message_persisted') {
+      settleMessages(Object.fromEntries((data.messages || []).map(entry => [
+        entry.client_id,
+        { id: entry.id, created_at: entry.created_at }
+      ])));
+    } else if (data.type === 'message_failed') {
+      settleMessages(Object.fromEntries((data.client_ids || []).map(clientId => [
+        clientId,
+        { failed: true }
+      ])));
+    }
+  };
+
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
   };
 
   useEffect(() => {
+    // Loading older messages prepends them; stay where the user scrolled to
+    if (keepScrollRef.current) {
+      keepScrollRef.current = false;
+      return;
+    }
     scrollToBottom();
   }, [messages]);
 
@@ -92,6 +167,7 @@ const MessagesView = () => {
               is_own_message: data.sender_id === currentUser?.id
             };
           }
+          messageData = settleMessage(messageData);
           
           if (messageData.conversation_id === selectedConversation?.id) {
             console.log('Instructor Dashboard: Adding message from user WebSocket to current conversation');
@@ -110,6 +186,10 @@ const MessagesView = () => {
               markMessagesAsRead(messageData.conversation_id);
             }
           }
+        } else if (data.type === 'message_persisted' || data.type === 'message_failed') {
+          handleSettlement(data);
+        } else if (data.type === 'presence') {
+          updatePresence(data.users || []);
         }
       } catch (error) {
         console.error('Instructor Dashboard: Error parsing user WebSocket message:', error);
@@ -186,6 +266,7 @@ const MessagesView = () => {
                 is_own_message: data.sender_id === currentUser?.id
               };
             }
+            messageData = settleMessage(messageData);
 
             if (messageData.conversation_id === selectedConversation?.id) {
               console.log('Instructor Dashboard: Adding message to current conversation:', messageData.conversation_id);
@@ -206,6 +287,8 @@ const MessagesView = () => {
             }
             
             fetchConversations();
+          } else if (data.type === 'message_persisted' || data.type === 'message_failed') {
+            handleSettlement(data);
           } else if (data.type === 'typing_indicator') {
             if (data.conversation_id === selectedConversation?.id) {
               setIsTyping(data.is_typing);
@@ -245,15 +328,36 @@ const MessagesView = () => {
     try {
       const response = await api.get('/discussions/messages/conversations/');
       setConversations(response.data.conversations || []);
+      setConversationsCursor(response.data.next_cursor || null);
+    } catch (error) {
+      console.error('Error fetching conversations:', error);
+    }
+  };
+
+  const loadMoreConversations = async () => {
+    if (!conversationsCursor) return;
+    try {
+      const response = await api.get('/discussions/messages/conversations/', {
+        params: { before: conversationsCursor }
+      });
+      setConversations(prev => {
+        const loaded = new Set(prev.map(conv => conv.id));
+        return [...prev, ...(response.data.conversations || []).filter(conv => !loaded.has(conv.id))];
+      });
+      setConversationsCursor(response.data.next_cursor || null);
     } catch (error) {
       console.error('Error fetching conversations:', error);
     }
   };
 
-  const fetchAvailableUsers = async () => {
+  const fetchAvailableUsers = async (search = '', after = null) => {
     try {
-      const response = await api.get('/discussions/messages/users/');
-      setAvailableUsers(response.data.users || []);
+      const response = await api.get('/discussions/messages/users/', {
+        params: { search: search || undefined, after: after || undefined }
+      });
+      const users = response.data.users || [];
+      setAvailableUsers(prev => (after ? [...prev, ...users] : users));
+      setUsersCursor(response.data.next_cursor || null);
     } catch (error) {
       console.error('Error fetching users:', error);
     }
@@ -263,6 +367,21 @@ const MessagesView = () => {
     try {
       const response = await api.get(`/discussions/messages/conversations/${conversationId}/`);
       setMessages(response.data.messages || []);
+      setMessagesCursor(response.data.next_cursor || null);
+    } catch (error) {
+      console.error('Error fetching messages:', error);
+    }
+  };
+
+  const loadOlderMessages = async () => {
+    if (!messagesCursor || !selectedConversation) return;
+    try {
+      const response = await api.get(`/discussions/messages/conversations/${selectedConversation.id}/`, {
+        params: { before: messagesCursor }
+      });
+      keepScrollRef.current = true;
+      setMessages(prev => [...(response.data.messages || []), ...prev]);
+      setMessagesCursor(response.data.next_cursor || null);
     } catch (error) {
       console.error('Error fetching messages:', error);
     }
@@ -346,15 +465,14 @@ const MessagesView = () => {
 
   useEffect(() => {
     fetchConversations();
-    fetchAvailableUsers();
   }, []);
 
-  const filteredUsers = availableUsers.filter(user =>
-    (user.first_name || '').toLowerCase().includes(searchTerm.toLowerCase()) ||
-    (user.last_name || '').toLowerCase().includes(searchTerm.toLowerCase()) ||
-    (user.name || '').toLowerCase().includes(searchTerm.toLowerCase()) ||
-    (user.email || '').toLowerCase().includes(searchTerm.toLowerCase())
-  );
+  // The directory is searched on the server, a moment after typing stops
+  useEffect(() => {
+    if (!showNewChatModal) return;
+    const timeout = setTimeout(() => fetchAvailableUsers(searchTerm), 300);
+    return () => clearTimeout(timeout);
+  }, [searchTerm, showNewChatModal]);
 
   return (
     <>
@@ -408,6 +526,9 @@ const MessagesView = () => {
                             {getUserInitials(conversation.other_user)}
                           </span>
                         </div>
+                        {presence[conversation.other_user.id]?.online && (
+                          <span className="absolute bottom-0 right-0 w-3 h-3 bg-green-500 border-2 border-white rounded-full" />
+                        )}
                       </div>
                       <div className="flex-1 min-w-0">
                         <div className="flex items-center justify-between">
@@ -439,6 +560,14 @@ const MessagesView = () => {
                   </div>
                 ))
               )}
+              {conversationsCursor && (
+                <button
+                  onClick={loadMoreConversations}
+                  className="w-full p-3 text-sm text-indigo-600 hover:bg-indigo-50"
+                >
+                  Load more conversations
+                </button>
+              )}
             </div>
           </div>
 
@@ -459,12 +588,25 @@ const MessagesView = () => {
                         {selectedConversation.other_user.name || `${selectedConversation.other_user.first_name || ''} ${selectedConversation.other_user.last_name || ''}`.trim() || selectedConversation.other_user.email}
                       </h3>
                       <p className="text-sm text-gray-500">{selectedConversation.other_user.email}</p>
+                      {presenceLabel(selectedConversation.other_user.id) && (
+                        <p className="text-xs text-gray-500">{presenceLabel(selectedConversation.other_user.id)}</p>
+                      )}
                     </div>
                   </div>
                 </div>
 
                 {/* Messages */}
                 <div className="flex-1 overflow-y-auto p-4 space-y-4">
+                  {messagesCursor && (
+                    <div className="text-center">
+                      <button
+                        onClick={loadOlderMessages}
+                        className="text-sm text-indigo-600 hover:text-indigo-800"
+                      >
+                        Load older messages
+                      </button>
+                    </div>
+                  )}
                   {messages.map((message) => (
                     <div
                       key={message.id}
@@ -488,6 +630,9 @@ const MessagesView = () => {
                             minute: '2-digit'
                           })}
                         </p>
+                        {message.failed && (
+                          <p className="text-xs mt-1 text-red-200">Not sent</p>
+                        )}
                       </div>
                     </div>
                   ))}
@@ -570,7 +715,7 @@ const MessagesView = () => {
               </div>
 
               <div className="max-h-60 overflow-y-auto">
-                {filteredUsers.map((user) => (
+                {availableUsers.map((user) => (
                   <div
                     key={user.id}
                     onClick={() => startNewConversation(user.id)}
@@ -589,6 +734,14 @@ const MessagesView = () => {
                     </div>
                   </div>
                 ))}
+                {usersCursor && (
+                  <button
+                    onClick={() => fetchAvailableUsers(searchTerm, usersCursor)}
+                    className="w-full p-2 text-sm text-indigo-600 hover:bg-indigo-50 rounded-lg"
+                  >
+                    Load more users
+                  </button>
+                )}
               </div>
             </div>
           </div>
@@ -16,19 +16,93 @@ const StudentMessagesView = () => {
   const [showNewChatModal, setShowNewChatModal] = useState(false);
   const [availableUsers, setAvailableUsers] = useState([]);
   const [searchTerm, setSearchTerm] = useState('');
+  // Cursors of the next page of each paginated list, null on the last page
+  const [conversationsCursor, setConversationsCursor] = useState(null);
+  const [messagesCursor, setMessagesCursor] = useState(null);
+  const [usersCursor, setUsersCursor] = useState(null);
+  // user_id -> {online, last_seen} of the users in the conversation list
+  const [presence, setPresence] = useState({});
   const messagesEndRef = useRef(null);
+  const keepScrollRef = useRef(false);
+  // provisional message id -> changes from message_persisted/message_failed
+  const settledMessagesRef = useRef({});
   
+  // Online state of conversation partners, from the user socket's presence frames
+  const updatePresence = (users) => {
+    setPresence(prev => {
+      const next = { ...prev };
+      users.forEach(user => {
+        next[user.user_id] = user;
+      });
+      return next;
+    });
+  };
+
+  const presenceLabel = (userId) => {
+    const state = presence[userId];
+    if (!state) return null;
+    if (state.online) return 'Online';
+    if (!state.last_seen) return 'Offline';
+    return `Last seen ${new Date(state.last_seen).toLocaleString([], {
+      month: 'short',
+      day: 'numeric',
+      hour: '2-digit',
+      minute: '2-digit'
+    })}`;
+  };
+
+  // Messages sent over a socket are broadcast under a provisional id before
+  // they are saved; message_persisted and message_failed settle them later.
+  // Settlements are remembered because the other socket may still deliver
+  // the provisional copy afterwards.
+  const settleMessage = (message) => {
+    const changes = settledMessagesRef.current[message.id];
+    return changes ? { ...message, ...changes } : message;
+  };
+
+  const settleMessages = (changesById) => {
+    Object.assign(settledMessagesRef.current, changesById);
+    setMessages(prev => {
+      const ids = new Set(prev.map(msg => msg.id));
+      return prev.flatMap(msg => {
+        const changes = changesById[msg.id];
+        if (!changes) return [msg];
+        // History loaded since the send may already hold the saved copy
+        if (changes.id !== undefined && ids.has(changes.id)) return [];
+        return [{ ...msg, ...changes }];
+      });
+    });
+  };
+
+  const handleSettlement = (data) => {
+    if (data.type === 'message_persisted') {
+      settleMessages(Object.fromEntries((data.messages || []).map(entry => [
+        entry.client_id,
+        { id: entry.id, created_at: entry.created_at }
+      ])));
+    } else if (data.type === 'message_failed') {
+      settleMessages(Object.fromEntries((data.client_ids || []).map(clientId => [
+        clientId,
+        { failed: true }
+      ])));
+    }
+  };
+
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
   };
 
   useEffect(() => {
+    // Loading older messages prepends them; stay where the user scrolled to
+    if (keepScrollRef.current) {
+      keepScrollRef.current = false;
+      return;
+    }
     scrollToBottom();
   }, [messages]);
   
   useEffect(() => {
     fetchConversations();
-    fetchAvailableUsers();
     
     // Connect to user-specific WebSocket for global message notifications
     connectUserWebSocket();
@@ -57,6 +131,7 @@ const StudentMessagesView = () => {
       const response = await apiService.get('/discussions/messages/conversations/');
       console.log('Conversations response:', response.data);
       setConversations(response.data.conversations || []);
+      setConversationsCursor(response.data.next_cursor || null);
     } catch (error) {
       console.error('Error fetching conversations:', error);
     } finally {
@@ -64,10 +139,41 @@ const StudentMessagesView = () => {
     }
   };
 
+  const loadMoreConversations = async () => {
+    if (!conversationsCursor) return;
+    try {
+      const response = await apiService.get('/discussions/messages/conversations/', {
+        params: { before: conversationsCursor }
+      });
+      setConversations(prev => {
+        const loaded = new Set(prev.map(conv => conv.id));
+        return [...prev, ...(response.data.conversations || []).filter(conv => !loaded.has(conv.id))];
+      });
+      setConversationsCursor(response.data.next_cursor || null);
+    } catch (error) {
+      console.error('Error fetching conversations:', error);
+    }
+  };
+
   const fetchMessages = async (conversationId) => {
     try {
       const response = await apiService.get(`/discussions/messages/conversations/${conversationId}/`);
       setMessages(response.data.messages || []);
+      setMessagesCursor(response.data.next_cursor || null);
+    } catch (error) {
+      console.error('Error fetching messages:', error);
+    }
+  };
+
+  const loadOlderMessages = async () => {
+    if (!messagesCursor || !activeChat) return;
+    try {
+      const response = await apiService.get(`/discussions/messages/conversations/${activeChat}/`, {
+        params: { before: messagesCursor }
+      });
+      keepScrollRef.current = true;
+      setMessages(prev => [...(response.data.messages || []), ...prev]);
+      setMessagesCursor(response.data.next_cursor || null);
     } catch (error) {
       console.error('Error fetching messages:', error);
     }
@@ -130,6 +236,8 @@ const StudentMessagesView = () => {
               is_own_message: data.sender_id === currentUser?.id
             };
           }
+          // A provisional copy may arrive after it was saved or failed
+          messageData = settleMessage(messageData);
           
           // If this message is for the currently active conversation, add it to messages
           if (messageData.conversation_id === activeChat) {
@@ -151,6 +259,10 @@ const StudentMessagesView = () => {
               markMessagesAsRead(messageData.conversation_id);
             }
           }
+        } else if (data.type === 'message_persisted' || data.type === 'message_failed') {
+          handleSettlement(data);
+        } else if (data.type === 'presence') {
+          updatePresence(data.users || []);
         }
       } catch (error) {
         console.error('Student Dashboard: Error parsing user WebSocket message:', error);
@@ -228,6 +340,8 @@ const StudentMessagesView = () => {
               is_own_message: data.sender_id === currentUser?.id
             };
           }
+          // A provisional copy may arrive after it was saved or failed
+          messageData = settleMessage(messageData);
           
           // Only add message if it belongs to the current active conversation
           if (messageData.conversation_id === conversationId) {
@@ -254,6 +368,9 @@ const StudentMessagesView = () => {
           
           // Update conversation list to show latest message
           fetchConversations();
+        } else if (data.type === 'message_persisted' || data.type === 'message_failed') {
+          // Swap provisional ids for saved ones, or flag failed sends
+          handleSettlement(data);
         } else if (data.type === 'typing') {
           // Handle typing indicators here if needed
           console.log('Student Dashboard: Typing indicator:', data);
@@ -314,17 +431,26 @@ const StudentMessagesView = () => {
     }
   };
 
-  const fetchAvailableUsers = async () => {
+  const fetchAvailableUsers = async (search = '', after = null) => {
     try {
-      console.log('Fetching available users...');
-      const response = await apiService.get('/discussions/messages/users/');
-      console.log('Available users response:', response.data);
-      setAvailableUsers(response.data.users || []);
+      const response = await apiService.get('/discussions/messages/users/', {
+        params: { search: search || undefined, after: after || undefined }
+      });
+      const users = response.data.users || [];
+      setAvailableUsers(prev => (after ? [...prev, ...users] : users));
+      setUsersCursor(response.data.next_cursor || null);
     } catch (error) {
       console.error('Error fetching available users:', error);
     }
   };
 
+  // The directory is searched on the server, a moment after typing stops
+  useEffect(() => {
+    if (!showNewChatModal) return;
+    const timeout = setTimeout(() => fetchAvailableUsers(searchTerm), 300);
+    return () => clearTimeout(timeout);
+  }, [searchTerm, showNewChatModal]);
+
   const startNewConversation = async (userId) => {
     try {
       const response = await apiService.post('/discussions/messages/send/', {
@@ -410,7 +536,9 @@ const StudentMessagesView = () => {
                       alt={conv.other_user.name}
                       className="w-12 h-12 rounded-full"
                     />
-                    {/* You can add online status here later */}
+                    {presence[conv.other_user.id]?.online && (
+                      <span className="absolute bottom-0 right-0 w-3 h-3 bg-green-500 border-2 border-white rounded-full" />
+                    )}
                   </div>
                   <div className="flex-1 min-w-0">
                     <div className="flex items-center justify-between">
@@ -444,6 +572,14 @@ const StudentMessagesView = () => {
               <p className="text-sm">Start a conversation with your instructors</p>
             </div>
           )}
+          {conversationsCursor && (
+            <button
+              onClick={loadMoreConversations}
+              className="w-full p-3 text-sm text-indigo-600 hover:bg-indigo-50"
+            >
+              Load more conversations
+            </button>
+          )}
         </div>
       </div>
 
@@ -471,6 +607,9 @@ const StudentMessagesView = () => {
                           <p className="text-sm text-gray-500 capitalize">
                             {conv.other_user.user_type}
                           </p>
+                          {presenceLabel(conv.other_user.id) && (
+                            <p className="text-xs text-gray-500">{presenceLabel(conv.other_user.id)}</p>
+                          )}
                         </div>
                       </>
                     ) : null;
@@ -481,6 +620,16 @@ const StudentMessagesView = () => {
 
             {/* Messages Area */}
             <div className="flex-1 overflow-y-auto p-4 space-y-4 bg-gray-50">
+              {messagesCursor && (
+                <div className="text-center">
+                  <button
+                    onClick={loadOlderMessages}
+                    className="text-sm text-indigo-600 hover:text-indigo-800"
+                  >
+                    Load older messages
+                  </button>
+                </div>
+              )}
               {messages.map((msg) => (
                 <div
                   key={msg.id}
@@ -500,6 +649,9 @@ const StudentMessagesView = () => {
                         minute: '2-digit'
                       })}
                     </p>
+                    {msg.failed && (
+                      <p className="text-xs mt-1 text-red-200">Not sent</p>
+                    )}
                   </div>
                 </div>
               ))}
@@ -581,12 +733,7 @@ const StudentMessagesView = () => {
             </div>
 
             <div className="max-h-60 overflow-y-auto">
-              {availableUsers
-                .filter(user =>
-                  user.name.toLowerCase().includes(searchTerm.toLowerCase()) ||
-                  user.email.toLowerCase().includes(searchTerm.toLowerCase())
-                )
-                .map((user) => (
+              {availableUsers.map((user) => (
                 <div
                   key={user.id}
                   onClick={() => startNewConversation(user.id)}
@@ -603,6 +750,14 @@ const StudentMessagesView = () => {
                   </div>
                 </div>
               ))}
+              {usersCursor && (
+                <button
+                  onClick={() => fetchAvailableUsers(searchTerm, usersCursor)}
+                  className="w-full p-2 text-sm text-indigo-600 hover:bg-indigo-50 rounded-lg"
+                >
+                  Load more users
+                </button>
+              )}
             </div>
           </div>
         </div>
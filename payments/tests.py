@@ -1,3 +1,66 @@
+import csv
+from io import BytesIO, StringIO
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.db.models import Q, Sum
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from core.exports import parquet_available
+from .models import InstructorEarning
+
+
+class InstructorEarningsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_scale', students=20, instructors=2, courses=4, messages=0, prefix='earnings',
+                     stdout=StringIO())
+        cls.instructor = User.objects.filter(
+            email__startswith='earnings-', user_type='instructor', earnings__isnull=False
+        ).first()
+
+    def test_summary_matches_the_instructors_earnings(self):
+        client = APIClient()
+        client.force_authenticate(self.instructor)
+        response = client.get('/api/payments/instructor/earnings/')
+        data = response.json()
+
+        totals = InstructorEarning.objects.filter(instructor=self.instructor).aggregate(
+            paid=Sum('final_amount', filter=Q(is_paid=True)),
+            pending=Sum('final_amount', filter=Q(is_paid=False)),
+        )
+        self.assertEqual(data['summary']['total_earnings'], float(totals['paid'] or 0))
+        self.assertEqual(data['summary']['pending_earnings'], float(totals['pending'] or 0))
+        self.assertEqual(len(data['monthly_chart']), 6)
+        self.assertEqual(len(data['recent_earnings']),
+                         min(12, InstructorEarning.objects.filter(instructor=self.instructor).count()))
+
+    def test_export_streams_the_full_statement(self):
+        client = APIClient()
+        client.force_authenticate(self.instructor)
+        earnings = list(InstructorEarning.objects.filter(instructor=self.instructor).order_by('month', 'id'))
+
+        response = client.get('/api/payments/instructor/earnings/export/')
+        rows = list(csv.DictReader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([(row['month'], row['amount']) for row in rows],
+                         [(earning.month.isoformat(), str(earning.final_amount)) for earning in earnings])
+
+        response = client.get('/api/payments/instructor/earnings/export/', {'export_format': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
+    @skipUnless(parquet_available(), 'pyarrow is not installed')
+    def test_parquet_export_keeps_decimal_amounts(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        client = APIClient()
+        client.force_authenticate(self.instructor)
+        response = client.get('/api/payments/instructor/earnings/export/', {'export_format': 'parquet'})
+        table = pq.read_table(BytesIO(b''.join(response.streaming_content)))
 
-# Create your tests here.
+        self.assertEqual(table.schema.field('amount').type, pa.decimal128(12, 2))
+        self.assertEqual(table.column('amount').to_pylist(), list(InstructorEarning.objects.filter(
+            instructor=self.instructor
+        ).order_by('month', 'id').values_list('final_amount', flat=True)))
@@ -6,4 +6,5 @@ app_name = 'payments'
 
 urlpatterns = [
     path('instructor/earnings/', views.instructor_earnings, name='instructor-earnings'),
+    path('instructor/earnings/export/', views.export_instructor_earnings, name='instructor-earnings-export'),
 ]
\ No newline at end of file
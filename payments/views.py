@@ -2,16 +2,24 @@
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Sum, Avg
+from django.db.models import Sum, Avg, Q
 from django.utils import timezone
 from decimal import Decimal
 from datetime import datetime, timedelta
 
 from .models import InstructorEarning
 from enrollments.models import Enrollment
+from core.dbrouting import bind_read_database, use_replica
+from core.exports import (
+    EXPORT_CHUNK_SIZE, ExportColumn, export_format_error, streaming_export
+)
+from core.fanout import fan_out
+from core.instrumentation import query_budget
 
+@query_budget(6, duplicates=0)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@use_replica
 def instructor_earnings(request):
     """Get instructor earnings based on Coursera model"""
     
@@ -21,41 +29,46 @@ def instructor_earnings(request):
         
         instructor = request.user
         
-        # Get earnings summary (from revenue sharing)
-        total_earnings = InstructorEarning.objects.filter(
-            instructor=instructor,
-            is_paid=True
-        ).aggregate(Sum('final_amount'))['final_amount__sum'] or Decimal('0')
-        
-        pending_earnings = InstructorEarning.objects.filter(
-            instructor=instructor,
-            is_paid=False
-        ).aggregate(Sum('final_amount'))['final_amount__sum'] or Decimal('0')
-        
-        # This month's earnings
+        earnings = InstructorEarning.objects.filter(instructor=instructor)
         current_month = timezone.now().date().replace(day=1)
-        monthly_earnings = InstructorEarning.objects.filter(
-            instructor=instructor,
-            month=current_month
-        ).aggregate(Sum('final_amount'))['final_amount__sum'] or Decimal('0')
         
-        # Performance metrics
-        current_month_data = InstructorEarning.objects.filter(
-            instructor=instructor,
-            month=current_month
-        ).aggregate(
-            total_enrollments=Sum('enrollments_count'),
-            total_completions=Sum('completions_count'),
-            avg_engagement=Avg('engagement_score')
-        )
+        # Months of the chart (last 6 months)
+        current_date = timezone.now().date()
+        chart_months = [
+            # Calculate months back (approximate with 30 days)
+            (current_date - timedelta(days=30*(5-i))).replace(day=1)
+            for i in range(6)
+        ]
         
-        # Recent transactions (simulated from enrollment data for frontend compatibility)
-        try:
-            recent_enrollments = Enrollment.objects.filter(
+        # The queries are independent, so run them concurrently
+        results = fan_out(
+            # Get earnings summary (from revenue sharing)
+            summary=lambda: earnings.aggregate(
+                total_earnings=Sum('final_amount', filter=Q(is_paid=True)),
+                pending_earnings=Sum('final_amount', filter=Q(is_paid=False)),
+            ),
+            # This month's earnings and performance metrics
+            current_month_data=lambda: earnings.filter(month=current_month).aggregate(
+                monthly_earnings=Sum('final_amount'),
+                total_enrollments=Sum('enrollments_count'),
+                total_completions=Sum('completions_count'),
+                avg_engagement=Avg('engagement_score')
+            ),
+            # Recent transactions (simulated from enrollment data for frontend compatibility)
+            recent_enrollments=lambda: list(Enrollment.objects.filter(
                 course__instructor=instructor
-            ).select_related('student', 'course').order_by('-enrolled_date')[:10]
-        except Exception as e:
-            recent_enrollments = []
+            ).select_related('student', 'course').order_by('-enrolled_date')[:10]),
+            monthly_totals=lambda: dict(earnings.filter(month__in=chart_months).values('month').annotate(
+                total=Sum('final_amount')
+            ).values_list('month', 'total')),
+            # Recent earnings by course
+            recent_earnings=lambda: list(earnings.select_related('course').order_by('-month')[:12]),
+        )
+        total_earnings = results['summary']['total_earnings'] or Decimal('0')
+        pending_earnings = results['summary']['pending_earnings'] or Decimal('0')
+        current_month_data = results['current_month_data']
+        monthly_earnings = current_month_data['monthly_earnings'] or Decimal('0')
+        recent_enrollments = results['recent_enrollments']
         
         recent_transactions = []
         for enrollment in recent_enrollments:
@@ -74,32 +87,17 @@ def instructor_earnings(request):
                 'status': 'Paid'  # Coursera Plus subscriptions are pre-paid
             })
         
-        # Monthly chart data (last 6 months) 
-        current_date = timezone.now().date()
-        monthly_chart = []
-        
-        for i in range(6):
-            # Calculate months back (approximate with 30 days)
-            month_start = current_date - timedelta(days=30*(5-i))
-            month_start = month_start.replace(day=1)
-            
-            month_earnings = InstructorEarning.objects.filter(
-                instructor=instructor,
-                month=month_start
-            ).aggregate(Sum('final_amount'))['final_amount__sum'] or 0
-            
-            monthly_chart.append({
+        # Monthly chart data (last 6 months)
+        monthly_chart = [
+            {
                 'month': month_start.strftime('%b'),
-                'earnings': float(month_earnings)
-            })
-        
-        # Recent earnings by course
-        recent_earnings = InstructorEarning.objects.filter(
-            instructor=instructor
-        ).select_related('course').order_by('-month')[:12]
+                'earnings': float(results['monthly_totals'].get(month_start) or 0)
+            }
+            for month_start in chart_months
+        ]
         
         earnings_data = []
-        for earning in recent_earnings:
+        for earning in results['recent_earnings']:
             earnings_data.append({
                 'id': str(earning.uuid),
                 'month': earning.month.strftime('%B %Y'),
@@ -172,4 +170,46 @@ def instructor_earnings(request):
                 ]
             },
             'error': str(e) if request.user.is_staff else 'Unable to load earnings data'
-        })
\ No newline at end of file
+        })
+
+EARNINGS_EXPORT_COLUMNS = [
+    ExportColumn('month', 'date'),
+    ExportColumn('course', 'string'),
+    ExportColumn('earning_type', 'string'),
+    ExportColumn('enrollments', 'int'),
+    ExportColumn('completions', 'int'),
+    ExportColumn('watch_minutes', 'int'),
+    ExportColumn('engagement_score', 'decimal'),
+    ExportColumn('base_amount', 'decimal'),
+    ExportColumn('multiplier', 'decimal'),
+    ExportColumn('amount', 'decimal'),
+    ExportColumn('is_paid', 'bool'),
+    ExportColumn('payout_date', 'datetime'),
+]
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@use_replica
+def export_instructor_earnings(request):
+    """Stream the instructor's full earnings statement as CSV or Parquet"""
+    if request.user.user_type != 'instructor':
+        return Response({'error': 'Not an instructor'}, status=403)
+    
+    export_format = request.query_params.get('export_format', 'csv')
+    error = export_format_error(export_format)
+    if error:
+        return Response({'error': error}, status=400)
+    
+    # Rows are streamed after the view returns, outside use_replica
+    rows = bind_read_database(InstructorEarning.objects.filter(
+        instructor=request.user
+    ).order_by('month', 'id').values_list(
+        'month', 'course__title', 'earning_type', 'enrollments_count',
+        'completions_count', 'total_watch_minutes', 'engagement_score',
+        'base_amount', 'performance_multiplier', 'final_amount',
+        'is_paid', 'payout_date'
+    )).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    
+    return streaming_export(
+        request, 'earnings', EARNINGS_EXPORT_COLUMNS, rows, export_format
+    )